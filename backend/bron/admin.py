@@ -6,7 +6,11 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from datetime import timedelta
+from django.db import transaction
 from django.db.models import Q 
+from bron.autocomplete import autocomplete
+from bron.jobs import export_events, upcoming_events
+from bron.popularity import invalidate_homepage
 
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('profile_link', 'first_name', 'second_name', 'patronymic', 'email', 'telephone', 'link_tag', 'org_status', 'admin_status')
@@ -259,6 +263,16 @@ def duplicate_event(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset
         event.is_visiable = False
         event.save()
 
+def events_updated(event_ids: list[int]) -> None:
+    """
+    Обновить префиксный индекс и кэш главной страницы после QuerySet.update():
+    update() не отправляет post_save, поэтому sync_autocomplete не срабатывает
+
+    Args:
+        event_ids: ID изменённых событий
+    """
+    transaction.on_commit(lambda: (autocomplete.refresh('events', event_ids), invalidate_homepage()))
+
 @admin.action(description="Сделать неактивными")
 def deactivate_events(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset) -> None:
     """
@@ -269,7 +283,9 @@ def deactivate_events(modeladmin: admin.ModelAdmin, request: HttpRequest, querys
         request: запрос
         queryset: QuerySet выбранных событий
     """
+    event_ids = list(queryset.values_list('id', flat=True))
     queryset.update(is_visiable=False)
+    events_updated(event_ids)
     
 @admin.action(description="Перенести на день")
 def plus_day(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset) -> None:
@@ -281,8 +297,26 @@ def plus_day(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset) -> No
         request: запрос
         queryset: QuerySet выбранных событий
     """
+    event_ids = []
     for event in queryset:
         Event.objects.filter(id=event.id).update(date=event.date + timedelta(days=1))
+        event_ids.append(event.id)
+    events_updated(event_ids)
+
+@admin.action(description="Выгрузить предстоящие в ZIP")
+def export_upcoming_events(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset) -> None:
+    """
+    Поставить в очередь выгрузку PDF-сводок всех предстоящих событий в ZIP-архив,
+    как POST /api/exports/; выбор строк в списке не учитывается
+
+    Args:
+        modeladmin: Админ-класс
+        request: запрос
+        queryset: QuerySet выбранных событий
+    """
+    job = export_events(upcoming_events())
+    url = reverse('bron:exports-detail', args=[job['id']])
+    messages.info(request, format_html('Выгрузка {} мероприятий поставлена в очередь: <a href="{}">статус</a>', job['total'], url))
 
 class EventAdmin(admin.ModelAdmin):
     list_display = ('name', 'date', 'get_items', 'space_id', 'org_id', 'attachment', 'is_visiable', 'pdf_link')
@@ -291,7 +325,7 @@ class EventAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
     raw_id_fields = ('space_id', 'org_id')
     search_fields = ['name', 'description', 'date', 'space_id__name', 'org_id__name', 'items_id__name']
-    actions = [duplicate_event, deactivate_events, plus_day]
+    actions = [duplicate_event, deactivate_events, plus_day, export_upcoming_events]
     
     @admin.display(description='Особенности')
     def get_items(self, obj: Event) -> list[str]:
@@ -5,3 +5,6 @@ class BronConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bron'
     verbose_name = 'Бронитех'
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
@@ -0,0 +1,145 @@
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+
+from django.db.models import Model, QuerySet
+
+from .models import Event, Organizer, Space
+from .sync import SyncedIndex
+
+MAX_SUGGESTIONS = 20
+
+
+def normalize(text: str) -> str:
+    """
+    Строка для сравнения префиксов: нижний регистр, «ё» как «е», дефис как пробел, одиночные пробелы
+    """
+    return ' '.join(text.lower().replace('ё', 'е').replace('-', ' ').split())
+
+
+def inner_keys(name: str) -> list[str]:
+    """
+    Хвосты названия с начала каждого слова, кроме первого, чтобы «конф» находило «Большой конференц-зал»
+    """
+    words = normalize(name).split()
+    return [' '.join(words[i:]) for i in range(1, len(words))]
+
+
+def _remove(keys: list[tuple[str, int]], entry: tuple[str, int]) -> None:
+    idx = bisect_left(keys, entry)
+    if idx < len(keys) and keys[idx] == entry:
+        del keys[idx]
+
+
+class Autocomplete(SyncedIndex):
+    """
+    Префиксный индекс названий помещений, мероприятий и организаторов в памяти процесса
+
+    Для каждого типа хранятся два отсортированных массива пар (ключ, ID): по полным
+    названиям и по их хвостам со второго слова. Поиск — bisect по префиксу и проход
+    не дальше limit совпадений, сначала по полным названиям. Индекс строится при первом
+    обращении, изменения записей расходятся по процессам через журнал SyncedIndex
+    с ключами (тип, ID), и каждый процесс перечитывает только их названия
+    """
+    prefix = 'bron:autocomplete'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._full: dict[str, list[tuple[str, int]]] = {}
+        self._inner: dict[str, list[tuple[str, int]]] = {}
+        self._names: dict[str, dict[int, str]] = {}
+
+    @staticmethod
+    def sources() -> dict[str, QuerySet]:
+        """
+        Записи, которые попадают в подсказки, по типам
+        """
+        return {
+            'spaces': Space.check_visiable.all(),
+            'events': Event.objects.filter(is_visiable=True),
+            'orgs': Organizer.objects.all(),
+        }
+
+    @staticmethod
+    def kind(model: type[Model]) -> Optional[str]:
+        return {Space: 'spaces', Event: 'events', Organizer: 'orgs'}.get(model)
+
+    def build(self) -> None:
+        full, inner, all_names = {}, {}, {}
+        for kind, queryset in self.sources().items():
+            names = dict(queryset.order_by().values_list('id', 'name'))
+            all_names[kind] = names
+            full[kind] = sorted((normalize(name), obj_id) for obj_id, name in names.items())
+            inner[kind] = sorted((key, obj_id) for obj_id, name in names.items() for key in inner_keys(name))
+        self._full, self._inner, self._names = full, inner, all_names
+
+    def apply(self, keys: list[tuple[str, int]]) -> None:
+        grouped: dict[str, list[int]] = {}
+        for kind, obj_id in keys:
+            grouped.setdefault(kind, []).append(obj_id)
+        sources = self.sources()
+        for kind, obj_ids in grouped.items():
+            names = dict(sources[kind].filter(pk__in=obj_ids).order_by().values_list('id', 'name'))
+            for obj_id in obj_ids:
+                self._replace(kind, obj_id, names.get(obj_id))
+
+    def _replace(self, kind: str, obj_id: int, name: Optional[str]) -> None:
+        """
+        Заменить название записи в индексе; None — запись удалена или скрыта
+        """
+        names = self._names[kind]
+        old = names.pop(obj_id, None)
+        if old is not None:
+            _remove(self._full[kind], (normalize(old), obj_id))
+            for key in inner_keys(old):
+                _remove(self._inner[kind], (key, obj_id))
+        if name is not None:
+            names[obj_id] = name
+            insort(self._full[kind], (normalize(name), obj_id))
+            for key in inner_keys(name):
+                insort(self._inner[kind], (key, obj_id))
+
+    def refresh(self, kind: str, obj_ids: Iterable[int]) -> None:
+        """
+        Перечитать названия записей после изменения, скрытия или удаления
+        в этом процессе и сообщить об изменении остальным
+
+        Args:
+            kind: Тип записей: spaces, events или orgs
+            obj_ids: ID записей
+        """
+        self.publish((kind, obj_id) for obj_id in obj_ids)
+
+    def suggest(self, query: str, limit: int) -> dict[str, list[dict]]:
+        """
+        Подсказки по префиксу для каждого типа записей
+
+        Сначала идут записи, название которых начинается с запроса, затем те,
+        где с запроса начинается одно из следующих слов; внутри групп — по алфавиту.
+        Просматривается не больше limit ключей каждого массива сверх повторов
+
+        Args:
+            query: Начало названия или одного из его слов
+            limit: Сколько подсказок вернуть для каждого типа
+
+        Returns:
+            Словарь тип -> список {id, name}
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return {kind: [] for kind in self.sources()}
+        self._ensure_loaded()
+        suggestions = {}
+        with self._lock:
+            for kind, names in self._names.items():
+                found: list[int] = []
+                for keys in (self._full[kind], self._inner[kind]):
+                    idx = bisect_left(keys, (prefix,))
+                    while len(found) < limit and idx < len(keys) and keys[idx][0].startswith(prefix):
+                        if keys[idx][1] not in found:
+                            found.append(keys[idx][1])
+                        idx += 1
+                suggestions[kind] = [{'id': obj_id, 'name': names[obj_id]} for obj_id in found]
+        return suggestions
+
+
+autocomplete = Autocomplete()
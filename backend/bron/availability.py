@@ -0,0 +1,256 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from time import time
+from typing import Iterable, Optional
+
+from .models import Booking
+from .sync import SyncedIndex
+
+
+class SpaceIntervals:
+    """
+    Отсортированные по началу интервалы подтверждённых бронирований одного помещения
+
+    Помимо массива начал хранится префиксный максимум концов: первые i интервалов
+    пересекают момент t тогда и только тогда, когда max(ends[:i]) > t. Это даёт
+    ответ «занято/свободно» для любого окна за O(log n)
+    """
+    __slots__ = ('items', 'starts', 'max_ends')
+
+    def __init__(self, items: Iterable[tuple[float, float, int]]) -> None:
+        self.items = sorted(items)
+        self.starts = [start for start, _, _ in self.items]
+        self.max_ends = []
+        current = float('-inf')
+        for _, end, _ in self.items:
+            current = max(current, end)
+            self.max_ends.append(current)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _max_end_before(self, idx: int) -> float:
+        return self.max_ends[idx - 1] if idx else float('-inf')
+
+    def overlaps(self, start: float, end: float) -> bool:
+        """
+        Есть ли бронь, пересекающая окно [start, end)
+        """
+        return self._max_end_before(bisect_left(self.starts, end)) > start
+
+    def covers(self, moment: float) -> bool:
+        """
+        Есть ли бронь, которая началась не позже moment и ещё не закончилась
+        """
+        return self._max_end_before(bisect_right(self.starts, moment)) > moment
+
+    def ends_at_or_after(self, moment: float) -> bool:
+        """
+        Есть ли бронь, начавшаяся раньше moment и заканчивающаяся не раньше него
+        """
+        return self._max_end_before(bisect_left(self.starts, moment)) >= moment
+
+    def first_candidate(self, moment: float) -> tuple[float, int]:
+        """
+        Первый момент не раньше moment, не покрытый бронью, и индекс первой брони, начавшейся после moment
+        """
+        idx = bisect_right(self.starts, moment)
+        return max(moment, self._max_end_before(idx)), idx
+
+    def advance(self, candidate: float, idx: int, duration: float) -> Optional[tuple[float, int]]:
+        """
+        Один шаг поиска окна длиной duration, начиная с candidate
+
+        Брони до idx заканчиваются не позже candidate. Если следующая бронь
+        начинается раньше конца окна, кандидат сдвигается на её конец
+
+        Returns:
+            Новая пара (кандидат, индекс) или None, если окно [candidate, candidate + duration) свободно
+        """
+        if idx < len(self.starts) and self.starts[idx] < candidate + duration:
+            return max(candidate, self.max_ends[idx]), idx + 1
+        return None
+
+
+EMPTY = SpaceIntervals([])
+
+
+class AvailabilityIndex(SyncedIndex):
+    """
+    Индекс занятости помещений по подтверждённым бронированиям
+
+    Индекс строится в памяти процесса при первом обращении и хранит только брони,
+    которые заканчиваются после построения: окна, начинающиеся раньше, проверяются
+    запросом к базе по частичному индексу booking_confirmed_dates. Изменения
+    подтверждённых броней расходятся по процессам через журнал SyncedIndex,
+    и каждый процесс перечитывает только изменившиеся помещения
+    """
+    prefix = 'bron:availability'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._spaces: dict[int, SpaceIntervals] = {}
+        self._since = 0.0
+
+    @staticmethod
+    def _confirmed(after: datetime, space_ids: Optional[Iterable[int]] = None) -> Iterable[tuple[int, datetime, datetime, int]]:
+        bookings = Booking.objects.filter(status=Booking.Status.CONFIRMATION, date_to__gt=after)
+        if space_ids is not None:
+            bookings = bookings.filter(space_id__in=list(space_ids))
+        return bookings.order_by().values_list('space_id', 'date_from', 'date_to', 'id').iterator()
+
+    @staticmethod
+    def _group(rows: Iterable[tuple[int, datetime, datetime, int]]) -> dict[int, SpaceIntervals]:
+        grouped: dict[int, list[tuple[float, float, int]]] = {}
+        for space_id, date_from, date_to, booking_id in rows:
+            grouped.setdefault(space_id, []).append((date_from.timestamp(), date_to.timestamp(), booking_id))
+        return {space_id: SpaceIntervals(items) for space_id, items in grouped.items()}
+
+    def load(self, rows: Iterable[tuple[int, datetime, datetime, int]]) -> None:
+        """
+        Заполнить индекс из набора строк (space_id, date_from, date_to, id)
+
+        Args:
+            rows: Интервалы подтверждённых бронирований
+        """
+        spaces = self._group(rows)
+        with self._lock:
+            self._spaces = spaces
+
+    def build(self) -> None:
+        since = time()
+        self.load(self._confirmed(datetime.fromtimestamp(since, tz=timezone.utc)))
+        self._since = since
+
+    def apply(self, keys: list[int]) -> None:
+        spaces = self._group(self._confirmed(datetime.fromtimestamp(self._since, tz=timezone.utc), keys))
+        for space_id in keys:
+            if space_id in spaces:
+                self._spaces[space_id] = spaces[space_id]
+            else:
+                self._spaces.pop(space_id, None)
+
+    def refresh_spaces(self, space_ids: Iterable[int]) -> None:
+        """
+        Перечитать интервалы помещений после изменения их подтверждённых бронирований
+        в этом процессе и сообщить об изменении остальным
+
+        Args:
+            space_ids: ID помещений
+        """
+        self.publish(space_ids)
+
+    @staticmethod
+    def _busy_in_db(date_from: Optional[datetime], date_to: Optional[datetime]) -> set[int]:
+        """
+        Занятые помещения по базе данных для окон, начинающихся раньше построения индекса
+        """
+        bookings = Booking.objects.filter(status=Booking.Status.CONFIRMATION)
+        if date_from and date_to:
+            bookings = bookings.filter(date_from__lt=date_to, date_to__gt=date_from)
+        elif date_from:
+            bookings = bookings.filter(date_from__lte=date_from, date_to__gt=date_from)
+        else:
+            bookings = bookings.filter(date_from__lt=date_to, date_to__gte=date_to)
+        return set(bookings.order_by().values_list('space_id', flat=True).distinct())
+
+    def busy_space_ids(self, date_from: Optional[datetime], date_to: Optional[datetime]) -> set[int]:
+        """
+        Помещения, занятые в указанный период
+
+        Семантика совпадает с прежним исключением через space_books: при двух
+        границах ищутся пересечения с окном, при одной — бронь, покрывающая
+        эту границу
+
+        Args:
+            date_from: Начало периода
+            date_to: Конец периода
+
+        Returns:
+            Множество ID занятых помещений
+        """
+        if not date_from and not date_to:
+            return set()
+        self._ensure_loaded()
+        if (date_from or date_to).timestamp() <= self._since:
+            return self._busy_in_db(date_from, date_to)
+        with self._lock:
+            spaces = list(self._spaces.items())
+
+        if date_from and date_to:
+            start, end = date_from.timestamp(), date_to.timestamp()
+            return {space_id for space_id, intervals in spaces if intervals.overlaps(start, end)}
+        if date_from:
+            moment = date_from.timestamp()
+            return {space_id for space_id, intervals in spaces if intervals.covers(moment)}
+        moment = date_to.timestamp()
+        return {space_id for space_id, intervals in spaces if intervals.ends_at_or_after(moment)}
+
+    def is_free(self, space_id: int, date_from: datetime, date_to: datetime) -> bool:
+        """
+        Свободно ли помещение в окне [date_from, date_to)
+
+        Args:
+            space_id: ID помещения
+            date_from: Начало окна
+            date_to: Конец окна
+
+        Returns:
+            True, если подтверждённых бронирований в окне нет
+        """
+        self._ensure_loaded()
+        if date_from.timestamp() <= self._since:
+            return not Booking.objects.filter(
+                space_id=space_id, status=Booking.Status.CONFIRMATION, date_from__lt=date_to, date_to__gt=date_from,
+            ).exists()
+        intervals = self._spaces.get(space_id)
+        return not intervals or not intervals.overlaps(date_from.timestamp(), date_to.timestamp())
+
+    def earliest_fits(self, space_ids: Iterable[int], after: datetime, duration: timedelta, limit: int) -> list[tuple[datetime, int]]:
+        """
+        Самые ранние свободные окна заданной длины, по одному на помещение
+
+        Кандидаты всех помещений лежат в одной куче по времени начала. Из кучи
+        берётся самый ранний: если окно свободно, оно попадает в ответ, иначе
+        кандидат сдвигается за мешающую бронь и возвращается в кучу. Поэтому
+        брони помещений, окна которых заведомо позже limit-го ответа, не просматриваются
+
+        Args:
+            space_ids: ID помещений-кандидатов
+            after: Окно должно начинаться не раньше
+            duration: Длина окна
+            limit: Сколько окон вернуть
+
+        Returns:
+            Пары (начало окна, ID помещения) по возрастанию начала
+        """
+        self._ensure_loaded()
+        moment, length = after.timestamp(), duration.total_seconds()
+        if moment <= self._since:
+            space_ids = list(space_ids)
+            spaces = self._group(self._confirmed(after, space_ids))
+        else:
+            spaces = self._spaces
+        with self._lock:
+            candidates = [(space_id, spaces.get(space_id, EMPTY)) for space_id in space_ids]
+
+        heap = []
+        for space_id, intervals in candidates:
+            candidate, idx = intervals.first_candidate(moment)
+            heap.append((candidate, space_id, idx, intervals))
+        heapq.heapify(heap)
+
+        fits = []
+        while heap and len(fits) < limit:
+            candidate, space_id, idx, intervals = heap[0]
+            step = intervals.advance(candidate, idx, length)
+            if step is None:
+                heapq.heappop(heap)
+                fits.append((datetime.fromtimestamp(candidate, tz=timezone.utc), space_id))
+            else:
+                heapq.heapreplace(heap, (step[0], space_id, step[1], intervals))
+        return fits
+
+
+availability_index = AvailabilityIndex()
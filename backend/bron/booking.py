@@ -0,0 +1,314 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from threading import Lock
+from typing import Iterable, Iterator, Optional
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, Q, QuerySet, Value, When
+
+from .models import Booking, Space
+from .transitions import bookings_changed, transition
+
+OVERLAP_CONSTRAINT = 'bron_booking_no_overlap'
+MAX_DECISIONS = 500
+
+CONFIRM = 'confirm'
+CANCEL = 'cancel'
+
+# Блокировки помещений внутри процесса: блокировка и число потоков, которые её держат или ждут
+_space_locks: dict[int, list] = {}
+_space_locks_guard = Lock()
+
+
+class BookingConflict(Exception):
+    """
+    Помещение уже занято подтверждённой бронью в выбранный период
+    """
+
+
+@contextmanager
+def _process_lock(space_id: int) -> Iterator[None]:
+    """
+    Блокировка помещения внутри процесса; запись удаляется, когда блокировку никто не держит и не ждёт
+    """
+    with _space_locks_guard:
+        entry = _space_locks.setdefault(space_id, [Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _space_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _space_locks[space_id]
+
+
+@contextmanager
+def space_lock(space_id: int) -> Iterator[None]:
+    """
+    Транзакция, в которой изменения бронирований помещения выполняются строго по очереди
+
+    На PostgreSQL берётся блокировка строки помещения (SELECT ... FOR UPDATE).
+    SQLite не поддерживает блокировку строк, поэтому запросы внутри процесса
+    выстраиваются в очередь на локальной блокировке, а между процессами —
+    на блокировке записи, которую SQLite берёт при первом UPDATE в транзакции.
+    Обновляется не первичный ключ: UPDATE ключа заставляет SQLite проверять
+    внешние ключи всех броней, мероприятий и отзывов помещения
+
+    Args:
+        space_id: ID помещения
+    """
+    if connection.features.has_select_for_update:
+        with transaction.atomic():
+            list(Space.objects.select_for_update().filter(pk=space_id).values_list('pk'))
+            yield
+    else:
+        with _process_lock(space_id), transaction.atomic():
+            Space.objects.filter(pk=space_id).update(capacity=F('capacity'))
+            yield
+
+
+def confirmed_conflicts(space_id: int, date_from: datetime, date_to: datetime, exclude_id: Optional[int] = None) -> QuerySet:
+    """
+    Подтверждённые брони помещения, пересекающие окно [date_from, date_to)
+
+    Args:
+        space_id: ID помещения
+        date_from: Начало окна
+        date_to: Конец окна
+        exclude_id: ID брони, которую не нужно учитывать
+
+    Returns:
+        QuerySet пересекающихся бронирований
+    """
+    conflicts = Booking.objects.filter(
+        space_id=space_id,
+        status=Booking.Status.CONFIRMATION,
+        date_from__lt=date_to,
+        date_to__gt=date_from,
+    )
+    if exclude_id is not None:
+        conflicts = conflicts.exclude(pk=exclude_id)
+    return conflicts
+
+
+@contextmanager
+def _overlap_guard() -> Iterator[None]:
+    try:
+        yield
+    except IntegrityError as exc:
+        if OVERLAP_CONSTRAINT in str(exc):
+            raise BookingConflict from exc
+        raise
+
+
+def create_booking(user: User, space: Space, date_from: datetime, date_to: datetime) -> Booking:
+    """
+    Создать новую бронь, если помещение не занято подтверждённой бронью
+
+    Args:
+        user: Пользователь
+        space: Помещение
+        date_from: Начало брони
+        date_to: Конец брони
+
+    Returns:
+        Созданное бронирование
+
+    Raises:
+        BookingConflict: Помещение занято в выбранный период
+    """
+    with _overlap_guard(), space_lock(space.pk):
+        if confirmed_conflicts(space.pk, date_from, date_to).exists():
+            raise BookingConflict
+        return Booking.objects.create(
+            user_id=user,
+            space_id=space,
+            date_from=date_from,
+            date_to=date_to,
+        )
+
+
+def pending_overlaps(windows: Iterable[tuple[int, datetime, datetime]], exclude_ids: Iterable[int] = ()) -> QuerySet:
+    """
+    Новые брони, пересекающие хотя бы одно из окон в своём помещении
+
+    Args:
+        windows: Тройки (ID помещения, начало окна, конец окна)
+        exclude_ids: ID броней, которые не нужно учитывать
+
+    Returns:
+        QuerySet пересекающихся новых бронирований
+    """
+    condition = Q()
+    for space_id, date_from, date_to in windows:
+        condition |= Q(space_id=space_id, date_from__lt=date_to, date_to__gt=date_from)
+    return Booking.objects.filter(condition, status=Booking.Status.NEWBOOK).exclude(pk__in=list(exclude_ids))
+
+
+def reject_pending_overlaps(windows: list[tuple[int, datetime, datetime]], exclude_ids: Iterable[int] = ()) -> list[int]:
+    """
+    Отклонить новые брони, пересекающие подтверждённые окна
+
+    Вызывается под space_lock помещений из windows: ID читаются по индексу
+    (space_id, status, date_from, date_to), затем все брони переводятся в CBC
+    одним UPDATE, поэтому стоимость зависит только от количества пересечений,
+    а не от того, сколько новых броней накопилось у помещения
+
+    Args:
+        windows: Тройки (ID помещения, начало окна, конец окна)
+        exclude_ids: ID броней, которые не нужно учитывать
+
+    Returns:
+        ID отклонённых броней
+    """
+    if not windows:
+        return []
+    rejected = list(pending_overlaps(windows, exclude_ids).order_by('pk').values_list('pk', flat=True))
+    if rejected:
+        # Статус проверяется в SET, а не в WHERE: иначе SQLite ищет строки по индексу
+        # статуса и перебирает все новые брони вместо нескольких строк по ключу
+        Booking.objects.filter(pk__in=rejected).update(status=Case(
+            When(status=Booking.Status.NEWBOOK, then=Value(Booking.Status.CANCELEDBEFORECONFIRMATION)),
+            default=F('status'),
+        ))
+    return rejected
+
+
+def confirm_booking(booking: Booking) -> list[int]:
+    """
+    Подтвердить бронь, если её окно не пересекается с уже подтверждёнными
+
+    Новые брони того же помещения, пересекающие окно, отклоняются в той же транзакции
+
+    Args:
+        booking: Бронирование; статус обновляется на месте
+
+    Returns:
+        ID отклонённых пересекающихся броней
+
+    Raises:
+        BookingConflict: Окно брони уже занято подтверждённой бронью
+        InvalidTransition: Бронь не новая
+        StaleStatus: Бронь одновременно обработал другой запрос
+    """
+    with _overlap_guard(), space_lock(booking.space_id_id):
+        if confirmed_conflicts(booking.space_id_id, booking.date_from, booking.date_to, exclude_id=booking.pk).exists():
+            raise BookingConflict
+        transition(booking, Booking.Status.CONFIRMATION)
+        return reject_pending_overlaps([(booking.space_id_id, booking.date_from, booking.date_to)], [booking.pk])
+
+
+class ConfirmedSlots:
+    """
+    Отсортированные непересекающиеся интервалы подтверждённых броней одного помещения
+    """
+    def __init__(self, intervals: Iterable[tuple[datetime, datetime]]) -> None:
+        self.intervals = sorted(intervals)
+        self.starts = [start for start, _ in self.intervals]
+
+    def is_free(self, date_from: datetime, date_to: datetime) -> bool:
+        """
+        Не пересекается ли окно [date_from, date_to) ни с одним интервалом
+        """
+        idx = bisect_left(self.starts, date_to)
+        return idx == 0 or self.intervals[idx - 1][1] <= date_from
+
+    def add(self, date_from: datetime, date_to: datetime) -> None:
+        idx = bisect_left(self.starts, date_from)
+        self.starts.insert(idx, date_from)
+        self.intervals.insert(idx, (date_from, date_to))
+
+
+def decide_bookings(decisions: list[tuple[int, str]]) -> tuple[list[int], list[int], dict[int, str]]:
+    """
+    Подтвердить или отменить пачку новых броней в одной транзакции
+
+    Сначала берутся блокировки помещений в порядке ID, затем брони читаются
+    одним SELECT ... FOR UPDATE; отмены и подтверждения применяются двумя
+    UPDATE. Подтверждения проверяются по уже подтверждённым броням помещения
+    и по принятым раньше в этой же пачке, в порядке следования в запросе.
+    Новые брони, пересекающие принятые подтверждения, отклоняются ещё одним UPDATE
+
+    Args:
+        decisions: Пары (ID брони, CONFIRM или CANCEL)
+
+    Returns:
+        ID изменённых броней, ID отклонённых из-за пересечения и ошибки по остальным:
+        not_found, not_pending, duplicate или conflict
+    """
+    errors: dict[int, str] = {}
+    wanted: dict[int, str] = {}
+    for booking_id, decision in decisions:
+        if booking_id in wanted:
+            errors[booking_id] = 'duplicate'
+        else:
+            wanted[booking_id] = decision
+
+    with transaction.atomic():
+        space_ids = sorted(set(Booking.objects.filter(id__in=wanted).values_list('space_id', flat=True)))
+        with ExitStack() as locks:
+            # Сначала помещения в порядке ID, затем брони — в том же порядке, что и confirm_booking,
+            # чтобы пачка не взаимоблокировалась ни с другими пачками, ни с одиночными подтверждениями
+            for space_id in space_ids:
+                locks.enter_context(space_lock(space_id))
+            locked = set(space_ids)
+            rows = {
+                row[0]: row[1:]
+                for row in Booking.objects.select_for_update().filter(id__in=wanted).values_list('id', 'space_id', 'date_from', 'date_to', 'status')
+            }
+            cancel_ids, confirm_ids = [], []
+            for booking_id, decision in wanted.items():
+                if booking_id not in rows:
+                    errors[booking_id] = 'not_found'
+                elif rows[booking_id][3] != Booking.Status.NEWBOOK:
+                    errors[booking_id] = 'not_pending'
+                elif decision == CANCEL:
+                    cancel_ids.append(booking_id)
+                elif rows[booking_id][0] not in locked:
+                    # Бронь перенесли в другое помещение после первого чтения; его блокировка не взята
+                    errors[booking_id] = 'conflict'
+                else:
+                    confirm_ids.append(booking_id)
+
+            slots: dict[int, ConfirmedSlots] = defaultdict(lambda: ConfirmedSlots([]))
+            if confirm_ids:
+                window_from = min(rows[booking_id][1] for booking_id in confirm_ids)
+                window_to = max(rows[booking_id][2] for booking_id in confirm_ids)
+                grouped: dict[int, list[tuple[datetime, datetime]]] = defaultdict(list)
+                for space_id, date_from, date_to in Booking.objects.filter(
+                    space_id__in={rows[booking_id][0] for booking_id in confirm_ids},
+                    status=Booking.Status.CONFIRMATION,
+                    date_from__lt=window_to,
+                    date_to__gt=window_from,
+                ).values_list('space_id', 'date_from', 'date_to'):
+                    grouped[space_id].append((date_from, date_to))
+                for space_id, intervals in grouped.items():
+                    slots[space_id] = ConfirmedSlots(intervals)
+
+            accepted = []
+            for booking_id in confirm_ids:
+                space_id, date_from, date_to, _ = rows[booking_id]
+                if slots[space_id].is_free(date_from, date_to):
+                    slots[space_id].add(date_from, date_to)
+                    accepted.append(booking_id)
+                else:
+                    errors[booking_id] = 'conflict'
+
+            with _overlap_guard():
+                Booking.objects.filter(id__in=cancel_ids, status=Booking.Status.NEWBOOK).update(status=Booking.Status.CANCELEDBEFORECONFIRMATION)
+                Booking.objects.filter(id__in=accepted, status=Booking.Status.NEWBOOK).update(status=Booking.Status.CONFIRMATION)
+            rejected = reject_pending_overlaps([rows[booking_id][:3] for booking_id in accepted], accepted)
+
+        for booking_id in rejected:
+            errors.pop(booking_id, None)
+        changed = cancel_ids + accepted
+        if changed:
+            changed_spaces = sorted({rows[booking_id][0] for booking_id in changed})
+            confirmed_spaces = sorted({rows[booking_id][0] for booking_id in accepted})
+            transaction.on_commit(lambda: bookings_changed.send(sender=Booking, space_ids=changed_spaces, confirmed_space_ids=confirmed_spaces))
+    return changed, rejected, errors
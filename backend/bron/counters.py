@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Booking, Registration
+
+
+def counters_key(user_id: int) -> str:
+    return f'bron:me:counters:{user_id}'
+
+
+def counters_ttl() -> int:
+    """
+    Время жизни закэшированных счётчиков пользователя в секундах
+    """
+    return getattr(settings, 'USER_COUNTERS_TTL', 60 * 60)
+
+
+def user_counters(user_id: int) -> dict[str, int]:
+    """
+    Количество регистраций и бронирований пользователя
+
+    Счётчики кэшируются и сбрасываются сигналами при изменении броней и регистраций
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Словарь с total_events и total_bookings
+    """
+    counters = cache.get(counters_key(user_id))
+    if counters is None:
+        counters = {
+            'total_events': Registration.objects.filter(user_id=user_id).count(),
+            'total_bookings': Booking.objects.filter(user_id=user_id).count(),
+        }
+        cache.set(counters_key(user_id), counters, counters_ttl())
+    return counters
+
+
+def invalidate_user_counters(user_id: int) -> None:
+    """
+    Сбросить закэшированные счётчики пользователя
+    """
+    cache.delete(counters_key(user_id))
@@ -0,0 +1,93 @@
+from decimal import Decimal
+from typing import Optional
+
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+from django.http import QueryDict
+from rest_framework.request import Request
+
+from .filters import SpaceFilter
+from .items import item_bitsets
+from .models import Space
+
+# Границы групп вместимости включительно; None — без верхней границы
+CAPACITY_BUCKETS = ((0, 10), (11, 30), (31, 100), (101, None))
+
+
+def capacity_bucket(capacity: int) -> int:
+    """
+    Номер группы вместимости из CAPACITY_BUCKETS
+    """
+    for idx, (_, upper) in enumerate(CAPACITY_BUCKETS):
+        if upper is None or capacity <= upper:
+            return idx
+    return len(CAPACITY_BUCKETS) - 1
+
+
+def space_facets(params: QueryDict, request: Optional[Request] = None) -> dict:
+    """
+    Количество помещений по городам, особенностям и группам вместимости для текущих фильтров
+
+    Кандидаты отбираются SpaceFilter без city и min_capacity одним запросом
+    (ID, вместимость, город и совпадение с фильтром city, вычисленное базой
+    тем же lookup, что и в SpaceFilter), после чего все счётчики считаются за один проход.
+    Счётчик каждого варианта показывает, сколько помещений останется, если выбрать
+    его вместо текущего значения той же группы: города — без фильтра city,
+    вместимость — без min_capacity, особенности — со всеми фильтрами, так как
+    особенности отбираются по И. Особенности считаются по маскам item_bitsets
+
+    Args:
+        params: Параметры SpaceFilter (q, city, min_capacity, item, date_from, date_to)
+        request: Объект запроса для SpaceFilter
+
+    Returns:
+        Словарь total, cities, items и capacity
+
+    Raises:
+        ValueError: Неверное значение параметра фильтра
+    """
+    filterset = SpaceFilter(params, queryset=Space.check_visiable.all(), request=request)
+    if not filterset.is_valid():
+        raise ValueError('; '.join(f'{name}: {" ".join(errors)}' for name, errors in filterset.errors.items()))
+    city: str = filterset.form.cleaned_data.get('city') or ''
+    min_capacity: Optional[Decimal] = filterset.form.cleaned_data.get('min_capacity')
+
+    base_params = params.copy()
+    for name in ('city', 'min_capacity'):
+        base_params.pop(name, None)
+    rows = SpaceFilter(base_params, queryset=Space.check_visiable.all(), request=request).qs.order_by()
+    if city:
+        city_filter = filterset.filters['city']
+        rows = rows.annotate(in_city=ExpressionWrapper(
+            Q(**{f'{city_filter.field_name}__{city_filter.lookup_expr}': city}), output_field=BooleanField(),
+        ))
+    else:
+        rows = rows.annotate(in_city=Value(True))
+
+    cities: dict[str, int] = {}
+    buckets = [0] * len(CAPACITY_BUCKETS)
+    matched: list[int] = []
+    for space_id, capacity, space_city, in_city in rows.values_list('id', 'capacity', 'building_id__city', 'in_city'):
+        in_capacity = min_capacity is None or capacity >= min_capacity
+        if in_capacity and space_city:
+            cities[space_city] = cities.get(space_city, 0) + 1
+        if in_city:
+            buckets[capacity_bucket(capacity)] += 1
+        if in_city and in_capacity:
+            matched.append(space_id)
+
+    items = item_bitsets.count_items(matched)
+    return {
+        'total': len(matched),
+        'cities': [
+            {'city': name, 'count': count}
+            for name, count in sorted(cities.items(), key=lambda pair: (-pair[1], pair[0]))
+        ],
+        'items': [
+            {'id': item_id, 'name': name, 'count': count}
+            for item_id, (name, count) in sorted(items.items(), key=lambda pair: (-pair[1][1], pair[1][0], pair[0]))
+        ],
+        'capacity': [
+            {'min': lower, 'max': upper, 'count': count}
+            for (lower, upper), count in zip(CAPACITY_BUCKETS, buckets)
+        ],
+    }
@@ -1,10 +1,31 @@
+import re
+
 import django_filters
 from django.db.models import Q, QuerySet
 from django.utils import timezone
 from datetime import datetime
 from typing import Any
 
-from .models import Space, Booking
+from .autocomplete import normalize
+from .availability import availability_index
+from .items import item_bitsets
+from .models import Event, EventWithItems, ItemInEvents, Space
+from .search import search_spaces
+
+
+def contains_pattern(text: str) -> str:
+    """
+    Регулярное выражение для поиска подстроки по тем же правилам, что и подсказки:
+    «ё» совпадает с «е», дефис и пробелы взаимозаменяемы; регистр не важен благодаря iregex
+
+    Args:
+        text: Искомая строка
+
+    Returns:
+        Шаблон для lookup iregex или пустая строка, если искать нечего
+    """
+    words = normalize(text).split()
+    return r'[\s-]+'.join(''.join('[её]' if char == 'е' else re.escape(char) for char in word) for word in words)
 
 
 class SpaceFilter(django_filters.FilterSet):
@@ -25,7 +46,8 @@ class SpaceFilter(django_filters.FilterSet):
 
     def search_filter(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
         """
-        Фильтрация по имени или описанию помещения
+        Полнотекстовый поиск по названию, описанию, адресу здания и особенностям помещения
+        с учётом русской морфологии; результаты упорядочены по релевантности
 
         Args:
             queryset: Начальный набор данных
@@ -33,27 +55,35 @@ class SpaceFilter(django_filters.FilterSet):
             value: Значение для поиска
 
         Returns:
-            Отфильтрованный QuerySet
+            Отфильтрованный QuerySet с позицией в выдаче search_rank
         """
-        return queryset.filter(Q(name__icontains=value) | Q(description__icontains=value))
+        return search_spaces(queryset, value)
 
     def item_filter(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
         """
-        Фильтрация по имени предмета в помещении
+        Фильтрация по особенностям помещения: нужны все перечисленные.
+        Особенности передаются повтором параметра (item=a&item=b) или через запятую;
+        отбор выполняется по битовым маскам item_bitsets, без соединений
 
         Args:
             queryset: Начальный набор данных
             name: Имя фильтра
-            value: Название предмета.
+            value: Название особенности или несколько через запятую
 
         Returns:
             Отфильтрованный QuerySet
         """
-        return queryset.filter(items_id__name__iexact=value)
+        values = self.data.getlist(name) if hasattr(self.data, 'getlist') else [value]
+        names = [item.strip() for value in values for item in value.split(',') if item.strip()]
+        if not names:
+            return queryset
+        return queryset.filter(id__in=item_bitsets.space_ids_with(names))
 
     def date_filter(self, queryset: QuerySet, name: str, value: Any) -> QuerySet:
         """
-        Фильтрация помещений по доступности в указанный период времени
+        Фильтрация помещений по доступности в указанный период времени.
+        Занятость берётся из индекса availability_index, а не из соединения
+        с таблицей бронирований
 
         Args:
             queryset: Начальный набор данных
@@ -75,25 +105,74 @@ class SpaceFilter(django_filters.FilterSet):
         if date_from and date_to and date_from >= date_to:
             return queryset.none()
 
-        if date_from and date_to:
-            return queryset.exclude(
-                Q(space_books__status=Booking.Status.CONFIRMATION) &
-                ~(
-                    Q(space_books__date_to__lte=date_from) |
-                    Q(space_books__date_from__gte=date_to)
-                )
-            )
-        elif date_from:
-            return queryset.exclude(
-                Q(space_books__status=Booking.Status.CONFIRMATION) &
-                Q(space_books__date_from__lte=date_from) &
-                Q(space_books__date_to__gt=date_from)
-            )
-        elif date_to:
-            return queryset.exclude(
-                Q(space_books__status=Booking.Status.CONFIRMATION) &
-                Q(space_books__date_from__lt=date_to) &
-                Q(space_books__date_to__gte=date_to)
-            )
+        busy_ids = availability_index.busy_space_ids(date_from, date_to)
+        if busy_ids:
+            return queryset.exclude(id__in=busy_ids)
+        return queryset
+
+
+class EventFilter(django_filters.FilterSet):
+    """
+    Фильтр для модели Event по периоду, организатору, помещению, особенностям и тексту
+    """
+    q = django_filters.CharFilter(method='text_filter')
+    date_from = django_filters.DateTimeFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateTimeFilter(field_name='date', lookup_expr='lt')
+    org_id = django_filters.NumberFilter(field_name='org_id')
+    space_id = django_filters.NumberFilter(field_name='space_id')
+    item = django_filters.CharFilter(method='item_filter')
+
+    class Meta:
+        model = Event
+        fields = ['q', 'date_from', 'date_to', 'org_id', 'space_id', 'item']
+
+    def text_filter(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        """
+        Поиск подстроки в названии или описании мероприятия регулярным выражением
+        из contains_pattern: в отличие от icontains на SQLite, регистр кириллицы не важен.
+        Условие входит в WHERE, поэтому выражение проверяется для каждого мероприятия,
+        прошедшего остальные фильтры, до сортировки и LIMIT страницы: индекса под него
+        нет, и стоимость растёт с размером отфильтрованного набора, а не страницы
+
+        Args:
+            queryset: Начальный набор данных
+            name: Имя фильтра
+            value: Значение для поиска
+
+        Returns:
+            Отфильтрованный QuerySet
+        """
+        pattern = contains_pattern(value)
+        if not pattern:
+            return queryset
+        return queryset.filter(Q(name__iregex=pattern) | Q(description__iregex=pattern))
 
+    def item_filter(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        """
+        Фильтрация по особенностям мероприятия: нужны все перечисленные.
+        Особенности передаются повтором параметра (item=a&item=b) или через запятую.
+        Названия сопоставляются с ID по небольшому справочнику особенностей, после чего
+        каждая особенность — подзапрос по индексу (item, event) промежуточной таблицы
+        вместо соединения, которое размножало бы строки мероприятий
+
+        Args:
+            queryset: Начальный набор данных
+            name: Имя фильтра
+            value: Название особенности или несколько через запятую
+
+        Returns:
+            Отфильтрованный QuerySet
+        """
+        values = self.data.getlist(name) if hasattr(self.data, 'getlist') else [value]
+        names = {item.strip().lower() for value in values for item in value.split(',') if item.strip()}
+        if not names:
+            return queryset
+        item_ids: dict[str, list[int]] = {}
+        for item_id, item_name in ItemInEvents.objects.values_list('id', 'name'):
+            if item_name.lower() in names:
+                item_ids.setdefault(item_name.lower(), []).append(item_id)
+        if len(item_ids) < len(names):
+            return queryset.none()
+        for ids in item_ids.values():
+            queryset = queryset.filter(pk__in=EventWithItems.objects.filter(item_id__in=ids).values('event_id'))
         return queryset
@@ -0,0 +1,121 @@
+from typing import Iterable
+
+from .models import ItemInSpaces, Space
+from .sync import SyncedIndex
+
+
+class ItemBitsets(SyncedIndex):
+    """
+    Особенности помещений в виде битовых масок в памяти процесса
+
+    Каждой особенности при построении назначается номер бита подряд с нуля,
+    и бит выставлен в маске помещения, если особенность в нём есть. Отбор
+    помещений со всеми нужными особенностями — одно побитовое И на помещение
+    вместо соединения с таблицей связей на каждую особенность. Изменения связей
+    расходятся по процессам через журнал SyncedIndex с ID помещений;
+    переименование или удаление особенности перестраивает маски целиком
+    """
+    prefix = 'bron:items'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._masks: dict[int, int] = {}
+        self._items: dict[str, int] = {}
+        self._names: dict[int, str] = {}
+        self._bits: dict[int, int] = {}
+        self._item_ids: list[int] = []
+
+    def _bit(self, item_id: int) -> int:
+        """
+        Маска с битом особенности; особенности, появившейся после построения, назначается следующий номер
+        """
+        if item_id not in self._bits:
+            self._bits[item_id] = len(self._item_ids)
+            self._item_ids.append(item_id)
+        return 1 << self._bits[item_id]
+
+    def build(self) -> None:
+        self._names = dict(ItemInSpaces.objects.order_by('id').values_list('id', 'name'))
+        self._bits, self._item_ids = {}, []
+        items: dict[str, int] = {}
+        for item_id, name in self._names.items():
+            key = name.lower()
+            items[key] = items.get(key, 0) | self._bit(item_id)
+        masks: dict[int, int] = {}
+        for space_id, item_id in Space.items_id.through.objects.values_list('space_id', 'iteminspaces_id'):
+            masks[space_id] = masks.get(space_id, 0) | self._bit(item_id)
+        self._items, self._masks = items, masks
+
+    def apply(self, keys: list[int]) -> None:
+        masks = dict.fromkeys(keys, 0)
+        for space_id, item_id in Space.items_id.through.objects.filter(space_id__in=keys).values_list('space_id', 'iteminspaces_id'):
+            masks[space_id] |= self._bit(item_id)
+        self._masks.update(masks)
+
+    def refresh_spaces(self, space_ids: Iterable[int]) -> None:
+        """
+        Перечитать маски помещений после изменения их особенностей
+        в этом процессе и сообщить об изменении остальным
+
+        Args:
+            space_ids: ID помещений
+        """
+        self.publish(space_ids)
+
+    def invalidate(self) -> None:
+        """
+        Перестроить маски после переименования или удаления особенности во всех процессах
+        """
+        self.publish(None)
+
+    def space_ids_with(self, names: Iterable[str]) -> set[int]:
+        """
+        Помещения, в которых есть все перечисленные особенности
+
+        Одноимённые особенности взаимозаменяемы: для каждого названия достаточно любой из них
+
+        Args:
+            names: Названия особенностей без учёта регистра
+
+        Returns:
+            Множество ID помещений
+        """
+        self._ensure_loaded()
+        with self._lock:
+            wanted = [self._items.get(name.lower(), 0) for name in set(names)]
+            if not all(wanted):
+                return set()
+            single = [mask for mask in wanted if mask & (mask - 1) == 0]
+            required = 0
+            for mask in single:
+                required |= mask
+            alternatives = [mask for mask in wanted if mask & (mask - 1)]
+            return {
+                space_id for space_id, mask in self._masks.items()
+                if mask & required == required and all(mask & alternative for alternative in alternatives)
+            }
+
+    def count_items(self, space_ids: Iterable[int]) -> dict[int, tuple[str, int]]:
+        """
+        Сколько помещений из набора имеют каждую особенность
+
+        Args:
+            space_ids: ID помещений
+
+        Returns:
+            Словарь ID особенности -> (название, количество помещений) для особенностей, которые встречаются
+        """
+        self._ensure_loaded()
+        counts: dict[int, int] = {}
+        with self._lock:
+            for space_id in space_ids:
+                mask = self._masks.get(space_id, 0)
+                while mask:
+                    lowest = mask & -mask
+                    item_id = self._item_ids[lowest.bit_length() - 1]
+                    counts[item_id] = counts.get(item_id, 0) + 1
+                    mask ^= lowest
+            return {item_id: (self._names.get(item_id, ''), count) for item_id, count in counts.items()}
+
+
+item_bitsets = ItemBitsets()
@@ -0,0 +1,198 @@
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from threading import Lock, Thread
+from typing import Any, Optional
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .pdf import build_snapshot, cached_pdf, render_event_pdf, snapshot_etag, snapshot_queryset, store_pdf
+
+
+class JobStatus:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+
+
+def _init_worker() -> None:
+    django.setup()
+
+
+def export_workers() -> int:
+    """
+    Количество процессов для отрисовки PDF; 0 — рисовать в потоке задачи
+    """
+    return getattr(settings, 'PDF_EXPORT_WORKERS', min(4, os.cpu_count() or 1))
+
+
+def export_root() -> str:
+    """
+    Каталог для готовых архивов; он не раздаётся как MEDIA, архивы скачиваются только через API
+    """
+    return getattr(settings, 'PDF_EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+
+
+def job_ttl() -> int:
+    """
+    Время хранения состояния задачи в секундах
+    """
+    return getattr(settings, 'PDF_EXPORT_TTL', 60 * 60 * 24)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Общий на процесс пул воркеров, создаётся при первой задаче
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=export_workers(), initializer=_init_worker)
+        return _pool
+
+
+def job_key(job_id: str) -> str:
+    return f'bron:jobs:{job_id}'
+
+
+def get_job(job_id: str) -> Optional[dict[str, Any]]:
+    """
+    Состояние задачи экспорта
+
+    Args:
+        job_id: ID задачи
+
+    Returns:
+        Словарь с полями id, status, total, done, error, created или None, если задача не найдена
+    """
+    return cache.get(job_key(job_id))
+
+
+def _save_job(job: dict[str, Any]) -> None:
+    cache.set(job_key(job['id']), job, job_ttl())
+
+
+def archive_path(job_id: str) -> str:
+    """
+    Путь к ZIP-архиву задачи
+    """
+    return os.path.join(export_root(), f'{job_id}.zip')
+
+
+def cleanup_exports() -> list[str]:
+    """
+    Удалить архивы, которые старше PDF_EXPORT_TTL: состояние их задач уже истекло в кэше,
+    и скачать их через API нельзя. Незавершённые .part-файлы удаляются по тому же сроку
+
+    Returns:
+        Имена удалённых файлов
+    """
+    root = export_root()
+    if not os.path.isdir(root):
+        return []
+    expired = time.time() - job_ttl()
+    removed = []
+    for entry in os.scandir(root):
+        if not entry.is_file() or not entry.name.endswith(('.zip', '.zip.part')):
+            continue
+        try:
+            if entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+                removed.append(entry.name)
+        except FileNotFoundError:
+            # Файл уже удалил другой процесс
+            continue
+    return removed
+
+
+def upcoming_events() -> QuerySet:
+    """
+    Предстоящие видимые мероприятия
+    """
+    return snapshot_queryset().filter(date__gte=timezone.now(), is_visiable=True).order_by('date', 'id')
+
+
+def export_events(events: QuerySet) -> dict[str, Any]:
+    """
+    Поставить в очередь экспорт PDF-сводок мероприятий в ZIP-архив
+
+    Данные мероприятий читаются сразу, в потоке запроса, тремя запросами;
+    отрисовка и упаковка выполняются в фоне, поэтому ответ не ждёт генерации
+
+    Args:
+        events: Мероприятия из snapshot_queryset
+
+    Returns:
+        Начальное состояние задачи
+    """
+    snapshots = [build_snapshot(event) for event in events]
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': JobStatus.QUEUED,
+        'total': len(snapshots),
+        'done': 0,
+        'error': None,
+        'created': timezone.now().isoformat(),
+    }
+    _save_job(job)
+    Thread(target=_run_export, args=(dict(job), snapshots), daemon=True).start()
+    return job
+
+
+def _run_export(job: dict[str, Any], snapshots: list[dict[str, Any]]) -> None:
+    """
+    Координатор задачи: берёт готовые PDF из кэша, остальные отдаёт пулу и пишет архив
+    """
+    job['status'] = JobStatus.RUNNING
+    _save_job(job)
+    path = archive_path(job['id'])
+    part = f'{path}.part'
+    try:
+        os.makedirs(export_root(), exist_ok=True)
+        cleanup_exports()
+        with zipfile.ZipFile(part, 'w', zipfile.ZIP_DEFLATED) as archive:
+            pending: dict[Future, tuple[dict[str, Any], str]] = {}
+            for snapshot in snapshots:
+                etag = snapshot_etag(snapshot)
+                content = cached_pdf(snapshot['id'], etag)
+                if content is not None:
+                    archive.writestr(f"event_{snapshot['id']}.pdf", content)
+                    job['done'] += 1
+                elif export_workers():
+                    pending[get_pool().submit(render_event_pdf, snapshot)] = (snapshot, etag)
+                else:
+                    content = render_event_pdf(snapshot)
+                    store_pdf(snapshot['id'], etag, content)
+                    archive.writestr(f"event_{snapshot['id']}.pdf", content)
+                    job['done'] += 1
+            _save_job(job)
+
+            for future in as_completed(pending):
+                snapshot, etag = pending[future]
+                content = future.result()
+                store_pdf(snapshot['id'], etag, content)
+                archive.writestr(f"event_{snapshot['id']}.pdf", content)
+                job['done'] += 1
+                _save_job(job)
+        os.replace(part, path)
+        job['status'] = JobStatus.DONE
+    except Exception as exc:
+        if os.path.exists(part):
+            os.remove(part)
+        job['status'] = JobStatus.FAILED
+        job['error'] = str(exc)
+    _save_job(job)
+    # Кэш хранится в базе данных: соединение потока задачи закрывается вместе с потоком
+    connection.close()
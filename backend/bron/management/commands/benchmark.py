@@ -0,0 +1,303 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from bron.autocomplete import Autocomplete
+from bron.availability import AvailabilityIndex
+from bron.booking import confirm_booking
+from bron.facets import CAPACITY_BUCKETS, space_facets
+from bron.filters import SpaceFilter
+from bron.items import item_bitsets
+from bron.occupancy import bucket_count, occupancy_matrix, pack_rows
+from bron.models import Booking, Building, ItemInSpaces, Space
+from bron.sync import SyncedIndex
+from bron.tokens import user_cache
+
+
+class Rollback(Exception):
+    """
+    Исключение для отката тестовых данных после замера
+    """
+
+
+@contextmanager
+def rollback() -> Iterator[None]:
+    """
+    Выполнить блок в транзакции и откатить все созданные в нём данные
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Среднее время вызова в миллисекундах
+
+    Args:
+        func: Замеряемая функция
+        repeat: Количество повторов
+
+    Returns:
+        Среднее время одного вызова, мс
+    """
+    started = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - started) * 1000 / repeat
+
+
+def polled(index: SyncedIndex, func: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Вызов, перед которым индекс обязан проверить журнал в кэше (запрос к bron_cache),
+    как первое чтение после SYNC_POLL_INTERVAL
+    """
+    def call() -> Any:
+        index._checked = float('-inf')
+        return func()
+    return call
+
+
+def create_spaces(count: int) -> list[Space]:
+    """
+    Создать пользователя, здание и указанное количество видимых помещений
+    """
+    building = Building.objects.create(city='Бенчмарк', street='Тестовая', house='1')
+    Space.objects.bulk_create(
+        Space(name=f'Помещение {i}', description='', capacity=i % 50, building_id=building, room_number=str(i), is_visiable=True)
+        for i in range(count)
+    )
+    return list(Space.objects.filter(building_id=building))
+
+
+def create_confirmed_bookings(spaces: list[Space], count: int, user: User) -> None:
+    """
+    Создать подтверждённые двухчасовые брони, равномерно распределённые по помещениям, начиная с завтрашнего дня
+    """
+    start = timezone.now() + timedelta(days=1)
+    per_space = count // len(spaces)
+    Booking.objects.bulk_create((
+        Booking(
+            user_id=user,
+            space_id=space,
+            date_from=start + timedelta(hours=3 * i),
+            date_to=start + timedelta(hours=3 * i + 2),
+            status=Booking.Status.CONFIRMATION,
+        )
+        for space in spaces for i in range(per_space)
+    ), batch_size=5000)
+
+
+class Command(BaseCommand):
+    help = 'Замеры производительности подсистем бронирования'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('scenario', choices=sorted(self.scenarios()))
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Размеры набора данных через запятую')
+        parser.add_argument('--repeat', type=int, default=200, help='Количество повторов каждого замера')
+
+    def scenarios(self) -> dict[str, Callable[..., None]]:
+        return {
+            'availability': self.bench_availability,
+            'auth': self.bench_auth,
+            'confirm': self.bench_confirm,
+            'occupancy': self.bench_occupancy,
+            'autocomplete': self.bench_autocomplete,
+            'facets': self.bench_facets,
+        }
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.scenarios()[options['scenario']](sizes, options['repeat'])
+
+    def bench_availability(self, sizes: list[int], repeat: int) -> None:
+        """
+        Сравнение индекса занятости с исключением через соединение space_books
+
+        index — чтение в пределах SYNC_POLL_INTERVAL, только память; poll — чтение
+        с проверкой журнала, то есть с одним запросом к bron_cache
+        """
+        self.stdout.write(f'{"bookings":>10} {"index, ms":>12} {"poll, ms":>10} {"orm join, ms":>14}')
+        for size in sizes:
+            with rollback():
+                user = User.objects.create_user(username='benchmark')
+                spaces = create_spaces(200)
+                create_confirmed_bookings(spaces, size, user)
+
+                date_from = timezone.now() + timedelta(days=30)
+                date_to = date_from + timedelta(hours=1)
+                index = AvailabilityIndex()
+                index.rebuild()
+
+                def legacy() -> list[int]:
+                    return list(Space.check_visiable.exclude(
+                        Q(space_books__status=Booking.Status.CONFIRMATION) &
+                        ~(Q(space_books__date_to__lte=date_from) | Q(space_books__date_from__gte=date_to))
+                    ).values_list('id', flat=True))
+
+                index_ms = measure(lambda: index.busy_space_ids(date_from, date_to), repeat)
+                poll_ms = measure(polled(index, lambda: index.busy_space_ids(date_from, date_to)), repeat)
+                legacy_ms = measure(legacy, max(1, repeat // 20))
+                self.stdout.write(f'{size:>10} {index_ms:>12.4f} {poll_ms:>10.4f} {legacy_ms:>14.4f}')
+
+    def bench_auth(self, sizes: list[int], repeat: int) -> None:
+        """
+        Запросы и время на запрос с кэшем пользователей и без него; токен без ролей,
+        чтобы аутентификация шла через загрузку пользователя
+        """
+        self.stdout.write(f'{"endpoint":>14} {"queries":>8} {"cached":>7} {"ms":>10} {"cached ms":>10}')
+        with rollback():
+            user = User.objects.create_user(username='benchmark')
+            create_spaces(20)
+            client = Client(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(user).access_token}')
+
+            for url in ('/api/spaces/', '/api/me/'):
+                def cold() -> None:
+                    user_cache.clear()
+                    client.get(url)
+
+                def queries(func: Callable[[], None]) -> int:
+                    with CaptureQueriesContext(connection) as captured:
+                        func()
+                    return len([
+                        query for query in captured.captured_queries
+                        if 'silk_' not in query['sql'] and not query['sql'].startswith(('EXPLAIN', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+                    ])
+
+                client.get(url)
+                cold_queries, warm_queries = queries(cold), queries(lambda: client.get(url))
+                cold_ms, warm_ms = measure(cold, repeat), measure(lambda: client.get(url), repeat)
+                self.stdout.write(f'{url:>14} {cold_queries:>8} {warm_queries:>7} {cold_ms:>10.3f} {warm_ms:>10.3f}')
+
+    def bench_confirm(self, sizes: list[int], repeat: int) -> None:
+        """
+        Время подтверждения брони в популярном помещении в зависимости от количества
+        новых броней; окно каждой подтверждаемой брони пересекают только две соседние.
+        Подтверждаются разные брони из середины набора, без отката после каждой,
+        чтобы откат точки сохранения SQLite не попадал в замер
+        """
+        self.stdout.write(f'{"pending":>10} {"rejected":>9} {"confirm, ms":>12}')
+        for size in sizes:
+            with rollback():
+                user = User.objects.create_user(username='benchmark')
+                [space] = create_spaces(1)
+                start = timezone.now() + timedelta(days=1)
+                Booking.objects.bulk_create((
+                    Booking(user_id=user, space_id=space, date_from=start + timedelta(hours=i), date_to=start + timedelta(hours=i + 2))
+                    for i in range(size)
+                ), batch_size=5000)
+                count = min(repeat, size // 8)
+                ids = list(Booking.objects.filter(space_id=space).order_by('date_from').values_list('pk', flat=True))
+                targets = iter(Booking.objects.in_bulk(ids[size // 2 - 2 * count:size // 2 + 2 * count:4]).values())
+                rejected = []
+
+                def confirm() -> None:
+                    rejected.extend(confirm_booking(next(targets)))
+
+                confirm_ms = measure(confirm, count)
+                self.stdout.write(f'{size:>10} {len(rejected) // count:>9} {confirm_ms:>12.4f}')
+
+    def bench_occupancy(self, sizes: list[int], repeat: int) -> None:
+        """
+        Матрица занятости 500 помещений × 2 недели по 15 минут против запроса
+        индекса занятости на каждый интервал, как при поиске через SpaceFilter
+        """
+        self.stdout.write(f'{"bookings":>10} {"buckets":>8} {"numpy, ms":>10} {"per window, ms":>15}')
+        for size in sizes:
+            with rollback():
+                user = User.objects.create_user(username='benchmark')
+                spaces = create_spaces(500)
+                create_confirmed_bookings(spaces, size, user)
+                space_ids = sorted(space.pk for space in spaces)
+
+                step = timedelta(minutes=15)
+                date_from = (timezone.now() + timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+                date_to = date_from + timedelta(days=14)
+                buckets = bucket_count(date_from, date_to, step)
+                index = AvailabilityIndex()
+                index.rebuild()
+
+                def per_window() -> list[set[int]]:
+                    return [index.busy_space_ids(date_from + step * i, date_from + step * (i + 1)) for i in range(buckets)]
+
+                numpy_ms = measure(lambda: pack_rows(occupancy_matrix(space_ids, date_from, date_to, step)), repeat)
+                window_ms = measure(per_window, max(1, repeat // 20))
+                self.stdout.write(f'{size:>10} {buckets:>8} {numpy_ms:>10.3f} {window_ms:>15.3f}')
+
+    def bench_autocomplete(self, sizes: list[int], repeat: int) -> None:
+        """
+        Время подсказки из префиксного индекса против istartswith по названиям помещений;
+        poll — подсказка с проверкой журнала в bron_cache
+        """
+        self.stdout.write(f'{"spaces":>10} {"index, ms":>10} {"poll, ms":>10} {"orm, ms":>10}')
+        for size in sizes:
+            with rollback():
+                create_spaces(size)
+                index = Autocomplete()
+                index.rebuild()
+
+                index_ms = measure(lambda: index.suggest('помещение 12', 5), repeat)
+                poll_ms = measure(polled(index, lambda: index.suggest('помещение 12', 5)), repeat)
+                orm_ms = measure(lambda: list(Space.check_visiable.filter(name__istartswith='помещение 12').values('id', 'name')[:5]), repeat)
+                self.stdout.write(f'{size:>10} {index_ms:>10.4f} {poll_ms:>10.4f} {orm_ms:>10.4f}')
+
+    def bench_facets(self, sizes: list[int], repeat: int) -> None:
+        """
+        Счётчики каталога за один проход против отдельного запроса SpaceFilter
+        на каждый город, особенность и группу вместимости; 20 городов, 30 особенностей
+        """
+        self.stdout.write(f'{"spaces":>10} {"one pass, ms":>13} {"per facet, ms":>14} {"queries":>8}')
+        for size in sizes:
+            with rollback():
+                buildings = Building.objects.bulk_create(Building(city=f'Город {i}', street='Тестовая', house='1') for i in range(20))
+                items = ItemInSpaces.objects.bulk_create(ItemInSpaces(name=f'Особенность {i}') for i in range(30))
+                Space.objects.bulk_create((
+                    Space(name=f'Помещение {i}', description='', capacity=i % 150, building_id=buildings[i % 20], room_number=str(i), is_visiable=True)
+                    for i in range(size)
+                ), batch_size=5000)
+                through = Space.items_id.through
+                through.objects.bulk_create((
+                    through(space_id=space_id, iteminspaces_id=items[(space_id + k * 7) % 30].pk)
+                    for space_id in Space.objects.values_list('pk', flat=True) for k in range(3)
+                ), batch_size=5000)
+                item_bitsets.rebuild()
+                params = QueryDict('item=Особенность 0')
+                cities = [building.city for building in buildings]
+
+                def per_facet() -> dict:
+                    def count(**extra: str) -> int:
+                        data = params.copy()
+                        data.update(extra)
+                        return SpaceFilter(data, queryset=Space.check_visiable.all()).qs.count()
+
+                    return {
+                        'total': count(),
+                        'cities': [count(city=city) for city in cities],
+                        'items': [count(item=item.name) for item in items],
+                        'capacity': [
+                            SpaceFilter(params, queryset=Space.check_visiable.all()).qs.filter(
+                                capacity__gte=lower, **({} if upper is None else {'capacity__lte': upper}),
+                            ).count()
+                            for lower, upper in CAPACITY_BUCKETS
+                        ],
+                    }
+
+                with CaptureQueriesContext(connection) as captured:
+                    per_facet()
+                one_pass_ms = measure(lambda: space_facets(params), repeat)
+                per_facet_ms = measure(per_facet, max(1, repeat // 20))
+                self.stdout.write(f'{size:>10} {one_pass_ms:>13.3f} {per_facet_ms:>14.3f} {len(captured.captured_queries):>8}')
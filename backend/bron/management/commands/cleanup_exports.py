@@ -0,0 +1,13 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from bron.jobs import cleanup_exports
+
+
+class Command(BaseCommand):
+    help = 'Удаление архивов выгрузки PDF старше PDF_EXPORT_TTL (для запуска по расписанию)'
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        removed = cleanup_exports()
+        self.stdout.write(self.style.SUCCESS(f'Удалено архивов: {len(removed)}'))
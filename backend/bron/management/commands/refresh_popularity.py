@@ -0,0 +1,14 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from bron.popularity import refresh_organizer_popularity, refresh_space_popularity
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчёт счётчиков популярности помещений и организаторов (для запуска по расписанию)'
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        refresh_space_popularity()
+        refresh_organizer_popularity()
+        self.stdout.write(self.style.SUCCESS('Счётчики популярности пересчитаны'))
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+OVERLAPS_SQL = (
+    'SELECT a.id, b.id, a.space_id_id FROM bron_booking a JOIN bron_booking b '
+    'ON a.space_id_id = b.space_id_id AND a.id < b.id AND a.date_from < b.date_to AND b.date_from < a.date_to '
+    "WHERE a.status = 'C' AND b.status = 'C' ORDER BY a.id, b.id LIMIT 20"
+)
+
+
+def check_overlaps(schema_editor) -> None:
+    """
+    Проверка, что среди подтверждённых броней нет пересечений, которые нарушили бы ограничение
+
+    Raises:
+        RuntimeError: Найдены пересекающиеся подтверждённые брони
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(OVERLAPS_SQL)
+        overlaps = cursor.fetchall()
+    if overlaps:
+        pairs = ', '.join(f'{first} и {second} (помещение {space_id})' for first, second, space_id in overlaps)
+        raise RuntimeError(
+            'Нельзя добавить ограничение bron_booking_no_overlap: подтверждённые брони пересекаются: '
+            f'{pairs}. Отмените одну бронь из каждой пары (статус CAC) и повторите migrate'
+        )
+
+
+def add_overlap_constraint(apps, schema_editor) -> None:
+    """
+    Запрет пересечения подтверждённых броней одного помещения на уровне PostgreSQL
+
+    До этой миграции пересечения не запрещались, поэтому сначала проверяется,
+    что их нет: иначе ALTER TABLE упал бы с ошибкой без указания броней
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    check_overlaps(schema_editor)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE bron_booking ADD CONSTRAINT bron_booking_no_overlap '
+        'EXCLUDE USING gist (space_id_id WITH =, tstzrange(date_from, date_to) WITH &&) '
+        "WHERE (status = 'C')"
+    )
+
+
+def remove_overlap_constraint(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE bron_booking DROP CONSTRAINT IF EXISTS bron_booking_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0025_alter_space_is_visiable'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 10:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0026_booking_no_overlap_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['space_id', 'status', 'date_from', 'date_to'], name='booking_space_status_dates'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'C')), fields=['space_id', 'date_from', 'date_to'], name='booking_confirmed_dates'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'date_from'], name='booking_status_date_from'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_visiable', True)), fields=['date'], name='event_visible_date'),
+        ),
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['user_id', 'space_id'], name='favourite_user_space'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['event_id', 'status'], name='registration_event_status'),
+        ),
+    ]
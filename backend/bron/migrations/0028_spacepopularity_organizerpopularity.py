@@ -0,0 +1,92 @@
+# Generated by Django 5.2 on 2026-10-18 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_by(model, field: str, **filters) -> Coalesce:
+    """
+    Коррелированный подзапрос с количеством записей модели, ссылающихся на строку
+
+    Как count_by_space в bron.popularity: подзапросы не строят произведение
+    отзывов, избранного и бронирований, как Count(..., distinct=True) по JOIN
+    """
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}, **filters
+    ).order_by().values(field).annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_popularity(apps, schema_editor) -> None:
+    """
+    Начальное заполнение счётчиков популярности по существующим данным
+    """
+    Space = apps.get_model('bron', 'Space')
+    Organizer = apps.get_model('bron', 'Organizer')
+    SpacesReview = apps.get_model('bron', 'SpacesReview')
+    Favourite = apps.get_model('bron', 'Favourite')
+    Booking = apps.get_model('bron', 'Booking')
+    Event = apps.get_model('bron', 'Event')
+    SpacePopularity = apps.get_model('bron', 'SpacePopularity')
+    OrganizerPopularity = apps.get_model('bron', 'OrganizerPopularity')
+
+    spaces = Space.objects.order_by().annotate(
+        review_count=count_by(SpacesReview, 'space_id', is_visiable=True),
+        fav_count=count_by(Favourite, 'space_id'),
+        booking_count=count_by(Booking, 'space_id', status='C')
+    ).values_list('id', 'review_count', 'fav_count', 'booking_count')
+    SpacePopularity.objects.bulk_create(
+        SpacePopularity(
+            space_id_id=space_id,
+            review_count=review_count,
+            fav_count=fav_count,
+            booking_count=booking_count,
+            score=review_count + fav_count + booking_count,
+        )
+        for space_id, review_count, fav_count, booking_count in spaces
+    )
+    organizers = Organizer.objects.order_by().annotate(event_count=count_by(Event, 'org_id')).values_list('id', 'event_count')
+    OrganizerPopularity.objects.bulk_create(
+        OrganizerPopularity(org_id_id=org_id, event_count=event_count)
+        for org_id, event_count in organizers
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0027_booking_event_registration_favourite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizerPopularity',
+            fields=[
+                ('org_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='bron.organizer', verbose_name='Организатор')),
+                ('event_count', models.IntegerField(db_index=True, default=0, verbose_name='Мероприятия')),
+                ('update_date', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Популярность организаторов',
+                'verbose_name_plural': 'Популярность организаторов',
+            },
+        ),
+        migrations.CreateModel(
+            name='SpacePopularity',
+            fields=[
+                ('space_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='bron.space', verbose_name='Помещение')),
+                ('review_count', models.IntegerField(default=0, verbose_name='Отзывы')),
+                ('fav_count', models.IntegerField(default=0, verbose_name='В избранном')),
+                ('booking_count', models.IntegerField(default=0, verbose_name='Подтверждённые брони')),
+                ('score', models.IntegerField(db_index=True, default=0, verbose_name='Популярность')),
+                ('update_date', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Популярность помещений',
+                'verbose_name_plural': 'Популярность помещений',
+            },
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 10:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def fill_hourly_stats(apps, schema_editor) -> None:
+    """
+    Начальное заполнение почасовой статистики по существующим бронированиям и регистрациям
+    """
+    Booking = apps.get_model('bron', 'Booking')
+    Registration = apps.get_model('bron', 'Registration')
+    BookingHourlyStat = apps.get_model('bron', 'BookingHourlyStat')
+    RegistrationHourlyStat = apps.get_model('bron', 'RegistrationHourlyStat')
+
+    bookings = Booking.objects.order_by().annotate(hour=TruncHour('book_date')).values('space_id', 'hour').annotate(count=Count('id'))
+    BookingHourlyStat.objects.bulk_create(
+        (BookingHourlyStat(space_id_id=row['space_id'], hour=row['hour'], count=row['count']) for row in bookings),
+        batch_size=1000,
+    )
+    regs = Registration.objects.order_by().annotate(hour=TruncHour('reg_date')).values('event_id', 'hour').annotate(count=Count('id'))
+    RegistrationHourlyStat.objects.bulk_create(
+        (RegistrationHourlyStat(event_id_id=row['event_id'], hour=row['hour'], count=row['count']) for row in regs),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0028_spacepopularity_organizerpopularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('space_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_stats', to='bron.space', verbose_name='Помещение')),
+            ],
+            options={
+                'verbose_name': 'Почасовая статистика бронирований',
+                'verbose_name_plural': 'Почасовая статистика бронирований',
+                'constraints': [models.UniqueConstraint(fields=('hour', 'space_id'), name='booking_stat_hour_space')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistrationHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('event_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_stats', to='bron.event', verbose_name='Мероприятие')),
+            ],
+            options={
+                'verbose_name': 'Почасовая статистика регистраций',
+                'verbose_name_plural': 'Почасовая статистика регистраций',
+                'constraints': [models.UniqueConstraint(fields=('hour', 'event_id'), name='registration_stat_hour_event')],
+            },
+        ),
+        migrations.RunPython(fill_hourly_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# (таблица, столбец) для поиска справочника пользователей по префиксу без учёта регистра
+SEARCH_COLUMNS = [
+    ('auth_user', 'username'),
+    ('auth_user', 'first_name'),
+    ('auth_user', 'last_name'),
+    ('bron_profile', 'patronymic'),
+]
+
+
+def add_search_indexes(apps, schema_editor) -> None:
+    """
+    Индексы под istartswith: на PostgreSQL — по UPPER(столбец) с varchar_pattern_ops,
+    на SQLite — по столбцу с COLLATE NOCASE, как того требует оптимизация LIKE
+    """
+    vendor = schema_editor.connection.vendor
+    for table, column in SEARCH_COLUMNS:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_{column}_prefix ON {table} (UPPER({column}) varchar_pattern_ops)')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_{column}_prefix ON {table} ({column} COLLATE NOCASE)')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS auth_user_first_name_id ON auth_user (first_name, id)')
+
+
+def remove_search_indexes(apps, schema_editor) -> None:
+    for table, column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_prefix')
+    schema_editor.execute('DROP INDEX IF EXISTS auth_user_first_name_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('bron', '0029_bookinghourlystat_registrationhourlystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
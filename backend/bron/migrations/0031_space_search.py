@@ -0,0 +1,64 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'bron_space_search'
+
+SPACE_ROWS = (
+    'FROM bron_space s JOIN bron_building b ON b.id = s.building_id_id '
+    'LEFT JOIN (SELECT si.space_id, {items} AS names FROM bron_space_items_id si '
+    'JOIN bron_iteminspaces i ON i.id = si.iteminspaces_id GROUP BY si.space_id) items ON items.space_id = s.id'
+)
+
+# Документы пишутся без выделения основ: основа слова — его начало, а запрос ищет основы
+# как префиксы, поэтому такие документы находятся так же. При следующем изменении
+# помещения bron.search перезапишет документ основами
+SQLITE_FILL = (
+    f'INSERT INTO {SEARCH_TABLE} (space_id, name, description, address, items) '
+    "SELECT s.id, s.name, s.description, b.city || ' ' || b.street || ' ' || b.house, COALESCE(items.names, '') "
+    + SPACE_ROWS.format(items="group_concat(i.name, ' ')")
+)
+
+POSTGRESQL_FILL = (
+    f'INSERT INTO {SEARCH_TABLE} (space_id, document) '
+    "SELECT s.id, setweight(to_tsvector('russian', s.name), 'A') || setweight(to_tsvector('russian', s.description), 'C') || "
+    "setweight(to_tsvector('russian', b.city || ' ' || b.street || ' ' || b.house), 'D') || "
+    "setweight(to_tsvector('russian', COALESCE(items.names, '')), 'B') "
+    + SPACE_ROWS.format(items="string_agg(i.name, ' ')")
+    + ' ON CONFLICT (space_id) DO NOTHING'
+)
+
+
+def create_search_index(apps, schema_editor) -> None:
+    """
+    Полнотекстовый индекс помещений: на SQLite — виртуальная таблица FTS5,
+    на PostgreSQL — таблица с tsvector и GIN-индексом; индекс заполняется по текущим данным
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            "space_id UNINDEXED, name, description, address, items, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(SQLITE_FILL)
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'space_id bigint PRIMARY KEY REFERENCES bron_space (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)')
+        schema_editor.execute(POSTGRESQL_FILL)
+
+
+def drop_search_index(apps, schema_editor) -> None:
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0030_user_directory_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0031_space_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_visiable', True)), fields=['org_id', 'date'], name='event_visible_org_date'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_visiable', True)), fields=['space_id', 'date'], name='event_visible_space_date'),
+        ),
+        migrations.AddIndex(
+            model_name='eventwithitems',
+            index=models.Index(fields=['item', 'event'], name='event_items_item_event'),
+        ),
+    ]
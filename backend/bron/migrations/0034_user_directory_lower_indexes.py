@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# (таблица, столбец) для поиска справочника пользователей по префиксу без учёта регистра
+SEARCH_COLUMNS = [
+    ('auth_user', 'username'),
+    ('auth_user', 'first_name'),
+    ('auth_user', 'last_name'),
+    ('bron_profile', 'patronymic'),
+]
+
+
+def add_lower_indexes(apps, schema_editor) -> None:
+    """
+    Индексы по bron_lower(столбец) на SQLite вместо индексов COLLATE NOCASE из 0030:
+    NOCASE не различает регистр только для ASCII, поэтому кириллица по ним не искалась.
+    bron_lower регистрируется в каждом соединении сигналом connection_created.
+    На PostgreSQL остаются индексы по UPPER(столбец) из 0030
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_prefix')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_{column}_lower ON {table} (bron_lower({column}))')
+
+
+def remove_lower_indexes(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_lower')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_{column}_prefix ON {table} ({column} COLLATE NOCASE)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0033_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_lower_indexes, remove_lower_indexes),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bron', '0034_user_directory_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpaceSearchDocument',
+            fields=[
+                ('space_id', models.OneToOneField(db_column='space_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='bron.space', verbose_name='Помещение')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ помещения',
+                'verbose_name_plural': 'Поисковые документы помещений',
+                'db_table': 'bron_space_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -161,6 +161,11 @@ class Booking(models.Model):
         verbose_name = "Бронирования"
         verbose_name_plural = 'Бронирования'
         ordering = ['-book_date']
+        indexes = [
+            models.Index(fields=['space_id', 'status', 'date_from', 'date_to'], name='booking_space_status_dates'),
+            models.Index(fields=['space_id', 'date_from', 'date_to'], condition=models.Q(status='C'), name='booking_confirmed_dates'),
+            models.Index(fields=['status', 'date_from'], name='booking_status_date_from'),
+        ]
     
     def __str__(self) -> str:
         return self.space_id.name + ' на ' + self.date_from.strftime("%d.%m.%Y") + '-' + self.date_to.strftime("%d.%m.%Y") + ' для ' + self.user_id.first_name + ' ' + self.user_id.last_name
@@ -225,6 +230,11 @@ class Event(models.Model):
         verbose_name = "Мероприятия"
         verbose_name_plural = 'Мероприятия'
         ordering = ['date']
+        indexes = [
+            models.Index(fields=['date'], condition=models.Q(is_visiable=True), name='event_visible_date'),
+            models.Index(fields=['org_id', 'date'], condition=models.Q(is_visiable=True), name='event_visible_org_date'),
+            models.Index(fields=['space_id', 'date'], condition=models.Q(is_visiable=True), name='event_visible_space_date'),
+        ]
         
     def __str__(self) -> str:
         return self.name + ' (' + str(self.date.strftime("%d.%m.%Y")) + ')'
@@ -243,6 +253,9 @@ class EventWithItems(models.Model):
     class Meta:
         verbose_name = "Мероприятия и особенности"
         verbose_name_plural = 'Мероприятия и особенности'
+        indexes = [
+            models.Index(fields=['item', 'event'], name='event_items_item_event'),
+        ]
     
     def __str__(self) -> str:
         return self.event.name + self.item.name 
@@ -282,6 +295,9 @@ class Registration(models.Model):
         verbose_name = "Регистрации"
         verbose_name_plural = 'Регистрации'
         ordering = ['-reg_date']
+        indexes = [
+            models.Index(fields=['event_id', 'status'], name='registration_event_status'),
+        ]
         
     def __str__(self) -> str:
         return self.user_id.first_name + ' ' + self.user_id.last_name + ' на ' + self.event_id.name + ' (' + str(self.event_id.date.strftime("%d.%m.%Y")) + ')'
@@ -300,6 +316,96 @@ class Favourite(models.Model):
         verbose_name = "Избранное"
         verbose_name_plural = 'Избранное'
         ordering = ['-add_date']
+        indexes = [
+            models.Index(fields=['user_id', 'space_id'], name='favourite_user_space'),
+        ]
     
     def __str__(self) -> str:
-        return self.user_id.first_name + ' ' + self.user_id.last_name 
+        return self.user_id.first_name + ' ' + self.user_id.last_name
+
+# Популярность для виджетов главной страницы
+class SpacePopularity(models.Model):
+    """
+    Материализованные счётчики популярности помещения
+    """
+    space_id = models.OneToOneField(Space, on_delete=models.CASCADE, primary_key=True, verbose_name="Помещение", related_name="popularity")
+    review_count = models.IntegerField(default=0, verbose_name="Отзывы")
+    fav_count = models.IntegerField(default=0, verbose_name="В избранном")
+    booking_count = models.IntegerField(default=0, verbose_name="Подтверждённые брони")
+    score = models.IntegerField(default=0, db_index=True, verbose_name="Популярность")
+    update_date = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Популярность помещений"
+        verbose_name_plural = 'Популярность помещений'
+
+    def __str__(self) -> str:
+        return str(self.space_id_id) + ': ' + str(self.score)
+
+class SpaceSearchDocument(models.Model):
+    """
+    Документ помещения в полнотекстовом индексе
+
+    Таблицу создаёт миграция 0031, а записывает bron.search; модель нужна только
+    для того, чтобы присоединять индекс к запросам помещений
+    """
+    space_id = models.OneToOneField(Space, on_delete=models.DO_NOTHING, db_constraint=False, db_column='space_id',
+                                    primary_key=True, verbose_name="Помещение", related_name="search_document")
+
+    class Meta:
+        managed = False
+        db_table = 'bron_space_search'
+        verbose_name = "Поисковый документ помещения"
+        verbose_name_plural = 'Поисковые документы помещений'
+
+class OrganizerPopularity(models.Model):
+    """
+    Материализованное количество мероприятий организатора
+    """
+    org_id = models.OneToOneField(Organizer, on_delete=models.CASCADE, primary_key=True, verbose_name="Организатор", related_name="popularity")
+    event_count = models.IntegerField(default=0, db_index=True, verbose_name="Мероприятия")
+    update_date = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Популярность организаторов"
+        verbose_name_plural = 'Популярность организаторов'
+
+    def __str__(self) -> str:
+        return str(self.org_id_id) + ': ' + str(self.event_count)
+
+# Почасовая статистика
+class BookingHourlyStat(models.Model):
+    """
+    Количество бронирований помещения, созданных за час
+    """
+    space_id = models.ForeignKey(Space, on_delete=models.CASCADE, verbose_name="Помещение", related_name="booking_stats")
+    hour = models.DateTimeField(verbose_name="Час")
+    count = models.IntegerField(default=0, verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Почасовая статистика бронирований"
+        verbose_name_plural = 'Почасовая статистика бронирований'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'space_id'], name='booking_stat_hour_space'),
+        ]
+
+    def __str__(self) -> str:
+        return self.space_id.name + ' ' + self.hour.strftime("%d.%m.%Y %H:00") + ': ' + str(self.count)
+
+class RegistrationHourlyStat(models.Model):
+    """
+    Количество регистраций на мероприятие, созданных за час
+    """
+    event_id = models.ForeignKey(Event, on_delete=models.CASCADE, verbose_name="Мероприятие", related_name="registration_stats")
+    hour = models.DateTimeField(verbose_name="Час")
+    count = models.IntegerField(default=0, verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Почасовая статистика регистраций"
+        verbose_name_plural = 'Почасовая статистика регистраций'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'event_id'], name='registration_stat_hour_event'),
+        ]
+
+    def __str__(self) -> str:
+        return self.event_id.name + ' ' + self.hour.strftime("%d.%m.%Y %H:00") + ': ' + str(self.count)
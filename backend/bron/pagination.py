@@ -0,0 +1,170 @@
+import json
+from typing import Any, Optional
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.request import Request
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по всем полям ordering
+
+    CursorPagination кладёт в курсор только первое поле сортировки, а записи с тем же
+    значением пропускает через OFFSET. Здесь позиция — значения всех полей (последнее
+    должно быть уникальным), а страница начинается условием
+    (a > x) OR (a = x AND b > y), которое идёт по составному индексу
+    """
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view: Any = None) -> Optional[list]:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            queryset = queryset.filter(self.after_position(current_position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = current_position is not None, following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next, self.has_previous = following_position is not None, current_position is not None
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after_position(self, position: str, reverse: bool) -> Q:
+        """
+        Условие «после позиции» в порядке обхода
+
+        Args:
+            position: Позиция из курсора
+            reverse: Обход в обратную сторону (ссылка previous)
+
+        Returns:
+            Q для filter
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition, equal = Q(), {}
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _get_position_from_instance(self, instance: Any, ordering: tuple[str, ...]) -> str:
+        fields = [order.lstrip('-') for order in ordering]
+        values = [instance[field] if isinstance(instance, dict) else getattr(instance, field) for field in fields]
+        return json.dumps(values, default=str)
+
+
+class SpacePagination(KeysetCursorPagination):
+    """
+    Курсорная пагинация списка помещений, сначала новые, а результатов поиска — по релевантности
+
+    Ключ сортировки не меняется между запросами страниц: число добавлений в избранное
+    менялось бы, и помещения пропадали бы или повторялись на соседних страницах
+    """
+    ordering = ('-id',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request: Request, queryset: QuerySet, view: Any) -> tuple[str, ...]:
+        if 'search_rank' in queryset.query.annotations:
+            return ('search_rank', 'id')
+        return super().get_ordering(request, queryset, view)
+
+
+class SpaceBookingPagination(CursorPagination):
+    """
+    Курсорная пагинация бронирований помещения по дате начала
+    """
+    ordering = ('date_from', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SpaceReviewPagination(CursorPagination):
+    """
+    Курсорная пагинация отзывов помещения, сначала новые
+    """
+    ordering = ('-add_date', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class UserBookingPagination(CursorPagination):
+    """
+    Курсорная пагинация бронирований текущего пользователя, сначала новые
+    """
+    ordering = ('-book_date', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class UserRegistrationPagination(CursorPagination):
+    """
+    Курсорная пагинация регистраций текущего пользователя, сначала новые
+    """
+    ordering = ('-reg_date', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class UserDirectoryPagination(KeysetCursorPagination):
+    """
+    Курсорная пагинация справочника пользователей по имени; однофамильцы
+    и пользователи без имени различаются по id
+    """
+    ordering = ('first_name', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class EventPagination(CursorPagination):
+    """
+    Курсорная пагинация мероприятий по дате проведения
+
+    Включается, если в запросе есть параметр фильтра, курсора или размера страницы;
+    без них список отдаётся целиком, отсортированный по количеству регистраций
+    """
+    ordering = ('date', 'id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view: Any = None) -> Optional[list]:
+        params = {self.cursor_query_param, self.page_size_query_param}
+        if view is not None and getattr(view, 'filterset_class', None):
+            params |= set(view.filterset_class.base_filters)
+        if params.isdisjoint(request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
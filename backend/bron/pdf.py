@@ -0,0 +1,275 @@
+import hashlib
+import io
+import json
+import os
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Optional
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.utils.timezone import localtime
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .models import Event
+
+FONTS = {
+    'Gilroy': 'Gilroy-Regular.ttf',
+    'Gilroy-Bold': 'Gilroy-Bold.ttf',
+}
+MONTHS = {
+    1: "января", 2: "февраля", 3: "марта", 4: "апреля",
+    5: "мая", 6: "июня", 7: "июля", 8: "августа",
+    9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
+}
+
+_fonts_lock = Lock()
+_fonts_registered = False
+
+
+def pdf_cache_key(event_id: int) -> str:
+    return f'bron:pdf:event:{event_id}'
+
+
+def pdf_ttl() -> int:
+    """
+    Время жизни закэшированного PDF в секундах
+    """
+    return getattr(settings, 'PDF_CACHE_TTL', 60 * 60 * 24)
+
+
+def register_fonts() -> None:
+    """
+    Зарегистрировать шрифты Gilroy в reportlab один раз на процесс
+
+    Raises:
+        FileNotFoundError: Файл шрифта не найден
+    """
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    with _fonts_lock:
+        if _fonts_registered:
+            return
+        for name, filename in FONTS.items():
+            font_path = os.path.join(settings.BASE_DIR, 'bron', 'static', 'fonts', filename)
+            if not os.path.exists(font_path):
+                raise FileNotFoundError(f"Шрифт не найден: {font_path}")
+            pdfmetrics.registerFont(TTFont(name, font_path))
+        _fonts_registered = True
+
+
+@lru_cache(maxsize=1024)
+def qr_png(url: str) -> bytes:
+    """
+    PNG с QR-кодом ссылки; ссылки мероприятий не меняются, поэтому результат кэшируется в процессе
+    """
+    qr_io = io.BytesIO()
+    qrcode.make(url).save(qr_io, format='PNG')
+    return qr_io.getvalue()
+
+
+def snapshot_queryset() -> QuerySet:
+    """
+    Мероприятия со всеми связями, которые нужны для отрисовки PDF
+    """
+    return Event.objects.select_related('space_id__building_id', 'org_id').prefetch_related('items_id')
+
+
+def build_snapshot(event: Event) -> dict[str, Any]:
+    """
+    Все данные мероприятия, которые попадают в PDF
+
+    Args:
+        event: Мероприятие из snapshot_queryset
+
+    Returns:
+        Словарь со значениями для отрисовки
+    """
+    localized_date = localtime(event.date)
+    space = event.space_id
+    building = space.building_id if space else None
+    return {
+        'id': event.pk,
+        'name': event.name,
+        'description': event.description,
+        'date': f"{localized_date.day} {MONTHS[localized_date.month]} {localized_date.year}",
+        'time': localized_date.strftime("%H:%M"),
+        'space_name': space.name if space else '—',
+        'space_address': f"{building.city}, {building.street}, {building.house}" if building else '—',
+        'org_name': event.org_id.name if event.org_id else '—',
+        'items': [item.name for item in event.items_id.all()],
+    }
+
+
+def event_snapshot(event_id: int) -> Optional[dict[str, Any]]:
+    """
+    Данные для PDF одного мероприятия
+
+    Args:
+        event_id: ID мероприятия
+
+    Returns:
+        Словарь со значениями для отрисовки или None, если мероприятие не найдено
+    """
+    event = snapshot_queryset().filter(pk=event_id).first()
+    return build_snapshot(event) if event else None
+
+
+def snapshot_etag(snapshot: dict[str, Any]) -> str:
+    """
+    Хэш содержимого мероприятия, используемый как ETag и версия кэша
+    """
+    payload = json.dumps(snapshot, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def render_event_pdf(snapshot: dict[str, Any]) -> bytes:
+    """
+    Отрисовка PDF-документа с информацией о мероприятии
+
+    Args:
+        snapshot: Данные мероприятия из event_snapshot
+
+    Returns:
+        Содержимое PDF-файла
+    """
+    register_fonts()
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - 3 * cm
+
+    p.setFont("Gilroy", 12)
+    p.setFillColor(colors.darkblue)
+    p.drawString(2 * cm, y, "Сводка по мероприятию")
+    y -= 1 * cm
+
+    p.setFont("Gilroy-Bold", 24)
+    p.setFillColor(colors.darkblue)
+    p.drawString(2 * cm, y, snapshot['name'])
+    y -= 1.25 * cm
+
+    p.setFillColor(colors.black)
+    p.setFont("Gilroy", 12)
+    p.drawString(2 * cm, y, snapshot['description'])
+    y -= 2 * cm
+
+    p.setFont("Gilroy-Bold", 16)
+    p.setFillColor(colors.black)
+    p.drawString(2 * cm, y, snapshot['date'])
+    y -= 0.5 * cm
+
+    p.setFont("Gilroy", 8)
+    p.setFillColor(colors.grey)
+    p.drawString(2 * cm, y, "дата")
+    y += 0.5 * cm
+
+    p.setFont("Gilroy-Bold", 16)
+    p.setFillColor(colors.black)
+    p.drawString(7 * cm, y, snapshot['time'])
+    y -= 0.5 * cm
+
+    p.setFont("Gilroy", 8)
+    p.setFillColor(colors.grey)
+    p.drawString(7 * cm, y, "время")
+    y += 0.5 * cm
+
+    p.setFont("Gilroy-Bold", 16)
+    p.setFillColor(colors.black)
+    p.drawString(10 * cm, y, snapshot['space_name'])
+    y -= 0.5 * cm
+
+    p.setFont("Gilroy", 8)
+    p.setFillColor(colors.grey)
+    p.drawString(10 * cm, y, snapshot['space_address'])
+    y -= 1 * cm
+
+    p.setFont("Gilroy-Bold", 16)
+    p.setFillColor(colors.black)
+    p.drawString(2 * cm, y, snapshot['org_name'])
+    y -= 0.5 * cm
+
+    p.setFont("Gilroy", 8)
+    p.setFillColor(colors.grey)
+    p.drawString(2 * cm, y, "организатор")
+    y -= 6 * cm
+
+    qr = qr_png(f"http://127.0.0.1:8080/events/{snapshot['id']}")
+    p.drawImage(ImageReader(io.BytesIO(qr)), 1.5 * cm, y, width=5 * cm, height=5 * cm, mask=None)
+    p.drawString(2 * cm, y, "подробности")
+
+    qr = qr_png(f"http://127.0.0.1:8080/regs/{snapshot['id']}")
+    p.drawImage(ImageReader(io.BytesIO(qr)), 7.5 * cm, y, width=5 * cm, height=5 * cm, mask=None)
+    p.drawString(8 * cm, y, "регистрация")
+    y -= 2 * cm
+
+    p.setFont("Gilroy", 12)
+    p.setFillColor(colors.black)
+    for item in snapshot['items']:
+        p.drawString(2 * cm, y, f"#{item}")
+        y -= 0.5 * cm
+        if y < 3 * cm:
+            p.showPage()
+            y = height - 3 * cm
+
+    p.setFont("Gilroy", 8)
+    p.setFillColor(colors.grey)
+    p.drawString(2 * cm, 1.5 * cm, "Сформировано автоматически")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def event_pdf(snapshot: dict[str, Any], etag: str) -> bytes:
+    """
+    PDF мероприятия из кэша; при промахе или изменившемся содержимом документ перерисовывается
+
+    Args:
+        snapshot: Данные мероприятия из event_snapshot
+        etag: Хэш содержимого из snapshot_etag
+
+    Returns:
+        Содержимое PDF-файла
+    """
+    content = cached_pdf(snapshot['id'], etag)
+    if content is None:
+        content = render_event_pdf(snapshot)
+        store_pdf(snapshot['id'], etag, content)
+    return content
+
+
+def cached_pdf(event_id: int, etag: str) -> Optional[bytes]:
+    """
+    Закэшированный PDF мероприятия, если он построен для той же версии содержимого
+    """
+    cached = cache.get(pdf_cache_key(event_id))
+    if cached and cached[0] == etag:
+        return cached[1]
+    return None
+
+
+def store_pdf(event_id: int, etag: str, content: bytes) -> None:
+    """
+    Положить отрисованный PDF мероприятия в кэш
+    """
+    cache.set(pdf_cache_key(event_id), (etag, content), pdf_ttl())
+
+
+def invalidate_event_pdfs(event_ids: list[int]) -> None:
+    """
+    Удалить закэшированные PDF мероприятий
+
+    Args:
+        event_ids: ID мероприятий
+    """
+    cache.delete_many([pdf_cache_key(event_id) for event_id in event_ids])
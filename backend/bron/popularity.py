@@ -0,0 +1,153 @@
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, IntegerField, Model, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Booking, Event, Favourite, Organizer, OrganizerPopularity, Space, SpacePopularity, SpacesReview
+from .serializers import EventWidgetSerializer, OrganizeWidgetSerializer, SpaceWidgetSerializer
+
+HOMEPAGE_CACHE_KEY = 'bron:widgets:homepage'
+
+
+def homepage_ttl() -> int:
+    """
+    Время жизни кэша главной страницы в секундах
+    """
+    return getattr(settings, 'HOMEPAGE_CACHE_TTL', 60)
+
+
+def count_by_space(model: type[Model], **filters: Any) -> Coalesce:
+    """
+    Коррелированный подзапрос с количеством записей модели у помещения
+
+    В отличие от нескольких Count(..., distinct=True) в одном запросе подзапросы
+    не строят произведение отзывов, избранного и бронирований
+
+    Args:
+        model: Модель с внешним ключом space_id
+        filters: Дополнительные условия отбора записей
+
+    Returns:
+        Выражение для annotate
+    """
+    counts = model.objects.filter(
+        space_id=OuterRef('pk'), **filters
+    ).order_by().values('space_id').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def refresh_space_popularity(space_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Пересчитать счётчики популярности помещений
+
+    Args:
+        space_ids: ID помещений; None — пересчитать все
+    """
+    spaces = Space.objects.order_by()
+    if space_ids is not None:
+        spaces = spaces.filter(id__in=set(space_ids))
+    spaces = spaces.annotate(
+        review_count=count_by_space(SpacesReview, is_visiable=True),
+        fav_count=count_by_space(Favourite),
+        booking_count=count_by_space(Booking, status=Booking.Status.CONFIRMATION)
+    ).values_list('id', 'review_count', 'fav_count', 'booking_count')
+
+    rows = [
+        SpacePopularity(
+            space_id_id=space_id,
+            review_count=review_count,
+            fav_count=fav_count,
+            booking_count=booking_count,
+            score=review_count + fav_count + booking_count,
+            update_date=timezone.now(),
+        )
+        for space_id, review_count, fav_count, booking_count in spaces
+    ]
+    SpacePopularity.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['space_id'],
+        update_fields=['review_count', 'fav_count', 'booking_count', 'score', 'update_date'],
+    )
+    invalidate_homepage()
+
+
+def refresh_organizer_popularity(org_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Пересчитать количество мероприятий организаторов
+
+    Args:
+        org_ids: ID организаторов; None — пересчитать всех
+    """
+    organizers = Organizer.objects.order_by()
+    if org_ids is not None:
+        organizers = organizers.filter(id__in=set(org_ids))
+    organizers = organizers.annotate(event_count=Count('org_events', distinct=True)).values_list('id', 'event_count')
+
+    rows = [
+        OrganizerPopularity(org_id_id=org_id, event_count=event_count, update_date=timezone.now())
+        for org_id, event_count in organizers
+    ]
+    OrganizerPopularity.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['org_id'],
+        update_fields=['event_count', 'update_date'],
+    )
+    invalidate_homepage()
+
+
+def invalidate_homepage() -> None:
+    """
+    Сбросить закэшированные данные главной страницы
+    """
+    cache.delete(HOMEPAGE_CACHE_KEY)
+
+
+def build_homepage() -> dict[str, Any]:
+    """
+    Собрать данные главной страницы из материализованных счётчиков
+
+    Returns:
+        Словарь с популярными помещениями, ближайшими мероприятиями и организаторами
+    """
+    top_popular = Space.objects.filter(
+        popularity__isnull=False
+    ).annotate(
+        review_count=F('popularity__review_count'),
+        fav_count=F('popularity__fav_count'),
+        booking_count=F('popularity__booking_count')
+    ).prefetch_related('space_images').order_by('-popularity__score', 'id')[:3]
+
+    upcoming_events = Event.objects.filter(
+        date__gte=timezone.now(), is_visiable=True
+    ).select_related('org_id').prefetch_related('event_images').order_by('date')[:3]
+
+    organizers = Organizer.objects.filter(
+        popularity__isnull=False
+    ).annotate(
+        event_count=F('popularity__event_count')
+    ).order_by('-popularity__event_count', 'id')[:3]
+
+    return {
+        "top_popular_spaces": SpaceWidgetSerializer(top_popular, many=True).data,
+        "upcoming_events": EventWidgetSerializer(upcoming_events, many=True).data,
+        "top_organizers": OrganizeWidgetSerializer(organizers, many=True).data
+    }
+
+
+def homepage() -> dict[str, Any]:
+    """
+    Данные главной страницы из кэша; при промахе собираются и кэшируются на homepage_ttl() секунд
+
+    Returns:
+        Словарь с тремя списками виджетов
+    """
+    data = cache.get(HOMEPAGE_CACHE_KEY)
+    if data is None:
+        data = build_homepage()
+        cache.set(HOMEPAGE_CACHE_KEY, data, homepage_ttl())
+    return data
@@ -0,0 +1,229 @@
+import re
+from typing import Iterable, Optional
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .models import Space
+
+SEARCH_TABLE = 'bron_space_search'
+
+VOWELS = 'аеиоуыэюя'
+WORD = re.compile(r'\w+')
+
+# Окончания стеммера Snowball для русского языка; для группы 1 перед окончанием должна стоять «а» или «я»
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+
+def _regions(word: str) -> tuple[int, int]:
+    """
+    Начала областей RV и R2 стеммера Snowball
+    """
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word: str, start: int, endings: tuple[tuple[str, ...], tuple[str, ...]]) -> Optional[str]:
+    """
+    Отрезать самое длинное окончание, целиком лежащее после позиции start
+
+    Returns:
+        Слово без окончания или None, если подходящего окончания нет
+    """
+    tail = word[start:]
+    group1, group2 = endings
+    longest = max((ending for ending in group1 + group2 if tail.endswith(ending)), key=len, default=None)
+    if longest is None:
+        return None
+    if longest in group1 and longest not in group2 and not tail[:-len(longest)].endswith(('а', 'я')):
+        return None
+    return word[:-len(longest)]
+
+
+def stem(word: str) -> str:
+    """
+    Основа русского слова по алгоритму Snowball; слова без кириллицы возвращаются как есть
+
+    Args:
+        word: Слово в нижнем регистре
+
+    Returns:
+        Основа слова
+    """
+    word = word.replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        adjective = _strip(word, rv, ADJECTIVE)
+        if adjective is not None:
+            stemmed = _strip(adjective, rv, PARTICIPLE) or adjective
+        else:
+            stemmed = _strip(word, rv, VERB) or _strip(word, rv, NOUN)
+    word = stemmed or word
+
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+    if len(word) > r2:
+        word = _strip(word, r2, DERIVATIONAL) or word
+
+    if word[rv:].endswith('нн'):
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        return superlative[:-1] if superlative.endswith('нн') else superlative
+    if word[rv:].endswith('ь'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Слова текста в нижнем регистре
+    """
+    return WORD.findall(text.lower())
+
+
+def stem_text(text: str) -> str:
+    """
+    Текст из основ слов через пробел, как он хранится в индексе FTS5
+    """
+    return ' '.join(stem(token) for token in tokenize(text))
+
+
+def space_document(space: Space) -> tuple[int, str, str, str, str]:
+    """
+    Поля помещения для поискового индекса
+
+    Args:
+        space: Помещение с загруженными building_id и items_id
+
+    Returns:
+        ID, название, описание, адрес здания и названия особенностей
+    """
+    building = space.building_id
+    address = f'{building.city} {building.street} {building.house}' if building else ''
+    items = ' '.join(item.name for item in space.items_id.all())
+    return space.pk, space.name, space.description, address, items
+
+
+def write_documents(documents: list[tuple[int, str, str, str, str]], using=connection) -> None:
+    """
+    Записать документы помещений в поисковый индекс вместо прежних
+
+    На SQLite документ хранится в виртуальной таблице FTS5 основами слов, на PostgreSQL —
+    в столбце tsvector с русской конфигурацией и весами: название — A, особенности — B,
+    описание — C, адрес — D
+
+    Args:
+        documents: Результаты space_document
+        using: Соединение с базой данных
+    """
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE space_id = %s', [(document[0],) for document in documents])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (space_id, name, description, address, items) VALUES (%s, %s, %s, %s, %s)',
+                [(space_id, *map(stem_text, fields)) for space_id, *fields in documents],
+            )
+        elif using.vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (space_id, document) VALUES (%s, "
+                "setweight(to_tsvector('russian', %s), 'A') || setweight(to_tsvector('russian', %s), 'C') || "
+                "setweight(to_tsvector('russian', %s), 'D') || setweight(to_tsvector('russian', %s), 'B')) "
+                "ON CONFLICT (space_id) DO UPDATE SET document = EXCLUDED.document",
+                documents,
+            )
+
+
+def index_spaces(space_ids: Iterable[int]) -> None:
+    """
+    Перестроить документы помещений после изменения их самих, здания или особенностей
+
+    Args:
+        space_ids: ID помещений; удалённые помещения убираются из индекса
+    """
+    space_ids = list(space_ids)
+    if not space_ids or connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    spaces = Space.objects.select_related('building_id').prefetch_related('items_id').filter(pk__in=space_ids)
+    write_documents([space_document(space) for space in spaces])
+    removed = set(space_ids) - {space.pk for space in spaces}
+    if removed and connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE space_id = %s', [(space_id,) for space_id in removed])
+
+
+def search_spaces(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Помещения из queryset, подходящие под запрос, с оценкой релевантности search_rank
+
+    Каждое слово запроса ищется как префикс основы, все слова должны найтись.
+    Поисковая таблица присоединяется к queryset через SpaceSearchDocument в том же
+    запросе, а условие MATCH и bm25 вычисляются по этому соединению: коррелированный
+    подзапрос заново считал бы статистику индекса для каждого помещения. Поэтому
+    релевантность считается только для помещений, прошедших остальные фильтры,
+    и выдача не обрезается. Чем меньше search_rank, тем выше помещение в выдаче.
+    queryset не должен группировать строки: bm25 в SQLite нельзя вычислить после GROUP BY
+
+    Args:
+        queryset: Начальный набор помещений
+        query: Строка поиска
+
+    Returns:
+        QuerySet, упорядоченный по релевантности
+    """
+    tokens = tokenize(query)
+    if connection.vendor == 'sqlite':
+        match = f'{SEARCH_TABLE} MATCH %s'
+        rank = f'bm25({SEARCH_TABLE}, 0.0, 10.0, 2.0, 1.0, 4.0)'
+        rank_params = []
+        search = ' '.join(f'"{stem(token)}"*' for token in tokens)
+    elif connection.vendor == 'postgresql':
+        match = f"{SEARCH_TABLE}.document @@ to_tsquery('russian', %s)"
+        rank = f"-ts_rank({SEARCH_TABLE}.document, to_tsquery('russian', %s))"
+        search = ' & '.join(f'{token}:*' for token in tokens)
+        rank_params = [search]
+    else:
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    if not tokens:
+        return queryset.none()
+    return queryset.filter(
+        RawSQL(match, [search], output_field=BooleanField()),
+        search_document__isnull=False,
+    ).annotate(
+        search_rank=RawSQL(rank, rank_params, output_field=FloatField()),
+    ).order_by('search_rank', 'id')
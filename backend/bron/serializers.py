@@ -1,7 +1,9 @@
 from typing import Optional
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
-from .models import Building, ImageForEvents, ImageForSpaces, ItemInEvents, ItemInSpaces, Organizer, SpacesReview, User, Registration, Event, Booking, Space, Profile
+from .booking import CANCEL, CONFIRM, MAX_DECISIONS
+from .counters import user_counters
+from .models import Building, Favourite, ImageForEvents, ImageForSpaces, ItemInEvents, ItemInSpaces, Organizer, SpacesReview, User, Registration, Event, Booking, Space, Profile
 
 class RegSerializer(ModelSerializer):
     class Meta:
@@ -44,6 +46,14 @@ class BookingSerializer(ModelSerializer):
         model = Booking
         fields = ['id', 'space_id', 'space', 'user_id', 'user', 'date_from', 'date_to', 'book_date', 'status']
         
+class BookingDecisionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=[CONFIRM, CANCEL])
+
+
+class BookingDecisionsSerializer(serializers.Serializer):
+    decisions = BookingDecisionSerializer(many=True, allow_empty=False, max_length=MAX_DECISIONS)
+
 class UserSerializer(ModelSerializer):
     profile = UserProfielSerializer(source='user_profile')
     user_regs = RegSerializer(many=True, read_only=True)
@@ -55,6 +65,62 @@ class UserSerializer(ModelSerializer):
         model = User
         fields = ["id", "first_name", "last_name", 'username', 'email', 'profile', 'user_regs', 'user_books', 'total_events', 'total_bookings']
         
+class UserDirectorySerializer(ModelSerializer):
+    profile = UserProfielSerializer(source='user_profile', read_only=True)
+    total_events = serializers.IntegerField(read_only=True)
+    total_bookings = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ["id", "first_name", "last_name", 'username', 'email', 'profile', 'total_events', 'total_bookings']
+
+class UserCurrentSerializer(ModelSerializer):
+    profile = UserProfielSerializer(source='user_profile')
+    total_events = serializers.SerializerMethodField()
+    total_bookings = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ["id", "first_name", "last_name", 'username', 'email', 'profile', 'total_events', 'total_bookings']
+
+    def counters(self, obj: User) -> dict[str, int]:
+        """
+        Счётчики пользователя, прочитанные из кэша один раз на сериализацию
+
+        Args:
+            obj: Объект User
+
+        Returns:
+            Словарь с total_events и total_bookings
+        """
+        if getattr(self, '_counters_for', None) != obj.id:
+            self._counters_for, self._counters = obj.id, user_counters(obj.id)
+        return self._counters
+
+    def get_total_events(self, obj: User) -> int:
+        """
+        Количество регистраций пользователя из кэша счётчиков
+
+        Args:
+            obj: Объект User
+
+        Returns:
+            Количество регистраций
+        """
+        return self.counters(obj)['total_events']
+
+    def get_total_bookings(self, obj: User) -> int:
+        """
+        Количество бронирований пользователя из кэша счётчиков
+
+        Args:
+            obj: Объект User
+
+        Returns:
+            Количество бронирований
+        """
+        return self.counters(obj)['total_bookings']
+
 class ItemInSpacesSerializer(serializers.ModelSerializer):
     class Meta:
         model = ItemInSpaces
@@ -75,19 +141,24 @@ class SpaceEditSerializer(serializers.ModelSerializer):
         model = Space
         fields = ['name', 'description', 'capacity', 'is_visiable', 'building_id', 'items_id']
     
+class SpaceBookingSerializer(ModelSerializer):
+    user = UserShortSerializer(source='user_id', read_only=True)
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'user', 'date_from', 'date_to', 'book_date', 'status']
+
 class SpaceSerializer(ModelSerializer):
-    bookings = BookingSerializer(source='space_books', many=True, read_only=True)
     url = serializers.SerializerMethodField()
     fav_count = serializers.IntegerField(read_only=True)
     building = BuildingSerializer(source='building_id', read_only=True)
     items = ItemInSpacesSerializer(source='items_id', many=True, read_only=True)
     images = ImageForSpacesSerializer(source='space_images', many=True, read_only=True)
-    reviews = SpacesReviewSerializer(source='space_reviews', many=True, read_only=True)
     is_fav = serializers.SerializerMethodField()
 
     class Meta:
         model = Space
-        fields = ["id", "name", 'description', 'capacity', 'building', 'building_id', 'items', 'items_id', 'images', 'bookings', 'url', 'reviews', 'fav_count', 'is_visiable', 'is_fav']
+        fields = ["id", "name", 'description', 'capacity', 'building', 'building_id', 'items', 'items_id', 'images', 'url', 'fav_count', 'is_visiable', 'is_fav']
     
     def get_url(self, obj: Space) -> str:
         """
@@ -104,7 +175,9 @@ class SpaceSerializer(ModelSerializer):
     
     def get_is_fav(self, obj: Space) -> bool:
         """
-        Проверяет, является ли пространство любимым для текущего пользователя
+        Проверяет, является ли пространство любимым для текущего пользователя.
+        ID избранных помещений загружаются одним запросом и хранятся в контексте
+        сериализатора, общем для всех элементов списка
 
         Args:
             obj: Объект Space
@@ -112,11 +185,44 @@ class SpaceSerializer(ModelSerializer):
         Returns:
             True, если пространство добавлено в избранное текущим пользователем, иначе False
         """
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return obj.favourite.filter(user_id=user).exists()
-        return False
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return False
+        favourite_ids = self.context.get('favourite_space_ids')
+        if favourite_ids is None:
+            favourite_ids = self.context['favourite_space_ids'] = set(
+                Favourite.objects.filter(user_id=request.user.id, space_id__isnull=False).values_list('space_id', flat=True)
+            )
+        return obj.id in favourite_ids
     
+class SpaceListSerializer(SpaceSerializer):
+    """
+    Облегчённое представление помещения для списков: вместо всех изображений
+    отдаётся только обложка
+    """
+    cover = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Space
+        fields = ["id", "name", 'description', 'capacity', 'building', 'items', 'cover', 'url', 'fav_count', 'is_fav']
+
+    def get_cover(self, obj: Space) -> Optional[str]:
+        """
+        URL обложки помещения: изображение с пометкой cover, либо первое изображение, либо None
+
+        Args:
+            obj: Объект Space
+
+        Returns:
+            URL изображения или None
+        """
+        images = [image for image in obj.space_images.all() if image.image]
+        if not images:
+            return None
+        cover = next((image for image in images if image.cover), images[0])
+        request = self.context.get('request')
+        return request.build_absolute_uri(cover.image.url) if request else cover.image.url
+
 class OrganizerSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
     user = UserShortSerializer(source='org_id', read_only=True)
@@ -150,7 +256,6 @@ class ImageForEventsSerializer(serializers.ModelSerializer):
 
 class EventSerializer(ModelSerializer):
     url = serializers.SerializerMethodField()
-    regs = RegSerializer(source='event_reg', many=True, read_only=True)
     reg_count = serializers.IntegerField(read_only=True)
     organizer = OrganizerSerializer(source='org_id', read_only=True)
     space = SpaceShortSerializer(source='space_id', read_only=True)
@@ -159,7 +264,7 @@ class EventSerializer(ModelSerializer):
         
     class Meta:
         model = Event
-        fields = ["id", "name", 'description', 'date', 'org_id', 'organizer', 'space_id', 'space', 'images', 'items', 'regs', 'url', 'reg_count', 'is_visiable']
+        fields = ["id", "name", 'description', 'date', 'org_id', 'organizer', 'space_id', 'space', 'images', 'items', 'url', 'reg_count', 'is_visiable']
         
     def get_url(self, obj: Event) -> str:
         """
@@ -199,7 +304,7 @@ class SpaceWidgetSerializer(serializers.ModelSerializer):
 
 class EventWidgetSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
-    organizer = serializers.StringRelatedField()
+    organizer = serializers.StringRelatedField(source='org_id')
 
     class Meta:
         model = Event
@@ -207,7 +312,8 @@ class EventWidgetSerializer(serializers.ModelSerializer):
 
     def get_image(self, obj: Event) -> Optional[str]:
         """
-        Получает URL изображения с пометкой cover, либо первое изображение, либо None
+        Получает URL изображения с пометкой cover, либо первое изображение, либо None.
+        Изображения берутся из предзагруженного event_images без дополнительных запросов
 
         Args:
             obj: Объект Event
@@ -215,11 +321,11 @@ class EventWidgetSerializer(serializers.ModelSerializer):
         Returns:
             URL изображения или None
         """
-        cover = obj.event_images.filter(cover=True).first()
-        if cover:
-            return cover.image.url
-        img = obj.event_images.first()
-        return img.image.url if img else None
+        images = list(obj.event_images.all())
+        if not images:
+            return None
+        cover = next((img for img in images if img.cover), images[0])
+        return cover.image.url if cover.image else None
     
 class OrganizeWidgetSerializer(serializers.ModelSerializer):
     event_count = serializers.IntegerField(read_only=True)
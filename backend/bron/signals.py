@@ -0,0 +1,296 @@
+from typing import Optional
+
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .autocomplete import autocomplete
+from .availability import availability_index
+from .items import item_bitsets
+from .transitions import bookings_changed
+from .counters import invalidate_user_counters
+from .models import Booking, Building, Event, EventWithItems, Favourite, ImageForEvents, ImageForSpaces, ItemInEvents, ItemInSpaces, Organizer, Profile, Registration, Space, SpacesReview
+from .pdf import invalidate_event_pdfs
+from .search import index_spaces
+from .popularity import invalidate_homepage, refresh_organizer_popularity, refresh_space_popularity
+from .stats import record_booking, record_registration
+from .tokens import ROLE_CLAIMS, revoke_roles, user_cache, user_roles
+from .users import register_sqlite_functions
+
+
+@receiver(connection_created)
+def add_sqlite_functions(sender, connection, **kwargs) -> None:
+    """
+    Регистрация функций, по которым построены индексы SQLite, в каждом новом соединении
+    """
+    if connection.vendor == 'sqlite':
+        register_sqlite_functions(connection.connection)
+
+
+@receiver(post_init, sender=Booking)
+def remember_confirmed_space(sender, instance: Booking, **kwargs) -> None:
+    """
+    Запоминание помещения подтверждённой брони при загрузке, чтобы после сохранения понять, изменилась ли занятость
+    """
+    confirmed = instance.__dict__.get('status') == Booking.Status.CONFIRMATION
+    instance._saved_confirmed_space = instance.__dict__.get('space_id_id') if confirmed else None
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def sync_booking_availability(sender, instance: Booking, **kwargs) -> None:
+    """
+    Обновление индекса занятости после подтверждения, отмены, правки или удаления подтверждённой брони
+
+    Новые и отменённые до подтверждения брони занятость не меняют и индекс не трогают
+    """
+    space_ids = {instance._saved_confirmed_space} - {None}
+    if instance.status == Booking.Status.CONFIRMATION:
+        space_ids.add(instance.space_id_id)
+    instance._saved_confirmed_space = instance.space_id_id if instance.status == Booking.Status.CONFIRMATION else None
+    if space_ids:
+        transaction.on_commit(lambda: availability_index.refresh_spaces(sorted(space_ids)))
+
+
+@receiver(bookings_changed)
+def sync_bulk_booking_changes(sender, space_ids: list[int], confirmed_space_ids: list[int], **kwargs) -> None:
+    """
+    Обновление индекса занятости и популярности после массового изменения статусов броней
+    """
+    if confirmed_space_ids:
+        availability_index.refresh_spaces(confirmed_space_ids)
+    refresh_space_popularity(space_ids)
+
+
+@receiver(post_save, sender=Space)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=SpacesReview)
+@receiver(post_delete, sender=SpacesReview)
+@receiver(post_save, sender=Favourite)
+@receiver(post_delete, sender=Favourite)
+def sync_space_popularity(sender, instance, **kwargs) -> None:
+    """
+    Пересчёт счётчиков популярности помещения после изменения его броней, отзывов или избранного
+    """
+    space_id = instance.pk if sender is Space else instance.space_id_id
+    if space_id is not None:
+        transaction.on_commit(lambda: refresh_space_popularity([space_id]))
+
+
+@receiver(post_save, sender=Organizer)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def sync_organizer_popularity(sender, instance, **kwargs) -> None:
+    """
+    Пересчёт количества мероприятий организатора
+    """
+    org_id = instance.pk if sender is Organizer else instance.org_id_id
+    transaction.on_commit(lambda: refresh_organizer_popularity([org_id]))
+
+
+@receiver(post_delete, sender=Space)
+@receiver(post_delete, sender=Organizer)
+@receiver(post_save, sender=ImageForSpaces)
+@receiver(post_delete, sender=ImageForSpaces)
+@receiver(post_save, sender=ImageForEvents)
+@receiver(post_delete, sender=ImageForEvents)
+def drop_homepage_cache(sender, instance, **kwargs) -> None:
+    """
+    Сброс кэша главной страницы при изменении отображаемых в виджетах данных
+    """
+    transaction.on_commit(invalidate_homepage)
+
+
+@receiver(post_save, sender=Booking)
+def count_created_booking(sender, instance: Booking, created: bool, **kwargs) -> None:
+    """
+    Учёт нового бронирования в почасовой статистике
+    """
+    if created:
+        record_booking(instance.space_id_id, instance.book_date)
+
+
+@receiver(post_delete, sender=Booking)
+def count_deleted_booking(sender, instance: Booking, **kwargs) -> None:
+    """
+    Исключение удалённого бронирования из почасовой статистики
+    """
+    record_booking(instance.space_id_id, instance.book_date, delta=-1)
+
+
+@receiver(post_save, sender=Registration)
+def count_created_registration(sender, instance: Registration, created: bool, **kwargs) -> None:
+    """
+    Учёт новой регистрации в почасовой статистике
+    """
+    if created:
+        record_registration(instance.event_id_id, instance.reg_date)
+
+
+@receiver(post_delete, sender=Registration)
+def count_deleted_registration(sender, instance: Registration, **kwargs) -> None:
+    """
+    Исключение удалённой регистрации из почасовой статистики
+    """
+    record_registration(instance.event_id_id, instance.reg_date, delta=-1)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Registration)
+@receiver(post_delete, sender=Registration)
+def drop_user_counters(sender, instance, **kwargs) -> None:
+    """
+    Сброс счётчиков профиля после создания или удаления брони или регистрации
+    """
+    if kwargs.get('created', True):
+        invalidate_user_counters(instance.user_id_id)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventWithItems)
+@receiver(post_delete, sender=EventWithItems)
+@receiver(m2m_changed, sender=Event.items_id.through)
+def drop_event_pdf(sender, instance, **kwargs) -> None:
+    """
+    Сброс закэшированного PDF после изменения мероприятия или его особенностей
+    """
+    if isinstance(instance, Event):
+        invalidate_event_pdfs([instance.pk])
+    elif isinstance(instance, EventWithItems):
+        invalidate_event_pdfs([instance.event_id])
+    else:
+        invalidate_event_pdfs(list(kwargs.get('pk_set') or instance.eventwithitems_set.values_list('event_id', flat=True)))
+
+
+@receiver(post_save, sender=ItemInEvents)
+def drop_item_event_pdfs(sender, instance: ItemInEvents, **kwargs) -> None:
+    """
+    Сброс PDF мероприятий, в которых указана переименованная особенность
+    """
+    invalidate_event_pdfs(list(EventWithItems.objects.filter(item=instance).values_list('event_id', flat=True)))
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_roles(sender, instance: Profile, **kwargs) -> None:
+    """
+    Запоминание ролей профиля при загрузке, чтобы после сохранения понять, изменились ли они
+    """
+    instance._saved_roles = {claim: getattr(instance, claim) for claim in ROLE_CLAIMS}
+
+
+@receiver(post_save, sender=Profile)
+def revoke_tokens_on_role_change(sender, instance: Profile, created: bool, **kwargs) -> None:
+    """
+    Отзыв токенов со старыми ролями после makeadmin/unmakeadmin или правки профиля в админке
+    """
+    roles = {claim: getattr(instance, claim) for claim in ROLE_CLAIMS}
+    if not created and roles != instance._saved_roles:
+        revoke_roles(instance.user_id, roles)
+    instance._saved_roles = roles
+
+
+@receiver(post_init, sender=User)
+def remember_user_active(sender, instance: User, **kwargs) -> None:
+    instance._saved_is_active = instance.is_active
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_deactivation(sender, instance: User, created: bool, **kwargs) -> None:
+    """
+    Отзыв всех токенов отключённого пользователя и восстановление при повторном включении
+    """
+    if not created and instance.is_active != instance._saved_is_active:
+        revoke_roles(instance.pk, user_roles(instance.pk) if instance.is_active else None)
+    instance._saved_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance: User, **kwargs) -> None:
+    """
+    Отзыв всех токенов удалённого пользователя
+    """
+    revoke_roles(instance.pk, None)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def drop_cached_user(sender, instance, **kwargs) -> None:
+    """
+    Сброс пользователя из кэша аутентификации после изменения его или профиля
+    """
+    user_cache.invalidate(instance.pk if sender is User else instance.user_id)
+
+
+def changed_item_spaces(instance, action: str, pk_set: Optional[set[int]]) -> list[int]:
+    """
+    Помещения, у которых изменились особенности, по аргументам m2m_changed для Space.items_id
+
+    При очистке со стороны особенности помещения известны только до удаления связей
+    """
+    if isinstance(instance, Space):
+        return [instance.pk] if action.startswith('post_') else []
+    if action in ('post_add', 'post_remove'):
+        return list(pk_set)
+    if action == 'pre_clear':
+        return list(instance.space_set.values_list('id', flat=True))
+    return []
+
+
+@receiver(m2m_changed, sender=Space.items_id.through)
+@receiver(post_delete, sender=Space)
+def sync_item_bitsets(sender, instance, **kwargs) -> None:
+    """
+    Обновление масок особенностей после изменения связей помещений с особенностями
+    """
+    space_ids = [instance.pk] if sender is Space else changed_item_spaces(instance, kwargs['action'], kwargs['pk_set'])
+    if space_ids:
+        transaction.on_commit(lambda: item_bitsets.refresh_spaces(space_ids))
+
+
+@receiver(post_save, sender=ItemInSpaces)
+@receiver(post_delete, sender=ItemInSpaces)
+def drop_item_bitsets(sender, instance: ItemInSpaces, **kwargs) -> None:
+    """
+    Сброс масок после переименования или удаления особенности
+    """
+    transaction.on_commit(item_bitsets.invalidate)
+
+
+@receiver(post_save, sender=Space)
+@receiver(post_delete, sender=Space)
+@receiver(post_save, sender=Building)
+@receiver(post_save, sender=ItemInSpaces)
+@receiver(m2m_changed, sender=Space.items_id.through)
+def sync_space_search(sender, instance, **kwargs) -> None:
+    """
+    Обновление поискового индекса после изменения помещения, его здания или особенностей
+    """
+    if sender is Space.items_id.through:
+        space_ids = changed_item_spaces(instance, kwargs['action'], kwargs['pk_set'])
+    elif sender is Space:
+        space_ids = [instance.pk]
+    else:
+        space_ids = list(instance.space_set.values_list('id', flat=True))
+    if space_ids:
+        transaction.on_commit(lambda: index_spaces(space_ids))
+
+
+@receiver(post_save, sender=Space)
+@receiver(post_delete, sender=Space)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Organizer)
+@receiver(post_delete, sender=Organizer)
+def sync_autocomplete(sender, instance, **kwargs) -> None:
+    """
+    Точечное обновление префиксного индекса после изменения, скрытия или удаления записи
+    """
+    kind, obj_id = autocomplete.kind(sender), instance.pk
+    transaction.on_commit(lambda: autocomplete.refresh(kind, [obj_id]))
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.db.models import DateTimeField, ExpressionWrapper, F, Value
+from django.utils.timezone import localtime
+
+from .models import Booking, Event
+
+MAX_GRANULARITY = 24 * 60
+
+
+def event_duration() -> timedelta:
+    """
+    Сколько занимает помещение мероприятие: у Event есть только время начала
+    """
+    return timedelta(seconds=getattr(settings, 'EVENT_DURATION', 2 * 60 * 60))
+
+
+def occupied_intervals(space_id: int, date_from: datetime, date_to: datetime) -> list[tuple[datetime, datetime]]:
+    """
+    Подтверждённые брони и мероприятия помещения, пересекающие окно, по возрастанию начала
+
+    Брони и мероприятия читаются одним запросом UNION ALL по индексам
+    (space_id, status, date_from, date_to) и space_id
+
+    Args:
+        space_id: ID помещения
+        date_from: Начало окна
+        date_to: Конец окна
+
+    Returns:
+        Пары (начало, конец)
+    """
+    duration = event_duration()
+    bookings = Booking.objects.filter(
+        space_id=space_id,
+        status=Booking.Status.CONFIRMATION,
+        date_from__lt=date_to,
+        date_to__gt=date_from,
+    ).order_by().annotate(start=F('date_from'), end=F('date_to')).values_list('start', 'end')
+    events = Event.objects.filter(
+        space_id=space_id,
+        date__lt=date_to,
+        date__gt=date_from - duration,
+    ).order_by().annotate(
+        start=F('date'),
+        end=ExpressionWrapper(F('date') + Value(duration), output_field=DateTimeField()),
+    ).values_list('start', 'end')
+    return list(bookings.union(events, all=True).order_by('start'))
+
+
+def merge_intervals(
+    intervals: Iterable[tuple[datetime, datetime]],
+    date_from: datetime,
+    date_to: datetime,
+    granularity: timedelta,
+) -> list[tuple[datetime, datetime]]:
+    """
+    Слить отсортированные интервалы за один проход
+
+    Границы выравниваются по сетке с шагом granularity от полуночи дня начала окна:
+    начало — вниз, конец — вверх, поэтому свободные промежутки короче шага не остаются.
+    Результат обрезается по окну
+
+    Args:
+        intervals: Пары (начало, конец), отсортированные по началу
+        date_from: Начало окна
+        date_to: Конец окна
+        granularity: Шаг сетки
+
+    Returns:
+        Непересекающиеся занятые интервалы по возрастанию
+    """
+    origin = localtime(date_from).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def floor(moment: datetime) -> datetime:
+        return moment - (moment - origin) % granularity
+
+    def ceil(moment: datetime) -> datetime:
+        return moment + (origin - moment) % granularity
+
+    merged: list[tuple[datetime, datetime]] = []
+    for start, end in intervals:
+        start, end = max(floor(start), date_from), min(ceil(end), date_to)
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_gaps(busy: list[tuple[datetime, datetime]], date_from: datetime, date_to: datetime) -> list[tuple[datetime, datetime]]:
+    """
+    Свободные промежутки окна между занятыми интервалами
+
+    Args:
+        busy: Результат merge_intervals
+        date_from: Начало окна
+        date_to: Конец окна
+
+    Returns:
+        Пары (начало, конец) по возрастанию
+    """
+    gaps = []
+    cursor = date_from
+    for start, end in busy:
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < date_to:
+        gaps.append((cursor, date_to))
+    return gaps
+
+
+def space_calendar(space_id: int, date_from: datetime, date_to: datetime, granularity: timedelta) -> dict[str, list[dict[str, datetime]]]:
+    """
+    Занятые и свободные промежутки помещения в окне
+
+    Args:
+        space_id: ID помещения
+        date_from: Начало окна
+        date_to: Конец окна
+        granularity: Шаг сетки
+
+    Returns:
+        Словарь со списками busy и free интервалов {from, to}
+    """
+    busy = merge_intervals(occupied_intervals(space_id, date_from, date_to), date_from, date_to, granularity)
+    return {
+        'busy': [{'from': start, 'to': end} for start, end in busy],
+        'free': [{'from': start, 'to': end} for start, end in free_gaps(busy, date_from, date_to)],
+    }
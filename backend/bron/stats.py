@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Model, Sum
+from django.utils import timezone
+
+from .models import BookingHourlyStat, RegistrationHourlyStat
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+DEFAULT_WINDOW = '7d'
+
+
+def truncate_hour(moment: datetime) -> datetime:
+    """
+    Начало часа, в который попадает moment
+    """
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(model: type[Model], owner_field: str, owner_id: int, moment: datetime, delta: int) -> None:
+    """
+    Изменить счётчик почасовой корзины, создав её при первом обращении
+
+    Args:
+        model: Модель корзин
+        owner_field: Имя поля-владельца корзины (помещение или мероприятие)
+        owner_id: ID владельца
+        moment: Момент события
+        delta: Изменение счётчика
+    """
+    lookup = {owner_field: owner_id, 'hour': truncate_hour(moment)}
+    if model.objects.filter(**lookup).update(count=F('count') + delta):
+        return
+    if delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def record_booking(space_id: int, book_date: datetime, delta: int = 1) -> None:
+    """
+    Учесть созданное (delta=1) или удалённое (delta=-1) бронирование
+    """
+    _increment(BookingHourlyStat, 'space_id_id', space_id, book_date, delta)
+
+
+def record_registration(event_id: int, reg_date: datetime, delta: int = 1) -> None:
+    """
+    Учесть созданную (delta=1) или удалённую (delta=-1) регистрацию
+    """
+    _increment(RegistrationHourlyStat, 'event_id_id', event_id, reg_date, delta)
+
+
+def window_start(window: str) -> datetime:
+    """
+    Начало скользящего окна с точностью до часа
+
+    Корзина, в которую попадает граница окна, учитывается целиком
+
+    Args:
+        window: Ключ окна из WINDOWS
+
+    Returns:
+        Начало первой учитываемой почасовой корзины
+
+    Raises:
+        KeyError: Неизвестное окно
+    """
+    return truncate_hour(timezone.now() - WINDOWS[window])
+
+
+def _cached(key: str, compute: Callable[[], Any]) -> Any:
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, getattr(settings, 'STATS_CACHE_TTL', 60))
+    return value
+
+
+def booking_count(window: str = DEFAULT_WINDOW) -> int:
+    """
+    Количество бронирований, созданных за окно
+
+    Args:
+        window: Ключ окна из WINDOWS
+
+    Returns:
+        Количество бронирований
+    """
+    start = window_start(window)
+    return _cached(
+        f'bron:stats:bookings:{window}:{start.isoformat()}',
+        lambda: BookingHourlyStat.objects.filter(hour__gte=start).aggregate(total=Sum('count'))['total'] or 0
+    )
+
+
+def registration_count(window: str = DEFAULT_WINDOW) -> int:
+    """
+    Количество регистраций на мероприятия, созданных за окно
+
+    Args:
+        window: Ключ окна из WINDOWS
+
+    Returns:
+        Количество регистраций
+    """
+    start = window_start(window)
+    return _cached(
+        f'bron:stats:registrations:{window}:{start.isoformat()}',
+        lambda: RegistrationHourlyStat.objects.filter(hour__gte=start).aggregate(total=Sum('count'))['total'] or 0
+    )
+
+
+def most_booked_space(window: str = DEFAULT_WINDOW) -> Optional[dict]:
+    """
+    Видимое помещение с наибольшим количеством бронирований за окно
+
+    Args:
+        window: Ключ окна из WINDOWS
+
+    Returns:
+        Словарь с id, name и book_count или None, если бронирований не было
+    """
+    start = window_start(window)
+
+    def compute() -> dict:
+        top = BookingHourlyStat.objects.filter(
+            hour__gte=start,
+            space_id__is_visiable=True
+        ).values('space_id', 'space_id__name').annotate(
+            book_count=Sum('count')
+        ).order_by('-book_count', 'space_id').first()
+        if not top or not top['book_count']:
+            return {}
+        return {'id': top['space_id'], 'name': top['space_id__name'], 'book_count': top['book_count']}
+
+    return _cached(f'bron:stats:most-booked:{window}:{start.isoformat()}', compute) or None
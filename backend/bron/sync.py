@@ -0,0 +1,187 @@
+import uuid
+from threading import RLock
+from time import monotonic
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Сколько хранится запись журнала изменений; процесс, отставший сильнее, перестраивает индекс целиком
+LOG_TTL = 60 * 60 * 24
+# Сколько записей журнала читается одним запросом к кэшу
+LOG_BATCH = 16
+# Запись журнала, после которой индекс перестраивается целиком
+ALL = '*'
+
+
+def poll_interval() -> float:
+    """
+    Как часто в секундах индекс проверяет журнал в кэше; 0 — перед каждым чтением
+    """
+    return getattr(settings, 'SYNC_POLL_INTERVAL', 1.0)
+
+
+class SyncedIndex:
+    """
+    Основа индексов в памяти процесса, согласованных между процессами через общий кэш
+
+    Каждое изменение попадает в журнал в кэше Django: запись с очередным номером
+    хранит ключи изменённых элементов (ID помещений, пары тип-ID) или ALL.
+    Номер записи занимается через cache.add, поэтому два процесса не запишут
+    изменения под одним номером. Перед чтением индекс одним get_many проверяет,
+    появились ли записи после его позиции, и перечитывает из базы только
+    упомянутые в них элементы. Если записи уже истекли или кэш очищен,
+    индекс перестраивается целиком. Кэш должен быть общим для всех процессов.
+
+    Кэш хранится в базе данных, поэтому проверка журнала — это SQL-запрос
+    к bron_cache (get_many трёх ключей). Чтобы чтение индекса оставалось
+    обращением к памяти, журнал проверяется не чаще раза в SYNC_POLL_INTERVAL
+    секунд на процесс: изменения из других процессов видны с этой задержкой,
+    свои применяются сразу в publish. Проверки конфликтов броней идут
+    в базу данных и от задержки не зависят.
+
+    Наследники задают prefix и реализуют build и apply
+    """
+    prefix = ''
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._epoch: Optional[str] = None
+        self._position: Optional[int] = None
+        self._checked = float('-inf')
+
+    def build(self) -> None:
+        """
+        Заполнить индекс из базы данных целиком
+        """
+        raise NotImplementedError
+
+    def apply(self, keys: list[Any]) -> None:
+        """
+        Перечитать из базы данных изменённые элементы индекса
+
+        Args:
+            keys: Ключи элементов без повторов
+        """
+        raise NotImplementedError
+
+    def _key(self, name: str) -> str:
+        return f'{self.prefix}:{name}'
+
+    def _log_key(self, position: int) -> str:
+        return self._key(f'log:{position}')
+
+    def _current_epoch(self) -> str:
+        """
+        Метка журнала в кэше; если журнал пропал из кэша, начинается новый,
+        и все процессы перестраивают индекс
+        """
+        epoch = cache.get(self._key('epoch'))
+        if epoch is None or cache.get(self._key('head')) is None:
+            cache.set(self._key('epoch'), uuid.uuid4().hex, None)
+            cache.add(self._key('head'), 0, None)
+            epoch = cache.get(self._key('epoch'))
+        return epoch
+
+    def _read_log(self, position: int) -> tuple[int, Optional[list[Any]]]:
+        """
+        Записи журнала, идущие подряд после position
+
+        Args:
+            position: Номер последней применённой записи
+
+        Returns:
+            Номер последней записи и изменённые ключи или None, если индекс нужно перестроить целиком
+        """
+        keys: Optional[list[Any]] = []
+        while True:
+            names = [self._log_key(n) for n in range(position + 1, position + LOG_BATCH + 1)]
+            values = cache.get_many(names)
+            for name in names:
+                if name not in values:
+                    return position, keys
+                entry = values[name]
+                if entry == ALL:
+                    keys = None
+                elif keys is not None:
+                    keys.extend(entry)
+                position += 1
+
+    def rebuild(self) -> None:
+        """
+        Полностью перестроить индекс из базы данных
+
+        Позиция в журнале читается до базы: изменения, записанные позже, применятся при следующей проверке
+        """
+        with self._lock:
+            epoch = self._current_epoch()
+            position, _ = self._read_log(cache.get(self._key('head')) or 0)
+            self.build()
+            self._epoch, self._position = epoch, position
+            self._checked = monotonic()
+
+    def publish(self, keys: Optional[Iterable[Any]]) -> None:
+        """
+        Записать изменение в журнал; в этом процессе оно применяется сразу, если индекс не отстал
+
+        Вызывается после фиксации транзакции, иначе другие процессы перечитают старые данные
+
+        Args:
+            keys: Ключи изменённых элементов или None, если индекс нужно перестроить целиком
+        """
+        entry = ALL if keys is None else list(keys)
+        if not entry:
+            return
+        with self._lock:
+            epoch = self._current_epoch()
+            position = cache.get(self._key('head')) or 0
+            if epoch == self._epoch:
+                position = max(position, self._position)
+            while not cache.add(self._log_key(position + 1), entry, LOG_TTL):
+                position += 1
+            position += 1
+            if (cache.get(self._key('head')) or 0) < position:
+                cache.set(self._key('head'), position, None)
+
+            if epoch != self._epoch or self._position != position - 1:
+                # Индекс отстал: свои изменения догоняются при следующем чтении без ожидания
+                self._checked = float('-inf')
+                return
+            if entry == ALL:
+                self.rebuild()
+            else:
+                self.apply(list(dict.fromkeys(entry)))
+                self._position = position
+
+    def _ensure_loaded(self) -> None:
+        """
+        Применить изменения из журнала, записанные другими процессами;
+        чаще раза в poll_interval() журнал не проверяется
+        """
+        epoch, position = self._epoch, self._position
+        now = monotonic()
+        if position is not None:
+            if now - self._checked < poll_interval():
+                return
+            names = [self._key('epoch'), self._key('head')]
+            values = cache.get_many(names + [self._log_key(position + 1)])
+            if (
+                values.get(names[0]) == epoch and (values.get(names[1]) or 0) <= position
+                and self._log_key(position + 1) not in values
+            ):
+                self._checked = now
+                return
+
+        with self._lock:
+            if self._position is None or self._epoch != cache.get(self._key('epoch')):
+                self.rebuild()
+                return
+            position, keys = self._read_log(self._position)
+            if keys is None or (cache.get(self._key('head')) or 0) > position:
+                # Часть записей истекла или нужна полная перестройка
+                self.rebuild()
+                return
+            if keys:
+                self.apply(list(dict.fromkeys(keys)))
+            self._position = position
+            self._checked = now
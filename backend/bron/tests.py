@@ -1,12 +1,89 @@
-from django.test import TestCase
-from rest_framework.test import APITestCase, APIClient
+import base64
+import importlib
+import io
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps as django_apps
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import timedelta
+from django.core.cache import cache
+from datetime import datetime, timedelta
 from .models import *
 from django.core.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken 
+from .autocomplete import Autocomplete
+from .availability import AvailabilityIndex, availability_index
+from .booking import BookingConflict, confirmed_conflicts, create_booking, confirm_booking
+from .filters import EventFilter
+from .items import ItemBitsets
+from .views import EventViewSet, NewBookingViewSet
+from . import booking as booking_module, pdf
+from unittest import mock
+import tempfile
+import time
+import zipfile
+from urllib.parse import urlencode
+from django.test import override_settings
+from .jobs import JobStatus, get_job
+from .admin import deactivate_events, plus_day
+from .popularity import HOMEPAGE_CACHE_KEY, refresh_space_popularity
+from .search import index_spaces
+from .users import user_directory
+from .tokens import roles_key, user_cache
+from .transitions import InvalidTransition, StaleStatus, transition
+
+
+poll_override = override_settings(SYNC_POLL_INTERVAL=0)
+
+
+def setUpModule() -> None:
+    """
+    Индексы в памяти проверяют журнал перед каждым чтением: тесты очищают кэш
+    и откатывают базу, и состояние индекса не должно переживать тест на время опроса
+    """
+    poll_override.enable()
+
+
+def tearDownModule() -> None:
+    poll_override.disable()
+
+
+def app_queries(queries: CaptureQueriesContext) -> list[str]:
+    """
+    Запросы приложения без служебных запросов профилировщика silk и точек сохранения;
+    обращения к общему кэшу (таблица bron_cache) тоже считаются
+
+    Args:
+        queries: Перехваченные запросы
+
+    Returns:
+        Список SQL-запросов приложения
+    """
+    return [
+        query['sql'] for query in queries.captured_queries
+        if '"silk_' not in query['sql'] and not query['sql'].startswith(('EXPLAIN', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+    ]
+
+
+def cache_queries(queries: CaptureQueriesContext) -> list[str]:
+    """
+    Обращения к общему кэшу из запросов приложения
+
+    Args:
+        queries: Перехваченные запросы
+
+    Returns:
+        Список SQL-запросов к таблице bron_cache
+    """
+    return [sql for sql in app_queries(queries) if '"bron_cache"' in sql]
+
 
 class BookingModelTest(APITestCase):
     def setUp(self) -> None:
@@ -110,7 +187,7 @@ class BookingAPITest(APITestCase):
         """
         response = self.client.get('/api/spaces/', {'min_capacity': 3})
         self.assertEqual(response.status_code, 200)
-        self.assertTrue(len(response.data) > 0)
+        self.assertTrue(len(response.data['results']) > 0)
 
     def test_filter_by_date_and_city(self) -> None:
         """
@@ -168,3 +245,1776 @@ class BookingAPITest(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['username'], 'apiuser')
 
+
+
+class AvailabilityIndexTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для индекса занятости:
+        - очистка кэша с номером поколения индекса
+        - создание пользователя, здания и двух помещений
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='indexuser', password='pass123')
+        self.building = Building.objects.create(city="Test City 3", street="Test Street 3", house="3")
+        self.busy_space = Space.objects.create(name="Busy room", capacity=5, building_id=self.building, is_visiable=True)
+        self.free_space = Space.objects.create(name="Free room", capacity=5, building_id=self.building, is_visiable=True)
+        self.date_from = (timezone.now() + timedelta(days=5)).replace(second=0, microsecond=0)
+        self.date_to = self.date_from + timedelta(hours=2)
+
+    def search(self, date_from: datetime, date_to: datetime) -> set[int]:
+        response = self.client.get('/api/spaces/search/', {
+            'date_from': date_from.strftime('%Y-%m-%d %H:%M'),
+            'date_to': date_to.strftime('%Y-%m-%d %H:%M'),
+        })
+        self.assertEqual(response.status_code, 200)
+        return {space['id'] for space in response.data['results']}
+
+    def test_confirmed_booking_hides_space(self) -> None:
+        """
+        Тест исключения помещения с подтверждённой бронью, пересекающей окно
+        Касание границ окна занятостью не считается
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(user_id=self.user, space_id=self.busy_space, date_from=self.date_from, date_to=self.date_to, status=Booking.Status.CONFIRMATION)
+
+        self.assertEqual(self.search(self.date_from + timedelta(hours=1), self.date_to + timedelta(hours=1)), {self.free_space.id})
+        self.assertEqual(self.search(self.date_to, self.date_to + timedelta(hours=1)), {self.busy_space.id, self.free_space.id})
+
+    def test_index_follows_status_changes(self) -> None:
+        """
+        Тест синхронизации индекса при подтверждении и отмене брони
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(user_id=self.user, space_id=self.busy_space, date_from=self.date_from, date_to=self.date_to)
+        self.assertTrue(availability_index.is_free(self.busy_space.id, self.date_from, self.date_to))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = Booking.Status.CONFIRMATION
+            booking.save()
+        self.assertFalse(availability_index.is_free(self.busy_space.id, self.date_from, self.date_to))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = Booking.Status.CANCELAFTERCONFIRMATION
+            booking.save()
+        self.assertTrue(availability_index.is_free(self.busy_space.id, self.date_from, self.date_to))
+
+
+    def test_other_process_applies_changed_space(self) -> None:
+        """
+        Тест синхронизации через журнал в общем кэше: второй индекс перечитывает
+        только изменившееся помещение, без полной перестройки
+        """
+        other = AvailabilityIndex()
+        other.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(user_id=self.user, space_id=self.busy_space, date_from=self.date_from, date_to=self.date_to, status=Booking.Status.CONFIRMATION)
+        with mock.patch.object(other, 'build', wraps=other.build) as build:
+            self.assertFalse(other.is_free(self.busy_space.id, self.date_from, self.date_to))
+            self.assertTrue(other.is_free(self.free_space.id, self.date_from, self.date_to))
+        build.assert_not_called()
+
+    def test_log_polled_at_most_once_per_interval(self) -> None:
+        """
+        Тест опроса журнала не чаще SYNC_POLL_INTERVAL: чтения в пределах интервала не обращаются к кэшу,
+        изменения другого процесса видны после истечения интервала
+        """
+        with override_settings(SYNC_POLL_INTERVAL=60):
+            other = AvailabilityIndex()
+            other.rebuild()
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(3):
+                    self.assertTrue(other.is_free(self.busy_space.id, self.date_from, self.date_to))
+            self.assertEqual(app_queries(queries), [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Booking.objects.create(user_id=self.user, space_id=self.busy_space, date_from=self.date_from, date_to=self.date_to, status=Booking.Status.CONFIRMATION)
+            self.assertTrue(other.is_free(self.busy_space.id, self.date_from, self.date_to))
+            with mock.patch('bron.sync.monotonic', return_value=time.monotonic() + 61):
+                self.assertFalse(other.is_free(self.busy_space.id, self.date_from, self.date_to))
+
+    def test_pending_booking_is_not_published(self) -> None:
+        """
+        Тест того, что новая бронь не меняет занятость и не пишет в журнал изменений
+        """
+        availability_index.rebuild()
+        head = cache.get(availability_index._key('head'))
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(user_id=self.user, space_id=self.busy_space, date_from=self.date_from, date_to=self.date_to)
+            booking.status = Booking.Status.CANCELEDBEFORECONFIRMATION
+            booking.save()
+        self.assertEqual(cache.get(availability_index._key('head')), head)
+
+    def test_past_window_reads_database(self) -> None:
+        """
+        Тест окна в прошлом: закончившиеся брони не хранятся в индексе и ищутся в базе
+        """
+        date_from = self.date_from - timedelta(days=30)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(user_id=self.user, space_id=self.busy_space, date_from=date_from, date_to=date_from + timedelta(hours=2), status=Booking.Status.CONFIRMATION)
+        self.assertEqual(self.search(date_from, date_from + timedelta(hours=1)), {self.free_space.id})
+        self.assertNotIn(self.busy_space.id, availability_index._spaces)
+
+
+class BookingConcurrencyTest(TransactionTestCase):
+    WORKERS = 32
+    ATTEMPTS = 300
+
+    def setUp(self) -> None:
+        """
+        Инициализация данных для нагрузочного теста:
+        - создание пользователя, здания и одного помещения
+        """
+        self.user = User.objects.create_user(username='stressuser', password='pass123')
+        self.building = Building.objects.create(city="Test City 4", street="Test Street 4", house="4")
+        self.space = Space.objects.create(name="Hot room", capacity=5, building_id=self.building, is_visiable=True)
+        self.start = (timezone.now() + timedelta(days=10)).replace(minute=0, second=0, microsecond=0)
+
+    def attempt(self, offset: int) -> str:
+        """
+        Одна попытка: создать бронь на пересекающееся окно и сразу подтвердить её
+        """
+        date_from = self.start + timedelta(minutes=30 * offset)
+        try:
+            booking = create_booking(self.user, self.space, date_from, date_from + timedelta(hours=2))
+            confirm_booking(booking)
+            return 'confirmed'
+        except BookingConflict:
+            return 'conflict'
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_never_overlap(self) -> None:
+        """
+        Тест параллельных бронирований одного помещения
+        Подтверждённые брони не должны пересекаться, остальные попытки получают конфликт
+        """
+        offsets = [random.Random(i).randrange(24) for i in range(self.ATTEMPTS)]
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            results = list(pool.map(self.attempt, offsets))
+
+        confirmed = list(Booking.objects.filter(space_id=self.space, status=Booking.Status.CONFIRMATION).order_by('date_from'))
+        self.assertEqual(results.count('confirmed'), len(confirmed))
+        self.assertEqual(results.count('confirmed') + results.count('conflict'), self.ATTEMPTS)
+        for previous, current in zip(confirmed, confirmed[1:]):
+            self.assertLessEqual(previous.date_to, current.date_from)
+        self.assertEqual(booking_module._space_locks, {})
+
+
+class OverlapConstraintMigrationTest(TestCase):
+    def test_existing_overlaps_are_reported(self) -> None:
+        """
+        Тест проверки перед добавлением ограничения: пересекающиеся подтверждённые брони перечисляются в ошибке
+        """
+        migration = importlib.import_module('bron.migrations.0026_booking_no_overlap_constraint')
+        user = User.objects.create_user(username='overlapuser', password='pass123')
+        building = Building.objects.create(city="Test City 26", street="Test Street 26", house="26")
+        space = Space.objects.create(name="Overlap room", capacity=5, building_id=building, is_visiable=True)
+        start = timezone.now() + timedelta(days=1)
+        first = Booking.objects.create(user_id=user, space_id=space, date_from=start, date_to=start + timedelta(hours=2), status=Booking.Status.CONFIRMATION)
+        migration.check_overlaps(mock.Mock(connection=connection))
+
+        second = Booking.objects.create(user_id=user, space_id=space, date_from=start + timedelta(hours=1), date_to=start + timedelta(hours=3), status=Booking.Status.CONFIRMATION)
+        with self.assertRaisesMessage(RuntimeError, f'{first.id} и {second.id} (помещение {space.id})'):
+            migration.check_overlaps(mock.Mock(connection=connection))
+
+
+class QueryPlanTest(TestCase):
+    """
+    Регрессионный тест планов запросов горячих эндпоинтов: каждый запрос
+    должен искать по индексу, а не сканировать таблицу целиком
+    """
+    def setUp(self) -> None:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertNoFullScan(self, queryset, table: str) -> None:
+        """
+        Проверка плана EXPLAIN на отсутствие полного сканирования таблицы
+
+        Args:
+            queryset: Проверяемый запрос
+            table: Имя таблицы
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            plan = '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan, plan)
+        else:
+            self.assertIsNone(re.search(rf'\bSCAN {table}\b', plan), plan)
+            self.assertIn(f'SEARCH {table}', plan, plan)
+
+    def test_booking_conflict_check(self) -> None:
+        now = timezone.now()
+        self.assertNoFullScan(confirmed_conflicts(1, now, now + timedelta(hours=1)), 'bron_booking')
+
+    def test_new_bookings(self) -> None:
+        self.assertNoFullScan(NewBookingViewSet().get_queryset(), 'bron_booking')
+
+    def test_events(self) -> None:
+        self.assertNoFullScan(EventViewSet().get_queryset(), 'bron_event')
+        self.assertNoFullScan(Event.objects.filter(date__gte=timezone.now(), is_visiable=True).order_by('date')[:3], 'bron_event')
+
+    def test_event_filter(self) -> None:
+        now = timezone.now()
+        for params in ({'date_from': now, 'date_to': now + timedelta(days=31)}, {'org_id': 1}, {'space_id': 1}):
+            events = EventFilter(params, queryset=EventViewSet().get_queryset()).qs.order_by('date', 'id')[:21]
+            self.assertNoFullScan(events, 'bron_event')
+
+    def test_registrations(self) -> None:
+        self.assertNoFullScan(Registration.objects.filter(event_id=1, status=Registration.Status.CONFIRMATION), 'bron_registration')
+
+    def test_favourites(self) -> None:
+        self.assertNoFullScan(Favourite.objects.filter(user_id=1, space_id=1), 'bron_favourite')
+
+    def test_user_search(self) -> None:
+        self.assertNoFullScan(user_directory('ив пет').order_by('first_name', 'id')[:51], 'auth_user')
+
+
+class SpaceListQueryCountTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для подсчёта запросов:
+        - создание пользователя с JWT токеном и здания
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='favuser', password='pass123')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {refresh.access_token}')
+        self.building = Building.objects.create(city="Test City 5", street="Test Street 5", house="5")
+        self.item = ItemInSpaces.objects.create(name="Проектор")
+
+    def create_spaces(self, count: int) -> None:
+        """
+        Создание помещений с особенностью, изображением, бронью, отзывом и избранным
+        """
+        for i in range(count):
+            space = Space.objects.create(name=f"Room {i}", capacity=5, building_id=self.building, is_visiable=True)
+            space.items_id.add(self.item)
+            ImageForSpaces.objects.create(space_id=space)
+            Booking.objects.create(user_id=self.user, space_id=space, status=Booking.Status.CONFIRMATION,
+                                   date_from=timezone.now() - timedelta(days=2), date_to=timezone.now() - timedelta(days=1))
+            SpacesReview.objects.create(user_id=self.user, space_id=space, review="ok")
+            if i % 2:
+                Favourite.objects.create(user_id=self.user, space_id=space)
+
+    def count_queries(self, url: str) -> int:
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_queries(queries), [])
+        return len(app_queries(queries))
+
+    def test_is_fav(self) -> None:
+        """
+        Тест признака избранного в списке помещений
+        """
+        self.create_spaces(4)
+        response = self.client.get('/api/spaces/')
+        favourites = {space['name']: space['is_fav'] for space in response.data['results']}
+        self.assertEqual(favourites, {'Room 0': False, 'Room 1': True, 'Room 2': False, 'Room 3': True})
+
+    def test_constant_queries(self) -> None:
+        """
+        Тест постоянного количества запросов независимо от числа помещений
+        """
+        self.create_spaces(1)
+        single = {url: self.count_queries(url) for url in ('/api/spaces/', '/api/spaces/search/')}
+        self.create_spaces(10)
+        for url, expected in single.items():
+            self.assertEqual(self.count_queries(url), expected, url)
+
+    def test_pages_stable_when_favourites_change(self) -> None:
+        """
+        Тест обхода списка, пока помещения добавляют в избранное: ни одно не теряется и не повторяется
+        """
+        self.create_spaces(5)
+        response = self.client.get('/api/spaces/', {'page_size': 2})
+        seen = [space['id'] for space in response.data['results']]
+        while response.data['next']:
+            Favourite.objects.create(user_id=self.user, space_id=Space.objects.exclude(id__in=seen).order_by('id').first())
+            response = self.client.get(response.data['next'])
+            seen += [space['id'] for space in response.data['results']]
+        self.assertEqual(seen, sorted(Space.objects.values_list('id', flat=True), reverse=True))
+
+
+class SpaceSubResourcesTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для вложенных ресурсов помещения:
+        - создание пользователя, здания и помещения
+        - бронь в прошлом, в ближайшую неделю и через два месяца
+        """
+        self.user = User.objects.create_user(username='historyuser', password='pass123')
+        self.building = Building.objects.create(city="Test City 6", street="Test Street 6", house="6")
+        self.space = Space.objects.create(name="History room", capacity=5, building_id=self.building, is_visiable=True)
+        now = timezone.now()
+        for days in (-30, 3, 60):
+            Booking.objects.create(user_id=self.user, space_id=self.space, date_from=now + timedelta(days=days), date_to=now + timedelta(days=days, hours=1))
+        SpacesReview.objects.create(user_id=self.user, space_id=self.space, review="visible")
+        SpacesReview.objects.create(user_id=self.user, space_id=self.space, review="hidden", is_visiable=False)
+
+    def test_list_is_slim_and_paginated(self) -> None:
+        """
+        Тест облегчённого списка: без бронирований и отзывов, с курсорной пагинацией
+        """
+        response = self.client.get('/api/spaces/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('next', response.data)
+        space = response.data['results'][0]
+        self.assertNotIn('bookings', space)
+        self.assertNotIn('reviews', space)
+
+    def test_bookings_window(self) -> None:
+        """
+        Тест окна бронирований: по умолчанию месяц вперёд, иначе заданный период
+        """
+        response = self.client.get(f'/api/spaces/{self.space.pk}/bookings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+        date_from = (timezone.now() - timedelta(days=40)).strftime('%Y-%m-%d')
+        date_to = (timezone.now() + timedelta(days=10)).strftime('%Y-%m-%d')
+        response = self.client.get(f'/api/spaces/{self.space.pk}/bookings/', {'from': date_from, 'to': date_to, 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(f'/api/spaces/{self.space.pk}/bookings/', {'from': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reviews(self) -> None:
+        """
+        Тест списка отзывов: скрытые отзывы не возвращаются
+        """
+        response = self.client.get(f'/api/spaces/{self.space.pk}/reviews/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([review['review'] for review in response.data['results']], ['visible'])
+
+
+class HomepageWidgetTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для виджетов главной страницы:
+        - очистка кэша, создание пользователя, здания и двух помещений
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='widgetuser', password='pass123')
+        self.building = Building.objects.create(city="Test City 7", street="Test Street 7", house="7")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = Space.objects.create(name="First", capacity=5, building_id=self.building, is_visiable=True)
+            self.second = Space.objects.create(name="Second", capacity=5, building_id=self.building, is_visiable=True)
+            Favourite.objects.create(user_id=self.user, space_id=self.first)
+
+    def homepage(self) -> dict:
+        response = self.client.get('/api/widgets/homepage/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_served_from_cache(self) -> None:
+        """
+        Тест повторного запроса главной страницы без обращений к базе данных
+        """
+        self.assertEqual(self.homepage()['top_popular_spaces'][0]['name'], 'First')
+        with CaptureQueriesContext(connection) as queries:
+            self.homepage()
+        self.assertEqual(len(cache_queries(queries)), 1)
+        self.assertEqual(app_queries(queries), cache_queries(queries))
+
+    def test_invalidated_by_signals(self) -> None:
+        """
+        Тест пересчёта счётчиков и сброса кэша после новых отзывов и броней
+        """
+        self.assertEqual(self.homepage()['top_popular_spaces'][0]['name'], 'First')
+        with self.captureOnCommitCallbacks(execute=True):
+            SpacesReview.objects.create(user_id=self.user, space_id=self.second, review="good")
+            Booking.objects.create(user_id=self.user, space_id=self.second, status=Booking.Status.CONFIRMATION,
+                                   date_from=timezone.now() - timedelta(days=2), date_to=timezone.now() - timedelta(days=1))
+        top = self.homepage()['top_popular_spaces'][0]
+        self.assertEqual((top['name'], top['review_count'], top['booking_count']), ('Second', 1, 1))
+
+    def create_activity(self) -> None:
+        """
+        Два отзыва, два избранных и две подтверждённые брони первого помещения
+        вместе со скрытым отзывом и неподтверждённой бронью
+        """
+        other = User.objects.create_user(username='widgetother', password='pass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in (self.user, other):
+                SpacesReview.objects.create(user_id=user, space_id=self.first, review="good")
+                Booking.objects.create(user_id=user, space_id=self.first, status=Booking.Status.CONFIRMATION,
+                                       date_from=timezone.now() - timedelta(days=2), date_to=timezone.now() - timedelta(days=1))
+            Favourite.objects.create(user_id=other, space_id=self.first)
+            SpacesReview.objects.create(user_id=other, space_id=self.first, review="hidden", is_visiable=False)
+            Booking.objects.create(user_id=other, space_id=self.first,
+                                   date_from=timezone.now() + timedelta(days=1), date_to=timezone.now() + timedelta(days=2))
+
+    def test_counts_without_join_product(self) -> None:
+        """
+        Тест подсчёта отзывов, избранного и броней подзапросами без соединения таблиц
+        """
+        self.create_activity()
+        with CaptureQueriesContext(connection) as queries:
+            refresh_space_popularity([self.first.pk])
+        select = next(sql for sql in app_queries(queries) if sql.startswith('SELECT'))
+        self.assertNotIn('JOIN', select)
+        popularity = SpacePopularity.objects.get(space_id=self.first)
+        self.assertEqual((popularity.review_count, popularity.fav_count, popularity.booking_count), (2, 2, 2))
+
+    def test_migration_fills_counts(self) -> None:
+        """
+        Тест начального заполнения счётчиков миграцией теми же подзапросами без соединения таблиц
+        """
+        self.create_activity()
+        organizer = Organizer.objects.create(name="Widget Org", org_id=self.user)
+        for i in range(2):
+            Event.objects.create(name=f"Widget Event {i}", date=timezone.now() + timedelta(days=1), space_id=self.first, org_id=organizer)
+        SpacePopularity.objects.all().delete()
+        OrganizerPopularity.objects.all().delete()
+        migration = importlib.import_module('bron.migrations.0028_spacepopularity_organizerpopularity')
+        with CaptureQueriesContext(connection) as queries:
+            migration.fill_popularity(django_apps, None)
+        selects = [sql for sql in app_queries(queries) if sql.startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'JOIN' in sql])
+        popularity = SpacePopularity.objects.get(space_id=self.first)
+        self.assertEqual((popularity.review_count, popularity.fav_count, popularity.booking_count, popularity.score), (2, 2, 2, 6))
+        self.assertEqual(OrganizerPopularity.objects.get(org_id=organizer).event_count, 2)
+
+
+class StatsWindowTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для статистики:
+        - очистка кэша, создание пользователя, здания, помещения, организатора и мероприятия
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='statsuser', password='pass123')
+        self.building = Building.objects.create(city="Test City 8", street="Test Street 8", house="8")
+        self.space = Space.objects.create(name="Stats", capacity=5, building_id=self.building, is_visiable=True)
+        self.organizer = Organizer.objects.create(name="Stats Org", org_id=self.user)
+        self.event = Event.objects.create(name="Stats Event", date=timezone.now() + timedelta(days=1), space_id=self.space, org_id=self.organizer)
+
+    def book(self) -> Booking:
+        return Booking.objects.create(user_id=self.user, space_id=self.space,
+                                      date_from=timezone.now() + timedelta(days=1), date_to=timezone.now() + timedelta(days=1, hours=1))
+
+    def test_hourly_buckets_follow_writes(self) -> None:
+        """
+        Тест изменения почасовых счётчиков при создании и удалении броней и регистраций
+        """
+        first = self.book()
+        self.book()
+        Registration.objects.create(user_id=self.user, event_id=self.event)
+        self.assertEqual(BookingHourlyStat.objects.get(space_id=self.space).count, 2)
+        self.assertEqual(RegistrationHourlyStat.objects.get(event_id=self.event).count, 1)
+
+        first.delete()
+        self.assertEqual(BookingHourlyStat.objects.get(space_id=self.space).count, 1)
+
+    def test_window_is_computed_per_request(self) -> None:
+        """
+        Тест того, что старые корзины выпадают из окна, а не зависят от времени запуска процесса
+        """
+        self.book()
+        BookingHourlyStat.objects.create(space_id=self.space, hour=timezone.now() - timedelta(days=10), count=5)
+
+        response = self.client.get('/api/bookings/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bookings'], 1)
+        self.assertEqual(response.data['last_week_bookings'], 1)
+
+        response = self.client.get('/api/bookings/stats/', {'window': '30d'})
+        self.assertEqual(response.data['bookings'], 6)
+        self.assertNotIn('last_week_bookings', response.data)
+
+    def test_most_booked_space(self) -> None:
+        """
+        Тест наиболее бронируемого помещения и отказа для неизвестного окна
+        """
+        response = self.client.get('/api/spaces/stats/')
+        self.assertEqual(response.data['book_count'], 0)
+
+        cache.clear()
+        self.book()
+        response = self.client.get('/api/spaces/stats/', {'window': '24h'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['most_booked_space_id'], response.data['most_booked_count']), (self.space.id, 1))
+
+        response = self.client.get('/api/spaces/stats/', {'window': '1y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EventPdfCacheTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для PDF мероприятия:
+        - очистка кэша, создание пользователя, организатора, помещения и мероприятия
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='pdfuser', password='pass123')
+        self.organizer = Organizer.objects.create(name="PDF Org", org_id=self.user)
+        self.building = Building.objects.create(city="Test City 9", street="Test Street 9", house="9")
+        self.space = Space.objects.create(name="PDF Space", capacity=5, building_id=self.building, is_visiable=True)
+        self.event = Event.objects.create(name="PDF Event", date=timezone.now() + timedelta(days=1), space_id=self.space, org_id=self.organizer)
+        self.url = f'/events/{self.event.pk}/pdf/'
+
+    def test_repeat_download_is_not_rendered(self) -> None:
+        """
+        Тест повторной выдачи PDF из кэша и ответа 304 по ETag
+        """
+        with mock.patch.object(pdf, 'render_event_pdf', wraps=pdf.render_event_pdf) as render:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.content.startswith(b'%PDF'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(render.call_count, 1)
+
+    def test_changes_produce_new_document(self) -> None:
+        """
+        Тест смены ETag после изменения мероприятия и его особенностей
+        """
+        etag = self.client.get(self.url)['ETag']
+        self.event.name = "PDF Event Renamed"
+        self.event.save()
+        renamed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(renamed.status_code, 200)
+
+        self.event.items_id.add(ItemInEvents.objects.create(name="Кофе"))
+        self.assertIsNone(cache.get(pdf.pdf_cache_key(self.event.pk)))
+        self.assertNotEqual(self.client.get(self.url)['ETag'], renamed['ETag'])
+
+    def test_missing_event(self) -> None:
+        """
+        Тест ответа 404 для несуществующего мероприятия
+        """
+        self.assertEqual(self.client.get('/events/999999/pdf/').status_code, 404)
+
+
+class EventExportJobTest(APITransactionTestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для фоновой выгрузки; данные фиксируются, чтобы поток задачи видел их и мог писать в общий кэш:
+        - очистка кэша, временный каталог архивов
+        - создание администратора, организатора, помещения, двух предстоящих и одного прошедшего мероприятия
+        """
+        cache.clear()
+        self.export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_root.cleanup)
+        settings_override = override_settings(PDF_EXPORT_ROOT=self.export_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='exportadmin', password='pass123')
+        self.user.user_profile.admin_status = True
+        self.user.user_profile.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.user).access_token}')
+
+        organizer = Organizer.objects.create(name="Export Org", org_id=self.user)
+        building = Building.objects.create(city="Test City 10", street="Test Street 10", house="10")
+        space = Space.objects.create(name="Export Space", capacity=5, building_id=building, is_visiable=True)
+        self.upcoming = [
+            Event.objects.create(name=f"Upcoming {i}", date=timezone.now() + timedelta(days=i + 1), space_id=space, org_id=organizer)
+            for i in range(2)
+        ]
+        Event.objects.create(name="Past", date=timezone.now() - timedelta(days=1), space_id=space, org_id=organizer)
+
+    def wait(self, job_id: str) -> dict:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            job = get_job(job_id)
+            if job['status'] in (JobStatus.DONE, JobStatus.FAILED):
+                return job
+            time.sleep(0.05)
+        self.fail('Выгрузка не завершилась')
+
+    def test_export_upcoming_events(self) -> None:
+        """
+        Тест выгрузки предстоящих мероприятий в архив и скачивания через API
+        """
+        response = self.client.post('/api/exports/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['total'], 2)
+
+        job = self.wait(response.data['id'])
+        self.assertEqual((job['status'], job['done']), (JobStatus.DONE, 2))
+
+        response = self.client.get(f"/api/exports/{job['id']}/")
+        self.assertIn('download', response.data)
+        response = self.client.get(f"/api/exports/{job['id']}/download/")
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(sorted(archive.namelist()), sorted(f'event_{event.pk}.pdf' for event in self.upcoming))
+
+    def test_requires_admin(self) -> None:
+        """
+        Тест запрета выгрузки для обычного пользователя и ответа 404 для неизвестной задачи
+        """
+        self.assertEqual(self.client.get('/api/exports/unknown/').status_code, 404)
+        self.user.user_profile.admin_status = False
+        self.user.user_profile.save()
+        self.assertEqual(self.client.post('/api/exports/').status_code, 403)
+
+    def test_expired_archives_removed(self) -> None:
+        """
+        Тест удаления архивов старше PDF_EXPORT_TTL при следующей выгрузке
+        """
+        stale, fresh = (os.path.join(self.export_root.name, name) for name in ('stale.zip', 'fresh.zip'))
+        for path in (stale, fresh):
+            with open(path, 'wb'):
+                pass
+        expired = time.time() - 2 * 60 * 60 * 24
+        os.utime(stale, (expired, expired))
+
+        response = self.client.post('/api/exports/')
+        self.assertEqual(self.wait(response.data['id'])['status'], JobStatus.DONE)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+
+
+class EventListQueryCountTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для подсчёта запросов списка мероприятий:
+        - создание пользователя, организатора, здания, помещения и особенности
+        """
+        self.user = User.objects.create_user(username='eventlistuser', password='pass123')
+        self.organizer = Organizer.objects.create(name="List Org", org_id=self.user)
+        self.building = Building.objects.create(city="Test City 11", street="Test Street 11", house="11")
+        self.space = Space.objects.create(name="List Space", capacity=5, building_id=self.building, is_visiable=True)
+        ImageForSpaces.objects.create(space_id=self.space)
+        self.item = ItemInEvents.objects.create(name="Кофе")
+
+    def create_events(self, count: int) -> None:
+        """
+        Создание предстоящих мероприятий с особенностью, изображением и регистрацией
+        """
+        events = Event.objects.bulk_create(
+            Event(name=f"Event {i}", date=timezone.now() + timedelta(days=1, minutes=i), space_id=self.space, org_id=self.organizer)
+            for i in range(count)
+        )
+        EventWithItems.objects.bulk_create(EventWithItems(event=event, item=self.item) for event in events)
+        ImageForEvents.objects.bulk_create(ImageForEvents(event_id=event) for event in events)
+        Registration.objects.bulk_create(Registration(event_id=event, user_id=self.user) for event in events)
+
+    def count_queries(self) -> tuple[int, list]:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/events/')
+        self.assertEqual(response.status_code, 200)
+        return len(app_queries(queries)), response.data
+
+    def test_constant_queries(self) -> None:
+        """
+        Тест одинакового количества запросов для 1 и 500 мероприятий
+        """
+        self.create_events(1)
+        single, data = self.count_queries()
+        self.assertNotIn('regs', data[0])
+        self.assertEqual(data[0]['reg_count'], 1)
+        self.assertEqual(data[0]['organizer']['user']['id'], self.user.id)
+
+        self.create_events(499)
+        many, data = self.count_queries()
+        self.assertEqual(len(data), 500)
+        self.assertEqual(many, single)
+
+    def test_cutoff_is_computed_per_request(self) -> None:
+        """
+        Тест того, что прошедшие мероприятия исключаются по текущему времени запроса
+        """
+        self.create_events(1)
+        Event.objects.update(date=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get('/api/events/').data, [])
+
+
+class CurrentUserTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для профиля текущего пользователя:
+        - очистка кэша, создание пользователя с JWT токеном, помещения и мероприятия
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='meuser', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.user).access_token}')
+        self.building = Building.objects.create(city="Test City 12", street="Test Street 12", house="12")
+        self.space = Space.objects.create(name="Me Space", capacity=5, building_id=self.building, is_visiable=True)
+        ImageForSpaces.objects.create(space_id=self.space)
+        organizer = Organizer.objects.create(name="Me Org", org_id=self.user)
+        self.event = Event.objects.create(name="Me Event", date=timezone.now() + timedelta(days=1), space_id=self.space, org_id=organizer)
+
+    def create_bookings(self, count: int) -> None:
+        start = timezone.now() + timedelta(days=1)
+        Booking.objects.bulk_create(
+            Booking(user_id=self.user, space_id=self.space, date_from=start + timedelta(hours=i), date_to=start + timedelta(hours=i, minutes=30))
+            for i in range(count)
+        )
+
+    def count_queries(self, url: str) -> int:
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(app_queries(queries))
+
+    def test_summary_counters(self) -> None:
+        """
+        Тест счётчиков профиля и их сброса после новой брони и регистрации
+        """
+        response = self.client.get('/api/me/')
+        self.assertEqual((response.data['total_events'], response.data['total_bookings']), (0, 0))
+        self.assertNotIn('user_books', response.data)
+
+        Booking.objects.create(user_id=self.user, space_id=self.space,
+                               date_from=timezone.now() + timedelta(days=2), date_to=timezone.now() + timedelta(days=2, hours=1))
+        Registration.objects.create(user_id=self.user, event_id=self.event)
+        response = self.client.get('/api/me/')
+        self.assertEqual((response.data['total_events'], response.data['total_bookings']), (1, 1))
+
+    def test_paginated_history(self) -> None:
+        """
+        Тест постраничной выдачи броней и регистраций за постоянное число запросов
+        """
+        self.create_bookings(1)
+        Registration.objects.create(user_id=self.user, event_id=self.event)
+        single = {url: self.count_queries(url) for url in ('/api/me/bookings/', '/api/me/registrations/')}
+
+        self.create_bookings(60)
+        for url, expected in single.items():
+            self.assertEqual(self.count_queries(url), expected, url)
+
+        response = self.client.get('/api/me/bookings/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(self.client.get('/api/me/registrations/').data['results'][0]['event_id'], self.event.id)
+
+
+class UserDirectoryTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для справочника пользователей:
+        - создание администратора с JWT токеном
+        - создание пользователей с профилем, регистрациями и бронированиями
+        """
+        self.admin = User.objects.create_user(username='diradmin', password='pass123', first_name='Админ')
+        self.admin.user_profile.admin_status = True
+        self.admin.user_profile.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.admin).access_token}')
+
+        self.ivan = User.objects.create_user(username='ivanov', password='pass123', first_name='Иван', last_name='Петров')
+        self.ivan.user_profile.patronymic = 'Сергеевич'
+        self.ivan.user_profile.save()
+        User.objects.create_user(username='maria', password='pass123', first_name='Мария', last_name='Иванова')
+
+        building = Building.objects.create(city="Test City 13", street="Test Street 13", house="13")
+        space = Space.objects.create(name="Directory Space", capacity=5, building_id=building, is_visiable=True)
+        organizer = Organizer.objects.create(name="Directory Org", org_id=self.admin)
+        for i in range(2):
+            event = Event.objects.create(name=f"Directory Event {i}", date=timezone.now() + timedelta(days=1), space_id=space, org_id=organizer)
+            Registration.objects.create(user_id=self.ivan, event_id=event)
+        for i in range(3):
+            Booking.objects.create(user_id=self.ivan, space_id=space,
+                                   date_from=timezone.now() + timedelta(days=i + 1), date_to=timezone.now() + timedelta(days=i + 1, hours=1))
+
+    def test_counts_without_cartesian_product(self) -> None:
+        """
+        Тест счётчиков регистраций и бронирований без перемножения строк
+        """
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        users = {user['username']: user for user in response.data['results']}
+        self.assertNotIn('diradmin', users)
+        self.assertEqual((users['ivanov']['total_events'], users['ivanov']['total_bookings']), (2, 3))
+        self.assertEqual((users['maria']['total_events'], users['maria']['total_bookings']), (0, 0))
+
+    def test_prefix_search(self) -> None:
+        """
+        Тест поиска по началу имени, фамилии и отчества
+        """
+        def found(query: str) -> list[str]:
+            return [user['username'] for user in self.client.get('/api/users/', {'search': query}).data['results']]
+
+        self.assertEqual(found('иван'), ['ivanov', 'maria'])
+        self.assertEqual(found('Иван Пет'), ['ivanov'])
+        self.assertEqual(found('серг'), ['ivanov'])
+        self.assertEqual(found('ван'), [])
+        self.assertEqual(found('иВАН пЕТ'), ['ivanov'])
+        self.assertEqual(found('IVAN'), ['ivanov'])
+
+        User.objects.create_user(username='delacruz', password='pass123', first_name='Хуан', last_name='ДеЛаКруз')
+        self.assertEqual(found('делакр'), ['delacruz'])
+
+    def test_keyset_pagination(self) -> None:
+        """
+        Тест постраничного обхода справочника администратора
+        """
+        response = self.client.get('/api/adminusers/', {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_keyset_pagination_with_equal_names(self) -> None:
+        """
+        Тест обхода тёзок в обе стороны: позиция курсора — (first_name, id), без OFFSET
+        """
+        for i in range(4):
+            User.objects.create_user(username=f'ivan{i}', password='pass123', first_name='Иван')
+        expected = list(User.objects.order_by('first_name', 'id').values_list('username', flat=True))
+
+        pages, url = [], '/api/adminusers/?page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse([sql for sql in app_queries(queries) if 'OFFSET' in sql.upper()])
+            pages.append([user['username'] for user in response.data['results']])
+            url = response.data['next']
+        self.assertEqual(sum(pages, []), expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([user['username'] for user in response.data['results']], pages[-2])
+
+
+class RoleTokenTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для токенов с ролями:
+        - очистка кэша, создание администратора и обычного пользователя
+        - получение пар токенов через эндпоинт входа
+        """
+        cache.clear()
+        self.admin = User.objects.create_user(username='roleadmin', password='pass123')
+        self.admin.user_profile.admin_status = True
+        self.admin.user_profile.save()
+        self.user = User.objects.create_user(username='roleuser', password='pass123')
+        self.admin_tokens = self.obtain('roleadmin')
+        self.user_tokens = self.obtain('roleuser')
+
+    def obtain(self, username: str) -> dict:
+        response = self.client.post('/api/auth/jwt/create/', {'username': username, 'password': 'pass123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get(self, url: str, access: str):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'JWT {access}')
+
+    def test_permission_check_without_user_queries(self) -> None:
+        """
+        Тест проверки прав администратора без запросов к auth_user и bron_profile,
+        когда роли уже лежат в кэше
+        """
+        self.get('/api/spaces/', self.user_tokens['access'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get('/api/exports/unknown/', self.admin_tokens['access'])
+            self.get('/api/spaces/', self.user_tokens['access'])
+        self.assertEqual(response.status_code, 404)
+        touched = [sql for sql in app_queries(queries) if 'auth_user' in sql or 'bron_profile' in sql]
+        self.assertEqual(touched, [])
+        # Одно чтение ролей из общего кэша на запрос и чтение состояния задачи выгрузки
+        roles = [sql for sql in cache_queries(queries) if 'bron:tokens:roles' in sql]
+        self.assertEqual((len(roles), len(cache_queries(queries))), (2, 3))
+
+        self.assertEqual(self.get('/api/exports/unknown/', self.user_tokens['access']).status_code, 403)
+        self.assertEqual(self.get('/api/me/', self.user_tokens['access']).data['username'], 'roleuser')
+
+    def test_role_change_revokes_tokens(self) -> None:
+        """
+        Тест отзыва токена после makeadmin и выдачи нового с ролью через refresh
+        """
+        response = self.client.patch(f'/api/adminusers/{self.user.id}/makeadmin/', HTTP_AUTHORIZATION=f"JWT {self.admin_tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('/api/me/', self.user_tokens['access']).status_code, 401)
+
+        response = self.client.post('/api/auth/jwt/refresh/', {'refresh': self.user_tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('/api/exports/unknown/', response.data['access']).status_code, 404)
+
+    def test_deactivated_user_is_rejected(self) -> None:
+        """
+        Тест отклонения токенов и обновления для отключённого пользователя
+        """
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get('/api/me/', self.user_tokens['access']).status_code, 401)
+        self.assertEqual(self.client.post('/api/auth/jwt/refresh/', {'refresh': self.user_tokens['refresh']}).status_code, 401)
+
+    def test_revocation_survives_cache_eviction(self) -> None:
+        """
+        Тест отзыва после вытеснения записи о ролях: роли перечитываются из профиля, а не берутся из токена
+        """
+        response = self.client.patch(f'/api/adminusers/{self.admin.id}/unmakeadmin/', HTTP_AUTHORIZATION=f"JWT {self.admin_tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+        cache.clear()
+        self.assertEqual(self.get('/api/exports/unknown/', self.admin_tokens['access']).status_code, 401)
+        self.assertEqual(cache.get(roles_key(self.admin.id)), {'admin_status': False, 'org_status': False})
+
+    def test_deleted_user_is_rejected(self) -> None:
+        """
+        Тест отклонения токена удалённого пользователя, в том числе если отзыв пропал из кэша
+        """
+        self.user.delete()
+        self.assertEqual(self.get('/api/me/', self.user_tokens['access']).status_code, 401)
+        cache.clear()
+        self.assertEqual(self.get('/api/me/', self.user_tokens['access']).status_code, 401)
+
+
+class UserCacheTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для кэша пользователей:
+        - создание пользователя и JWT токена без ролей
+        """
+        user_cache.clear()
+        self.user = User.objects.create_user(username='cacheuser', password='pass123', first_name='Old')
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.user).access_token}')
+
+    def me(self) -> tuple[int, dict]:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/me/')
+        self.assertEqual(response.status_code, 200)
+        self.cache_reads = len(cache_queries(queries))
+        return len([sql for sql in app_queries(queries) if 'auth_user' in sql or 'bron_profile' in sql]), response.data
+
+    def test_user_and_profile_loaded_once(self) -> None:
+        """
+        Тест загрузки пользователя с профилем одним запросом и повторного использования из кэша
+        """
+        self.assertEqual(self.me()[0], 1)
+        self.assertEqual(self.me()[0], 0)
+        # Токен без ролей не читает кэш ролей; остаётся одно чтение счётчиков /api/me/
+        self.assertEqual(self.cache_reads, 1)
+
+    def test_invalidated_on_save(self) -> None:
+        """
+        Тест сброса кэша после изменения пользователя и профиля
+        """
+        self.me()
+        self.user.first_name = 'New'
+        self.user.save()
+        self.assertEqual(self.me()[1]['first_name'], 'New')
+
+        profile = Profile.objects.get(user=self.user)
+        profile.telephone = '+79990000000'
+        profile.save()
+        self.assertEqual(self.me()[1]['profile']['telephone'], '+79990000000')
+
+    def test_requests_get_independent_copies(self) -> None:
+        """
+        Тест того, что изменения пользователя в одном запросе не видны другим
+        """
+        first = user_cache.get(self.user.id)
+        first.first_name = 'Changed'
+        self.assertEqual(user_cache.get(self.user.id).first_name, 'Old')
+
+
+class BookingDecisionTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для пакетной обработки броней:
+        - очистка кэша, создание администратора с JWT токеном, здания и двух помещений
+        - создание подтверждённой брони на завтра с 10 до 12
+        """
+        cache.clear()
+        self.admin = User.objects.create_user(username='decideadmin', password='pass123')
+        self.admin.user_profile.admin_status = True
+        self.admin.user_profile.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.admin).access_token}')
+        self.building = Building.objects.create(city="Test City 14", street="Test Street 14", house="14")
+        self.first = Space.objects.create(name="Decide 1", capacity=5, building_id=self.building, is_visiable=True)
+        self.second = Space.objects.create(name="Decide 2", capacity=5, building_id=self.building, is_visiable=True)
+        self.day = (timezone.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.book(self.first, 10, 12, Booking.Status.CONFIRMATION)
+
+    def book(self, space: Space, hour_from: int, hour_to: int, status: str = Booking.Status.NEWBOOK) -> Booking:
+        return Booking.objects.create(user_id=self.admin, space_id=space, status=status,
+                                      date_from=self.day + timedelta(hours=hour_from), date_to=self.day + timedelta(hours=hour_to))
+
+    def decide(self, decisions: list[tuple[Booking, str]]):
+        return self.client.post('/api/newbookings/decide/', {'decisions': [{'id': book.id, 'action': action} for book, action in decisions]}, format='json')
+
+    def test_mixed_batch(self) -> None:
+        """
+        Тест подтверждения, отмены и конфликтов в одной пачке
+        """
+        overlaps_confirmed = self.book(self.first, 9, 11)
+        free = self.book(self.first, 12, 14)
+        overlaps_batch = self.book(self.first, 13, 15)
+        other_space = self.book(self.second, 10, 12)
+        cancelled = self.book(self.second, 14, 15)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.decide([
+                (overlaps_confirmed, 'confirm'), (free, 'confirm'), (overlaps_batch, 'confirm'),
+                (other_space, 'confirm'), (cancelled, 'cancel'),
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(book['id'] for book in response.data['changed']), sorted([free.id, other_space.id, cancelled.id]))
+        self.assertEqual({error['id']: error['error'] for error in response.data['errors']},
+                         {overlaps_confirmed.id: 'conflict'})
+        self.assertEqual(response.data['rejected'], [overlaps_batch.id])
+
+        statuses = dict(Booking.objects.filter(space_id__in=[self.first, self.second]).values_list('id', 'status'))
+        self.assertEqual((statuses[free.id], statuses[cancelled.id], statuses[overlaps_batch.id], statuses[overlaps_confirmed.id]),
+                         (Booking.Status.CONFIRMATION, Booking.Status.CANCELEDBEFORECONFIRMATION,
+                          Booking.Status.CANCELEDBEFORECONFIRMATION, Booking.Status.NEWBOOK))
+        self.assertFalse(availability_index.is_free(self.second.id, self.day + timedelta(hours=11), self.day + timedelta(hours=13)))
+
+    def test_already_processed_and_missing(self) -> None:
+        """
+        Тест ошибок для уже обработанной, повторённой и несуществующей брони
+        """
+        pending = self.book(self.second, 8, 9)
+        confirmed = Booking.objects.get(status=Booking.Status.CONFIRMATION)
+        response = self.client.post('/api/newbookings/decide/', {'decisions': [
+            {'id': confirmed.id, 'action': 'cancel'},
+            {'id': pending.id, 'action': 'cancel'},
+            {'id': pending.id, 'action': 'confirm'},
+            {'id': 999999, 'action': 'confirm'},
+        ]}, format='json')
+        self.assertEqual({error['id']: error['error'] for error in response.data['errors']},
+                         {confirmed.id: 'not_pending', pending.id: 'duplicate', 999999: 'not_found'})
+        self.assertEqual([book['status'] for book in response.data['changed']], [Booking.Status.CANCELEDBEFORECONFIRMATION])
+
+    def test_constant_queries(self) -> None:
+        """
+        Тест одинакового количества запросов для пачек из 2 и 40 броней
+        """
+        def count(books: list[Booking]) -> int:
+            user_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.decide([(book, 'confirm') for book in books])
+            self.assertEqual(len(response.data['changed']), len(books))
+            return len(app_queries(queries))
+
+        small = count([self.book(self.second, 0, 1), self.book(self.second, 1, 2)])
+        large = count([self.book(self.second, 2 * 24 + i, 2 * 24 + i + 1) for i in range(40)])
+        self.assertEqual(small, large)
+
+    def test_spaces_locked_before_bookings(self) -> None:
+        """
+        Тест порядка блокировок как в confirm_booking: сначала помещения, затем строки броней
+        """
+        books = [self.book(self.second, 8, 9), self.book(self.first, 14, 15)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.decide([(books[0], 'confirm'), (books[1], 'cancel')])
+        self.assertEqual(len(response.data['changed']), 2)
+        sql = app_queries(queries)
+        space_locks = [idx for idx, query in enumerate(sql) if query.startswith('UPDATE "bron_space"')]
+        booking_reads = [idx for idx, query in enumerate(sql) if query.startswith('SELECT') and '"bron_booking"."status"' in query]
+        self.assertEqual(len(space_locks), 2)
+        self.assertLess(space_locks[-1], booking_reads[0])
+
+
+class StatusTransitionTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для переходов статусов:
+        - создание администратора с JWT токеном, помещения, новой брони и регистрации
+        """
+        self.admin = User.objects.create_user(username='casadmin', password='pass123')
+        self.admin.user_profile.admin_status = True
+        self.admin.user_profile.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.admin).access_token}')
+        building = Building.objects.create(city="Test City 15", street="Test Street 15", house="15")
+        self.space = Space.objects.create(name="CAS Space", capacity=5, building_id=building, is_visiable=True)
+        self.booking = Booking.objects.create(user_id=self.admin, space_id=self.space,
+                                              date_from=timezone.now() + timedelta(days=1), date_to=timezone.now() + timedelta(days=1, hours=1))
+        organizer = Organizer.objects.create(name="CAS Org", org_id=self.admin)
+        event = Event.objects.create(name="CAS Event", date=timezone.now() + timedelta(days=1), space_id=self.space, org_id=organizer)
+        self.registration = Registration.objects.create(user_id=self.admin, event_id=event)
+
+    def test_lost_race_is_detected(self) -> None:
+        """
+        Тест того, что второй администратор с устаревшим статусом не перезаписывает решение первого
+        """
+        first, second = Booking.objects.get(pk=self.booking.pk), Booking.objects.get(pk=self.booking.pk)
+        transition(first, Booking.Status.CONFIRMATION)
+        with self.assertRaises(StaleStatus):
+            transition(second, Booking.Status.CANCELEDBEFORECONFIRMATION)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, Booking.Status.CONFIRMATION)
+
+    def test_only_status_is_written(self) -> None:
+        """
+        Тест условного UPDATE только столбца status
+        """
+        moved_to = self.booking.date_to + timedelta(hours=1)
+        Booking.objects.filter(pk=self.booking.pk).update(date_to=moved_to)
+        with CaptureQueriesContext(connection) as queries:
+            transition(self.booking, Booking.Status.CONFIRMATION)
+        [update] = [sql for sql in app_queries(queries) if sql.startswith('UPDATE')]
+        self.assertIn('"status" = ', update.split('WHERE')[1])
+        self.assertNotIn('date_to', update)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.date_to, moved_to)
+
+    def test_registration_transitions(self) -> None:
+        """
+        Тест переходов регистрации и запрета недопустимого перехода
+        """
+        transition(self.registration, Registration.Status.CONFIRMATION)
+        with self.assertRaises(InvalidTransition):
+            transition(self.registration, Registration.Status.CANCELEDBEFORECONFIRMATION)
+        transition(self.registration, Registration.Status.CANCELAFTERCONFIRMATION)
+        self.assertEqual(Registration.objects.get(pk=self.registration.pk).status, Registration.Status.CANCELAFTERCONFIRMATION)
+
+    def test_api_conflicts(self) -> None:
+        """
+        Тест ответа 409 при повторной обработке и отмены подтверждённой брони через API
+        """
+        self.assertEqual(self.client.patch(f'/api/newbookings/{self.booking.pk}/conf/').status_code, 200)
+        self.assertEqual(self.client.patch(f'/api/newbookings/{self.booking.pk}/conf/').status_code, 409)
+        self.assertEqual(self.client.patch(f'/api/newbookings/{self.booking.pk}/canc/').status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, Booking.Status.CANCELAFTERCONFIRMATION)
+
+
+class PendingRejectionTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для отклонения пересекающихся броней:
+        - создание администратора с JWT токеном, здания и двух помещений
+        - создание новой брони на завтра с 10 до 12
+        """
+        self.admin = User.objects.create_user(username='rejectadmin', password='pass123')
+        self.admin.user_profile.admin_status = True
+        self.admin.user_profile.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.admin).access_token}')
+        building = Building.objects.create(city="Test City 16", street="Test Street 16", house="16")
+        self.space = Space.objects.create(name="Reject 1", capacity=5, building_id=building, is_visiable=True)
+        self.other = Space.objects.create(name="Reject 2", capacity=5, building_id=building, is_visiable=True)
+        self.day = (timezone.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.booking = self.book(self.space, 10, 12)
+
+    def book(self, space: Space, hour_from: int, hour_to: int) -> Booking:
+        return Booking.objects.create(user_id=self.admin, space_id=space,
+                                      date_from=self.day + timedelta(hours=hour_from), date_to=self.day + timedelta(hours=hour_to))
+
+    def test_overlapping_pending_rejected(self) -> None:
+        """
+        Тест отклонения только пересекающихся новых броней того же помещения
+        """
+        inside = self.book(self.space, 10, 11)
+        around = self.book(self.space, 9, 13)
+        adjacent = self.book(self.space, 12, 13)
+        other_space = self.book(self.other, 10, 12)
+
+        response = self.client.patch(f'/api/newbookings/{self.booking.pk}/conf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Rejected-Bookings'], f'{inside.pk},{around.pk}')
+        self.assertEqual(sorted(book['id'] for book in response.data), sorted([adjacent.pk, other_space.pk]))
+
+        statuses = dict(Booking.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.booking.pk], Booking.Status.CONFIRMATION)
+        self.assertEqual((statuses[inside.pk], statuses[around.pk]),
+                         (Booking.Status.CANCELEDBEFORECONFIRMATION, Booking.Status.CANCELEDBEFORECONFIRMATION))
+        self.assertEqual((statuses[adjacent.pk], statuses[other_space.pk]), (Booking.Status.NEWBOOK, Booking.Status.NEWBOOK))
+
+    def test_constant_queries(self) -> None:
+        """
+        Тест одинакового количества запросов при 1 и 50 пересекающихся новых бронях
+        """
+        def count(booking: Booking, overlapping: int) -> int:
+            for _ in range(overlapping):
+                self.book(booking.space_id, booking.date_from.hour, booking.date_to.hour)
+            with CaptureQueriesContext(connection) as queries:
+                rejected = confirm_booking(booking)
+            self.assertEqual(len(rejected), overlapping)
+            return len(app_queries(queries))
+
+        self.assertEqual(count(self.booking, 1), count(self.book(self.space, 14, 15), 50))
+
+
+class SpaceAvailabilityTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для календаря занятости:
+        - создание пользователя, здания, помещения и организатора
+        - окно на завтра с 8 до 20
+        """
+        self.user = User.objects.create_user(username='slotsuser', password='pass123')
+        building = Building.objects.create(city="Test City 17", street="Test Street 17", house="17")
+        self.space = Space.objects.create(name="Slots Space", capacity=5, building_id=building, is_visiable=True)
+        self.organizer = Organizer.objects.create(name="Slots Org", org_id=self.user)
+        self.day = (timezone.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def at(self, hours: float):
+        return self.day + timedelta(hours=hours)
+
+    def book(self, hour_from: float, hour_to: float, status: str = Booking.Status.CONFIRMATION) -> Booking:
+        return Booking.objects.create(user_id=self.user, space_id=self.space, status=status,
+                                      date_from=self.at(hour_from), date_to=self.at(hour_to))
+
+    def availability(self, granularity: int = 0):
+        params = {'from': self.at(8).strftime('%Y-%m-%d %H:%M'), 'to': self.at(20).strftime('%Y-%m-%d %H:%M')}
+        if granularity:
+            params['granularity'] = granularity
+        return self.client.get(f'/api/spaces/{self.space.id}/availability/', params)
+
+    def intervals(self, items: list[dict]) -> list[tuple[float, float]]:
+        return [((item['from'] - self.day) / timedelta(hours=1), (item['to'] - self.day) / timedelta(hours=1)) for item in items]
+
+    @override_settings(EVENT_DURATION=2 * 60 * 60)
+    def test_busy_and_free(self) -> None:
+        """
+        Тест слияния пересекающихся броней и мероприятия и свободных промежутков между ними
+        """
+        self.book(7, 9)
+        self.book(10, 11)
+        self.book(10.5, 12)
+        self.book(13, 14, Booking.Status.NEWBOOK)
+        self.book(12, 12.25)
+        Event.objects.create(name="Slots Event", date=self.at(15), space_id=self.space, org_id=self.organizer)
+
+        response = self.availability()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.intervals(response.data['busy']), [(8, 9), (10, 12.5), (15, 17)])
+        self.assertEqual(self.intervals(response.data['free']), [(9, 10), (12.5, 15), (17, 20)])
+
+    def test_granularity(self) -> None:
+        """
+        Тест выравнивания занятых интервалов по сетке и ошибки при неверном шаге
+        """
+        self.book(10.25, 10.75)
+        self.book(11.1, 12)
+        response = self.availability(60)
+        self.assertEqual(self.intervals(response.data['busy']), [(10, 12)])
+        self.assertEqual(self.availability(24 * 60 + 1).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/spaces/{self.space.id}/availability/', {'granularity': 'час'}).status_code, 400)
+
+    def test_single_query(self) -> None:
+        """
+        Тест одного запроса к броням и мероприятиям независимо от их количества
+        """
+        for hour in range(8, 20):
+            self.book(hour, hour + 0.5)
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.availability()
+        self.assertEqual(len([sql for sql in app_queries(queries) if 'bron_booking' in sql]), 1)
+
+
+class OccupancyMatrixTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для матрицы занятости:
+        - создание пользователя, двух зданий в разных городах и трёх помещений
+        - окно на завтра с 10 до 12 с шагом 15 минут (8 интервалов)
+        """
+        self.user = User.objects.create_user(username='occupancyuser', password='pass123')
+        moscow = Building.objects.create(city="Москва", street="Test Street 18", house="18")
+        kazan = Building.objects.create(city="Казань", street="Test Street 18", house="18")
+        self.small = Space.objects.create(name="Occupancy 1", capacity=5, building_id=moscow, is_visiable=True)
+        self.large = Space.objects.create(name="Occupancy 2", capacity=50, building_id=moscow, is_visiable=True)
+        self.other_city = Space.objects.create(name="Occupancy 3", capacity=50, building_id=kazan, is_visiable=True)
+        self.day = (timezone.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def book(self, space: Space, hour_from: float, hour_to: float, status: str = Booking.Status.CONFIRMATION) -> Booking:
+        return Booking.objects.create(user_id=self.user, space_id=space, status=status,
+                                      date_from=self.day + timedelta(hours=hour_from), date_to=self.day + timedelta(hours=hour_to))
+
+    def occupancy(self, **params):
+        window = {'from': (self.day + timedelta(hours=10)).strftime('%Y-%m-%d %H:%M'),
+                  'to': (self.day + timedelta(hours=12)).strftime('%Y-%m-%d %H:%M')}
+        return self.client.get('/api/spaces/occupancy/', {**window, **params})
+
+    def bits(self, row: dict, buckets: int) -> str:
+        return ''.join(f'{byte:08b}' for byte in base64.b64decode(row['bitmap']))[:buckets]
+
+    def test_bitmap(self) -> None:
+        """
+        Тест битов занятости: частично занятый интервал считается занятым, новые брони не учитываются
+        """
+        self.book(self.small, 9, 10.25)
+        self.book(self.small, 11.1, 11.2)
+        self.book(self.large, 11.5, 13)
+        self.book(self.large, 10, 11, Booking.Status.NEWBOOK)
+
+        response = self.occupancy()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['buckets'], 8)
+        rows = {row['id']: self.bits(row, 8) for row in response.data['spaces']}
+        self.assertEqual(rows, {
+            self.small.id: '10001000',
+            self.large.id: '00000011',
+            self.other_city.id: '00000000',
+        })
+
+    def test_space_filter_params(self) -> None:
+        """
+        Тест отбора помещений параметрами SpaceFilter и ошибки при слишком большом окне
+        """
+        response = self.occupancy(city='Москва', min_capacity=10)
+        self.assertEqual([row['id'] for row in response.data['spaces']], [self.large.id])
+        self.assertEqual(self.occupancy(granularity=1, to=(self.day + timedelta(days=30)).strftime('%Y-%m-%d')).status_code, 400)
+
+
+class EarliestFitTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для поиска ближайших окон:
+        - создание пользователя, здания, предмета и трёх помещений
+        - поиск с завтрашней полуночи
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='earliestuser', password='pass123')
+        building = Building.objects.create(city="Test City 19", street="Test Street 19", house="19")
+        projector = ItemInSpaces.objects.create(name="Проектор")
+        self.busy = Space.objects.create(name="Earliest 1", capacity=20, building_id=building, is_visiable=True)
+        self.later = Space.objects.create(name="Earliest 2", capacity=20, building_id=building, is_visiable=True)
+        self.small = Space.objects.create(name="Earliest 3", capacity=5, building_id=building, is_visiable=True)
+        for space in (self.busy, self.later, self.small):
+            space.items_id.add(projector)
+        self.day = (timezone.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def at(self, hours: float):
+        return self.day + timedelta(hours=hours)
+
+    def book(self, space: Space, hour_from: float, hour_to: float) -> Booking:
+        return Booking.objects.create(user_id=self.user, space_id=space, status=Booking.Status.CONFIRMATION,
+                                      date_from=self.at(hour_from), date_to=self.at(hour_to))
+
+    def earliest(self, **params):
+        return self.client.get('/api/spaces/earliest/', {'after': self.day.strftime('%Y-%m-%d %H:%M'), **params})
+
+    def test_gap_search(self) -> None:
+        """
+        Тест поиска первого промежутка нужной длины: короткие промежутки пропускаются,
+        вложенная бронь не сбивает поиск
+        """
+        self.book(self.busy, 0, 3)
+        self.book(self.busy, 1, 2)
+        self.book(self.busy, 4, 6)
+        self.book(self.busy, 7.5, 9)
+        self.book(self.later, 0, 5)
+        self.book(self.later, 5, 9.5)
+
+        response = self.earliest(duration=120, min_capacity=12, item='Проектор')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(fit['space']['id'], fit['date_from'], fit['date_to']) for fit in response.data['results']],
+                         [(self.busy.id, self.at(9), self.at(11)), (self.later.id, self.at(9.5), self.at(11.5))])
+
+    def test_limit_and_validation(self) -> None:
+        """
+        Тест ограничения количества ответов и ошибок при неверных параметрах
+        """
+        self.book(self.busy, 0, 1)
+        response = self.earliest(duration=30, limit=2)
+        self.assertEqual([fit['space']['id'] for fit in response.data['results']], [self.later.id, self.small.id])
+        self.assertEqual(self.earliest(duration=0).status_code, 400)
+        self.assertEqual(self.earliest(limit=1000).status_code, 400)
+
+
+class SpaceSearchTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для полнотекстового поиска:
+        - создание двух зданий, особенности и трёх помещений с индексированием после коммита
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.building = Building.objects.create(city="Казань", street="Баумана", house="20")
+            other = Building.objects.create(city="Москва", street="Тверская", house="1")
+            self.projector = ItemInSpaces.objects.create(name="Проектор")
+            self.hall = Space.objects.create(name="Большой конференц-зал", description="Светлый зал для выступлений",
+                                             capacity=100, building_id=self.building, is_visiable=True)
+            self.meeting = Space.objects.create(name="Переговорная", description="Тихая комната с проекторами и залом ожидания",
+                                                capacity=10, building_id=other, is_visiable=True)
+            self.studio = Space.objects.create(name="Студия", description="Для записи подкастов",
+                                               capacity=5, building_id=other, is_visiable=True)
+            self.studio.items_id.add(self.projector)
+
+    def search(self, query: str) -> list[int]:
+        return [space['id'] for space in self.client.get('/api/spaces/search/', {'q': query}).data['results']]
+
+    def test_stemming_and_rank(self) -> None:
+        """
+        Тест поиска по словоформам: совпадение в названии выше совпадения в описании
+        """
+        self.assertEqual(self.search('залы'), [self.hall.id, self.meeting.id])
+        self.assertEqual(self.search('переговорной'), [self.meeting.id])
+        self.assertEqual(self.search('проектор'), [self.studio.id, self.meeting.id])
+        self.assertEqual(self.search('конф бол'), [self.hall.id])
+        self.assertEqual(self.search('бассейн'), [])
+
+    def test_index_follows_changes(self) -> None:
+        """
+        Тест обновления индекса при изменении помещения, здания и особенностей
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.building.city = "Самара"
+            self.building.save()
+        self.assertEqual(self.search('самаре'), [self.hall.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.projector.name = "Экран"
+            self.projector.save()
+        self.assertEqual(self.search('экраны'), [self.studio.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.studio.items_id.remove(self.projector)
+            self.hall.name = "Актовый зал"
+            self.hall.save()
+        self.assertEqual(self.search('экран'), [])
+        self.assertEqual(self.search('актовом'), [self.hall.id])
+
+    def test_hidden_matches_do_not_crowd_out_results(self) -> None:
+        """
+        Тест ранжирования только отфильтрованных помещений: скрытые совпадения не вытесняют видимые
+        """
+        hidden = Space.objects.bulk_create(
+            Space(name="Зал зал", description="Зал", capacity=5, building_id=self.building) for _ in range(250)
+        )
+        index_spaces([space.pk for space in hidden])
+        self.assertEqual(self.search('залы'), [self.hall.id, self.meeting.id])
+
+        response = self.client.get('/api/spaces/search/', {'q': 'залы', 'page_size': 1})
+        self.assertEqual([space['id'] for space in response.data['results']], [self.hall.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([space['id'] for space in response.data['results']], [self.meeting.id])
+
+    def test_equal_ranks_paginate_without_offset(self) -> None:
+        """
+        Тест обхода результатов с одинаковой релевантностью: позиция курсора — (search_rank, id), без OFFSET
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            twins = [Space.objects.create(name="Бассейн", capacity=5, building_id=self.building, is_visiable=True) for _ in range(5)]
+
+        found, url = [], '/api/spaces/search/?' + urlencode({'q': 'бассейн', 'page_size': 2})
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse([sql for sql in app_queries(queries) if 'OFFSET' in sql.upper()])
+            found += [space['id'] for space in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(found, [space.id for space in twins])
+
+    def test_migration_fills_index(self) -> None:
+        """
+        Тест заполнения индекса миграцией: документы без основ находятся теми же запросами
+        """
+        migration = importlib.import_module('bron.migrations.0031_space_search')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {migration.SEARCH_TABLE}')
+            migration.create_search_index(None, mock.Mock(connection=connection, execute=cursor.execute))
+        self.assertEqual(self.search('залы'), [self.hall.id, self.meeting.id])
+        self.assertEqual(self.search('переговорной'), [self.meeting.id])
+        self.assertEqual(self.search('проектор'), [self.studio.id, self.meeting.id])
+        self.assertEqual(self.search('казани'), [self.hall.id])
+
+
+class AutocompleteTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для подсказок:
+        - очистка кэша, создание пользователя, организатора, здания, помещений и мероприятия
+        """
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(username='autocompleteuser', password='pass123')
+            self.organizer = Organizer.objects.create(name="Клуб конференций", org_id=user)
+            building = Building.objects.create(city="Test City 20", street="Test Street 20", house="20")
+            self.hall = Space.objects.create(name="Большой конференц-зал", capacity=100, building_id=building, is_visiable=True)
+            self.room = Space.objects.create(name="Конференц-комната", capacity=10, building_id=building, is_visiable=True)
+            self.hidden = Space.objects.create(name="Конференц-склад", capacity=1, building_id=building, is_visiable=False)
+            self.event = Event.objects.create(name="Ёлка", date=timezone.now() + timedelta(days=1), space_id=self.hall, org_id=self.organizer)
+
+    def suggest(self, query: str, **params):
+        return self.client.get('/api/autocomplete/', {'q': query, **params}).data
+
+    def test_prefix_order(self) -> None:
+        """
+        Тест порядка подсказок: сначала совпадения с начала названия, затем с начала слова; скрытые не попадают
+        """
+        data = self.suggest('КОНФ')
+        self.assertEqual([space['id'] for space in data['spaces']], [self.room.id, self.hall.id])
+        self.assertEqual([org['id'] for org in data['orgs']], [self.organizer.id])
+        self.assertEqual(self.suggest('елк')['events'], [{'id': self.event.id, 'name': "Ёлка"}])
+        self.assertEqual(len(self.suggest('конф', limit=1)['spaces']), 1)
+
+    def test_incremental_updates(self) -> None:
+        """
+        Тест обновления индекса при переименовании, скрытии и удалении без запросов при поиске
+        """
+        self.suggest('конф')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.name = "Переговорная"
+            self.room.save()
+            self.hidden.is_visiable = True
+            self.hidden.save()
+            self.event.delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.suggest('конф')
+        # Только проверка журнала изменений в общем кэше
+        self.assertEqual(len(cache_queries(queries)), 1)
+        self.assertEqual(app_queries(queries), cache_queries(queries))
+        self.assertEqual([space['id'] for space in data['spaces']], [self.hidden.id, self.hall.id])
+        self.assertEqual([space['id'] for space in self.suggest('перег')['spaces']], [self.room.id])
+        self.assertEqual(self.suggest('елк')['events'], [])
+
+    def test_organizer_search(self) -> None:
+        """
+        Тест поиска организаторов с сериализацией через OrganizerSerializer
+        """
+        response = self.client.get('/api/orgs/search/', {'q': 'конфер'})
+        self.assertEqual([(org['id'], org['name']) for org in response.data], [(self.organizer.id, "Клуб конференций")])
+
+    def test_other_process_applies_changed_record(self) -> None:
+        """
+        Тест синхронизации через журнал в общем кэше: второй индекс перечитывает
+        только изменившуюся запись, без полной перестройки
+        """
+        other = Autocomplete()
+        other.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.name = "Переговорная"
+            self.room.save()
+        with mock.patch.object(other, 'build', wraps=other.build) as build:
+            self.assertEqual([space['id'] for space in other.suggest('конф', 10)['spaces']], [self.hall.id])
+            self.assertEqual([space['id'] for space in other.suggest('перег', 10)['spaces']], [self.room.id])
+        build.assert_not_called()
+
+    def test_admin_bulk_actions(self) -> None:
+        """
+        Тест админ-действий через QuerySet.update(): скрытое и перенесённое событие
+        обновляется в индексе, кэш главной страницы сбрасывается
+        """
+        self.suggest('елк')
+        events = Event.objects.filter(id=self.event.id)
+        cache.set(HOMEPAGE_CACHE_KEY, {'events': []})
+        with self.captureOnCommitCallbacks(execute=True):
+            plus_day(None, None, events)
+        self.assertIsNone(cache.get(HOMEPAGE_CACHE_KEY))
+        self.assertEqual(Event.objects.get(id=self.event.id).date, self.event.date + timedelta(days=1))
+
+        cache.set(HOMEPAGE_CACHE_KEY, {'events': []})
+        with self.captureOnCommitCallbacks(execute=True):
+            deactivate_events(None, None, events)
+        self.assertIsNone(cache.get(HOMEPAGE_CACHE_KEY))
+        self.assertEqual(self.suggest('елк')['events'], [])
+
+
+
+class ItemBitsetFilterTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для фильтра по особенностям:
+        - очистка кэша, создание здания, трёх особенностей и трёх помещений с разными наборами
+        """
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            building = Building.objects.create(city="Test City 21", street="Test Street 21", house="21")
+            self.projector = ItemInSpaces.objects.create(name="Проектор")
+            self.board = ItemInSpaces.objects.create(name="Доска")
+            self.video = ItemInSpaces.objects.create(name="Видеосвязь")
+            self.full = Space.objects.create(name="Items 1", capacity=10, building_id=building, is_visiable=True)
+            self.partial = Space.objects.create(name="Items 2", capacity=10, building_id=building, is_visiable=True)
+            self.bare = Space.objects.create(name="Items 3", capacity=10, building_id=building, is_visiable=True)
+            self.full.items_id.add(self.projector, self.board, self.video)
+            self.partial.items_id.add(self.projector)
+
+    def search(self, query: str) -> set[int]:
+        return {space['id'] for space in self.client.get(f'/api/spaces/search/?{query}').data['results']}
+
+    def test_all_items_required(self) -> None:
+        """
+        Тест отбора помещений, в которых есть все перечисленные особенности, в любом регистре
+        """
+        self.assertEqual(self.search('item=проектор'), {self.full.id, self.partial.id})
+        self.assertEqual(self.search('item=Проектор&item=ДОСКА'), {self.full.id})
+        self.assertEqual(self.search('item=Проектор,Доска,Видеосвязь'), {self.full.id})
+        self.assertEqual(self.search('item=Проектор&item=Бассейн'), set())
+
+    def test_masks_follow_m2m_changes(self) -> None:
+        """
+        Тест обновления масок при изменении связей с обеих сторон и переименовании особенности
+        """
+        self.search('item=Доска')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.partial.items_id.add(self.board)
+            self.video.space_set.add(self.bare)
+        self.assertEqual(self.search('item=Проектор&item=Доска'), {self.full.id, self.partial.id})
+        self.assertEqual(self.search('item=Видеосвязь'), {self.full.id, self.bare.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.space_set.clear()
+            self.board.name = "Флипчарт"
+            self.board.save()
+        self.assertEqual(self.search('item=Видеосвязь'), set())
+        self.assertEqual(self.search('item=флипчарт'), {self.full.id, self.partial.id})
+
+    def test_dense_bits_and_other_process(self) -> None:
+        """
+        Тест номеров битов подряд с нуля независимо от ID особенностей
+        и применения изменённого помещения вторым индексом без перестройки
+        """
+        far = ItemInSpaces.objects.create(id=100000, name="Кулер")
+        other = ItemBitsets()
+        other.rebuild()
+        self.assertEqual(sorted(other._bits.values()), list(range(4)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bare.items_id.add(far)
+        with mock.patch.object(other, 'build', wraps=other.build) as build:
+            self.assertEqual(other.space_ids_with(['кулер']), {self.bare.id})
+            self.assertEqual(other.count_items([self.bare.id]), {far.id: ('Кулер', 1)})
+        build.assert_not_called()
+
+
+class SpaceFacetsTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для счётчиков каталога:
+        - два города, две особенности и четыре видимых помещения разной вместимости, одно скрытое
+        """
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            north = Building.objects.create(city="Facet North", street="Test Street 24", house="1")
+            south = Building.objects.create(city="Facet South", street="Test Street 24", house="2")
+            self.projector = ItemInSpaces.objects.create(name="Проектор")
+            self.board = ItemInSpaces.objects.create(name="Доска")
+            small = Space.objects.create(name="Facet 1", capacity=8, building_id=north, is_visiable=True)
+            medium = Space.objects.create(name="Facet 2", capacity=25, building_id=north, is_visiable=True)
+            large = Space.objects.create(name="Facet 3", capacity=150, building_id=south, is_visiable=True)
+            Space.objects.create(name="Facet 4", capacity=40, building_id=south, is_visiable=True)
+            hidden = Space.objects.create(name="Facet 5", capacity=40, building_id=south, is_visiable=False)
+            small.items_id.add(self.projector, self.board)
+            medium.items_id.add(self.projector)
+            large.items_id.add(self.board)
+            hidden.items_id.add(self.projector)
+
+    def facets(self, query: str = '') -> dict:
+        response = self.client.get(f'/api/spaces/facets/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_counts_without_filters(self) -> None:
+        """
+        Тест счётчиков по всем видимым помещениям
+        """
+        data = self.facets()
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['cities'], [{'city': 'Facet North', 'count': 2}, {'city': 'Facet South', 'count': 2}])
+        self.assertEqual(data['items'], [
+            {'id': self.board.id, 'name': 'Доска', 'count': 2},
+            {'id': self.projector.id, 'name': 'Проектор', 'count': 2},
+        ])
+        self.assertEqual([bucket['count'] for bucket in data['capacity']], [1, 1, 1, 1])
+
+    def test_facet_ignores_own_filter(self) -> None:
+        """
+        Тест счётчиков при выбранных фильтрах: город и вместимость не сужают собственную группу
+        """
+        data = self.facets('city=facet north&min_capacity=20')
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['cities'], [{'city': 'Facet South', 'count': 2}, {'city': 'Facet North', 'count': 1}])
+        self.assertEqual(data['items'], [{'id': self.projector.id, 'name': 'Проектор', 'count': 1}])
+        self.assertEqual([bucket['count'] for bucket in data['capacity']], [1, 1, 0, 0])
+
+        data = self.facets('item=Доска')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['cities'], [{'city': 'Facet North', 'count': 1}, {'city': 'Facet South', 'count': 1}])
+
+    def test_city_matches_filter(self) -> None:
+        """
+        Тест совпадения города по тем же правилам, что и в фильтре city списка помещений
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            kazan = Building.objects.create(city="Казань", street="Test Street 24", house="3")
+            Space.objects.create(name="Facet 6", capacity=8, building_id=kazan, is_visiable=True)
+        for city in ('Казань', 'казань', 'КАЗАНЬ'):
+            listed = self.client.get('/api/spaces/search/', {'city': city}).data['results']
+            self.assertEqual(self.facets(urlencode({'city': city}))['total'], len(listed))
+
+    def test_invalid_filter(self) -> None:
+        """
+        Тест ошибки при неверном значении фильтра
+        """
+        response = self.client.get('/api/spaces/facets/?min_capacity=много')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('min_capacity', response.data['error'])
+
+
+class EventFilterTest(APITestCase):
+    def setUp(self) -> None:
+        """
+        Инициализация данных для фильтра мероприятий:
+        - два организатора, два помещения, две особенности и мероприятия на ближайшие два месяца
+        """
+        cache.clear()
+        user = User.objects.create_user(username='eventfilteruser', password='pass123')
+        self.org = Organizer.objects.create(name="Filter Org 1", org_id=user)
+        self.other_org = Organizer.objects.create(name="Filter Org 2", org_id=user)
+        building = Building.objects.create(city="Test City 25", street="Test Street 25", house="25")
+        self.space = Space.objects.create(name="Filter Space 1", capacity=10, building_id=building, is_visiable=True)
+        self.other_space = Space.objects.create(name="Filter Space 2", capacity=10, building_id=building, is_visiable=True)
+        self.coffee = ItemInEvents.objects.create(name="Кофе")
+        self.food = ItemInEvents.objects.create(name="Еда")
+        self.start = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.events = [
+            Event.objects.create(
+                name=f"Лекция {i}" if i % 2 else f"Концерт {i}", date=self.start + timedelta(days=i),
+                space_id=self.space if i % 3 else self.other_space, org_id=self.org if i < 30 else self.other_org,
+            )
+            for i in range(60)
+        ]
+        for event in self.events[::2]:
+            event.items_id.add(self.coffee)
+        for event in self.events[::4]:
+            event.items_id.add(self.food)
+
+    def ids(self, query: str) -> list[int]:
+        """
+        ID мероприятий со всех страниц выдачи
+        """
+        ids, url = [], f'/api/events/?{query}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [event['id'] for event in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_filters(self) -> None:
+        """
+        Тест отбора по организатору, помещению, особенностям и тексту; выдача упорядочена по дате
+        """
+        self.assertEqual(self.ids(f'org_id={self.other_org.id}'), [event.id for event in self.events[30:]])
+        self.assertEqual(self.ids(f'space_id={self.other_space.id}'), [event.id for event in self.events[::3]])
+        self.assertEqual(self.ids(urlencode([('item', 'кофе'), ('item', 'ЕДА')])), [event.id for event in self.events[::4]])
+        self.assertEqual(self.ids(urlencode({'item': 'Кофе,Бассейн'})), [])
+        self.assertEqual(self.ids(urlencode({'q': 'концерт', 'page_size': 7})), [event.id for event in self.events[::2]])
+
+    def test_text_matched_in_database(self) -> None:
+        """
+        Тест поиска текста в базе внутри периода: без списка ID всех мероприятий, без учёта регистра кириллицы и «ё»
+        """
+        date_from = (self.start + timedelta(days=10)).strftime('%Y-%m-%d %H:%M')
+        with CaptureQueriesContext(connection) as queries:
+            found = self.ids(urlencode({'q': 'КОНЦЕРТ', 'date_from': date_from}))
+        self.assertEqual(found, [event.id for event in self.events[10::2]])
+        self.assertFalse(any('"bron_event"."id" IN' in sql for sql in app_queries(queries)))
+
+        Event.objects.filter(pk=self.events[0].pk).update(name="Ёлочный концерт-вечер")
+        self.assertEqual(self.ids(urlencode({'q': 'елочный концерт вечер'})), [self.events[0].id])
+
+    def test_date_range_pages(self) -> None:
+        """
+        Тест курсорных страниц по дате внутри периода: каждая страница продолжает предыдущую
+        """
+        date_from = (self.start + timedelta(days=10)).strftime('%Y-%m-%d %H:%M')
+        date_to = (self.start + timedelta(days=40)).strftime('%Y-%m-%d %H:%M')
+        response = self.client.get(f'/api/events/?date_from={date_from}&date_to={date_to}&page_size=4')
+        self.assertEqual([event['reg_count'] for event in response.data['results']], [0] * 4)
+        self.assertEqual(self.ids(f'date_from={date_from}&date_to={date_to}&page_size=4'), [event.id for event in self.events[10:40]])
+
+    def test_without_params_returns_full_list(self) -> None:
+        """
+        Тест прежнего ответа без параметров: весь список без пагинации
+        """
+        response = self.client.get('/api/events/')
+        self.assertEqual(len(response.data), 60)
+        self.assertEqual(self.client.get('/api/events/?date_from=завтра').status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,280 @@
+import copy
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import LazyObject, empty
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import Profile
+
+ROLE_CLAIMS = ('admin_status', 'org_status')
+
+
+def roles_key(user_id: int) -> str:
+    return f'bron:tokens:roles:{user_id}'
+
+
+def user_roles(user_id: int) -> Optional[dict[str, bool]]:
+    """
+    Текущие роли активного пользователя из базы данных
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Словарь с admin_status и org_status или None, если пользователь не найден или отключён
+    """
+    return Profile.objects.filter(user_id=user_id, user__is_active=True).values(*ROLE_CLAIMS).first()
+
+
+def revoke_roles(user_id: int, roles: Optional[dict[str, bool]]) -> None:
+    """
+    Отозвать токены пользователя с устаревшими ролями
+
+    Актуальные роли запоминаются в кэше на время жизни access-токена: токен,
+    роли в котором с ними не совпадают, отклоняется, и клиент получает новый
+    через refresh. Кэш общий для всех процессов (CACHES в settings), поэтому
+    отзыв действует сразу во всех воркерах
+
+    Args:
+        user_id: ID пользователя
+        roles: Новые роли; None — пользователь отключён, отклонять все токены
+    """
+    cache.set(roles_key(user_id), roles or {}, roles_ttl())
+
+
+def roles_ttl() -> int:
+    """
+    Время хранения ролей в кэше: время жизни access-токена
+    """
+    return int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def current_roles(user_id: int) -> dict[str, bool]:
+    """
+    Актуальные роли пользователя из кэша, а при промахе — из базы данных
+
+    Запись могла быть вытеснена из кэша (MAX_ENTRIES, очистка), поэтому
+    промах не означает, что роли не менялись: они читаются из bron_profile
+    и снова кладутся в кэш. cache.add не перезапишет запись, которую
+    одновременно записал revoke_roles
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Словарь с admin_status и org_status; пустой, если пользователь не найден или отключён
+    """
+    roles = cache.get(roles_key(user_id))
+    if roles is None:
+        roles = user_roles(user_id) or {}
+        cache.add(roles_key(user_id), roles, roles_ttl())
+    return roles
+
+
+class UserCache:
+    """
+    Ограниченный LRU-кэш пользователей с профилем в памяти процесса
+
+    Записи живут не дольше ttl секунд и сбрасываются сигналами post_save
+    User и Profile. Другие процессы узнают об изменении не позже чем через ttl,
+    поэтому ttl должен быть коротким. Каждый запрос получает свою копию
+    пользователя, чтобы изменения в одном запросе не попадали в другие
+    """
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = Lock()
+        self._users: OrderedDict[Any, tuple[float, User]] = OrderedDict()
+
+    def get(self, user_id: Any) -> Optional[User]:
+        """
+        Пользователь с загруженным user_profile
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Копия пользователя или None, если пользователь не найден
+        """
+        now = monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached and cached[0] > now:
+                self._users.move_to_end(user_id)
+                return copy.deepcopy(cached[1])
+
+        user = User.objects.select_related('user_profile').filter(pk=user_id).first()
+        if user is None or self.maxsize <= 0:
+            return user
+        with self._lock:
+            self._users[user_id] = (now + self.ttl, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+        return copy.deepcopy(user)
+
+    def invalidate(self, user_id: Any) -> None:
+        """
+        Удалить пользователя из кэша
+        """
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache(
+    maxsize=getattr(settings, 'USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'USER_CACHE_TTL', 30),
+)
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh-токен с ролями пользователя; роли копируются и в access-токен
+    """
+    @classmethod
+    def for_user(cls, user: User) -> 'RoleRefreshToken':
+        token = super().for_user(user)
+        for claim, value in (user_roles(user.pk) or {}).items():
+            token[claim] = value
+        return token
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление access-токена с ролями, заново прочитанными из базы данных
+    """
+    token_class = RoleRefreshToken
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, str]:
+        refresh = self.token_class(attrs['refresh'])
+        roles = user_roles(refresh.payload.get(api_settings.USER_ID_CLAIM))
+        if roles is None:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        for claim, value in roles.items():
+            refresh[claim] = value
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+
+class TokenProfile:
+    """
+    Роли пользователя из токена вместо строки bron_profile
+    """
+    __slots__ = ROLE_CLAIMS
+
+    def __init__(self, admin_status: bool, org_status: bool) -> None:
+        self.admin_status = admin_status
+        self.org_status = org_status
+
+
+class TokenUser(LazyObject):
+    """
+    Пользователь из токена: id и роли берутся из claims без запросов к базе
+
+    Любой другой атрибут (имя, email, сохранение, присваивание во внешний ключ)
+    загружает настоящего User один раз за запрос
+    """
+    def __init__(self, token: Token) -> None:
+        self.__dict__['_token'] = token
+        super().__init__()
+
+    def _setup(self) -> None:
+        user = user_cache.get(self.id)
+        if user is None:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+        self._wrapped = user
+
+    @property
+    def id(self) -> int:
+        return self._token[api_settings.USER_ID_CLAIM]
+
+    pk = id
+
+    @property
+    def is_authenticated(self) -> bool:
+        return True
+
+    @property
+    def is_anonymous(self) -> bool:
+        return False
+
+    @property
+    def user_profile(self) -> Any:
+        if self._wrapped is not empty:
+            return self._wrapped.user_profile
+        return TokenProfile(self._token['admin_status'], self._token['org_status'])
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без загрузки пользователя и профиля для токенов с ролями
+
+    Роли токена сверяются с current_roles, поэтому каждый запрос с таким токеном
+    делает одно чтение из общего кэша (запрос к таблице bron_cache), а после
+    вытеснения записи — ещё один запрос к bron_profile.
+
+    Для токенов без ролей (выданных до включения режима) пользователь с профилем
+    берётся из user_cache, а не загружается на каждый запрос
+    """
+    def get_user(self, validated_token: Token) -> Any:
+        if not all(claim in validated_token for claim in ROLE_CLAIMS):
+            return self.get_cached_user(validated_token)
+
+        roles = current_roles(validated_token[api_settings.USER_ID_CLAIM])
+        if any(validated_token[claim] != roles.get(claim) for claim in ROLE_CLAIMS):
+            raise InvalidToken('Роли пользователя изменились, обновите токен')
+        return TokenUser(validated_token)
+
+    def get_cached_user(self, validated_token: Token) -> User:
+        """
+        Проверки JWTAuthentication.get_user поверх пользователя из user_cache
+
+        Args:
+            validated_token: Проверенный токен
+
+        Returns:
+            Пользователь с загруженным профилем
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('В токене нет идентификатора пользователя')
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('Пользователь отключён', code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed('Пароль пользователя изменён', code='password_changed')
+
+        return user
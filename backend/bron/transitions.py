@@ -0,0 +1,89 @@
+from typing import Union
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import Booking, Registration
+
+# Отправляется после UPDATE статусов броней, которые не вызывают post_save;
+# аргумент space_ids — помещения, брони которых изменились, confirmed_space_ids —
+# помещения, у которых брони подтвердились или перестали быть подтверждёнными
+bookings_changed = Signal()
+
+BOOKING_TRANSITIONS = {
+    Booking.Status.NEWBOOK: {Booking.Status.CONFIRMATION, Booking.Status.CANCELEDBEFORECONFIRMATION},
+    Booking.Status.CONFIRMATION: {Booking.Status.CANCELAFTERCONFIRMATION},
+}
+
+REGISTRATION_TRANSITIONS = {
+    Registration.Status.NEWREG: {Registration.Status.CONFIRMATION, Registration.Status.CANCELEDBEFORECONFIRMATION},
+    Registration.Status.CONFIRMATION: {Registration.Status.CANCELAFTERCONFIRMATION},
+}
+
+TRANSITIONS = {
+    Booking: BOOKING_TRANSITIONS,
+    Registration: REGISTRATION_TRANSITIONS,
+}
+
+
+class InvalidTransition(Exception):
+    """
+    Переход из текущего статуса в запрошенный не предусмотрен
+    """
+
+
+class StaleStatus(Exception):
+    """
+    Статус записи изменился с момента чтения: переход выполнил кто-то другой
+    """
+
+
+def transition(instance: Union[Booking, Registration], target: str) -> Union[Booking, Registration]:
+    """
+    Перевести бронь или регистрацию в новый статус
+
+    Выполняется один UPDATE ... SET status = target WHERE id = pk AND status = текущий;
+    другие столбцы не перезаписываются. Если ни одна строка не изменилась,
+    значит, параллельный запрос успел сменить статус раньше
+
+    Args:
+        instance: Бронь или регистрация со статусом, прочитанным из базы
+        target: Новый статус
+
+    Returns:
+        Запись с обновлённым статусом
+
+    Raises:
+        InvalidTransition: Переход не предусмотрен
+        StaleStatus: Статус в базе уже не совпадает с прочитанным
+    """
+    model = type(instance)
+    expected = instance.status
+    if target not in TRANSITIONS[model].get(expected, set()):
+        raise InvalidTransition(f'Нельзя перевести из статуса {expected} в {target}')
+
+    if not model.objects.filter(pk=instance.pk, status=expected).update(status=target):
+        raise StaleStatus
+    instance.status = target
+
+    if model is Booking:
+        space_ids = [instance.space_id_id]
+        confirmed_space_ids = space_ids if Booking.Status.CONFIRMATION in (expected, target) else []
+        transaction.on_commit(lambda: bookings_changed.send(sender=Booking, space_ids=space_ids, confirmed_space_ids=confirmed_space_ids))
+    return instance
+
+
+def cancel_target(instance: Union[Booking, Registration]) -> str:
+    """
+    Статус отмены для записи: до подтверждения или после него
+
+    Args:
+        instance: Бронь или регистрация
+
+    Returns:
+        Целевой статус отмены
+    """
+    model = type(instance)
+    if instance.status == model.Status.CONFIRMATION:
+        return model.Status.CANCELAFTERCONFIRMATION
+    return model.Status.CANCELEDBEFORECONFIRMATION
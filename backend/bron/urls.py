@@ -16,10 +16,14 @@ router.register('orgs', OrganizerViewSet)
 router.register('widgets', WidgetViewSet, basename='widgets')
 router.register('buildings', BuildingViewSet)
 router.register('itemsinspace', ItemsInSpacesViewSet)
+router.register('exports', ExportJobViewSet, basename='exports')
 
 urlpatterns = router.urls + [
     path('me/', UserCurrentViewSet.as_view(), name='user-profile'),
+    path('me/bookings/', UserBookingsViewSet.as_view(), name='user-bookings'),
+    path('me/registrations/', UserRegistrationsViewSet.as_view(), name='user-registrations'),
     path('users/', UserAdminViewSet.as_view(), name='users'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
     path('auth/jwt/create/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -0,0 +1,133 @@
+from django.db import connection
+from django.db.models import CharField, Count, Func, IntegerField, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+from .models import Booking, Profile, Registration, User
+
+SQLITE_LOWER = 'bron_lower'
+
+
+def count_by_user(model: type) -> Coalesce:
+    """
+    Коррелированный подзапрос с количеством записей модели у пользователя
+
+    В отличие от двух Count(..., distinct=True) в одном запросе подзапросы
+    не строят декартово произведение регистраций и бронирований
+
+    Args:
+        model: Модель с внешним ключом user_id
+
+    Returns:
+        Выражение для annotate
+    """
+    counts = model.objects.filter(
+        user_id=OuterRef('pk')
+    ).order_by().values('user_id').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def with_counts(users: QuerySet) -> QuerySet:
+    """
+    Добавить пользователям total_events и total_bookings
+
+    Args:
+        users: QuerySet пользователей
+
+    Returns:
+        QuerySet с аннотациями счётчиков
+    """
+    return users.annotate(
+        total_events=count_by_user(Registration),
+        total_bookings=count_by_user(Booking)
+    )
+
+
+class UnicodeLower(Func):
+    """
+    Строка в нижнем регистре с учётом Юникода
+
+    LOWER в SQLite переводит в нижний регистр только ASCII, поэтому на SQLite
+    вызывается bron_lower, которую регистрирует register_sqlite_functions
+    """
+    function = 'LOWER'
+    output_field = CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function=SQLITE_LOWER, **extra_context)
+
+
+def register_sqlite_functions(sqlite_connection) -> None:
+    """
+    Зарегистрировать bron_lower в соединении SQLite
+
+    Функция детерминированная, поэтому по ней строятся индексы из миграции 0034;
+    писать в таблицы с такими индексами можно только из соединений, где она зарегистрирована
+
+    Args:
+        sqlite_connection: Соединение sqlite3
+    """
+    sqlite_connection.create_function(SQLITE_LOWER, 1, lambda value: None if value is None else value.lower(), deterministic=True)
+
+
+def prefix_condition(field: str, term: str) -> Q:
+    """
+    Условие «поле начинается с term» без учёта регистра
+
+    На PostgreSQL — istartswith по индексу UPPER(поле) из миграции 0030. На SQLite —
+    диапазон bron_lower(поле) от term до term с последней буквой, увеличенной на единицу:
+    такое сравнение идёт по индексу bron_lower(поле) из миграции 0034
+
+    Args:
+        field: Имя поля
+        term: Слово запроса
+
+    Returns:
+        Q для filter
+    """
+    if connection.vendor != 'sqlite':
+        return Q(**{f'{field}__istartswith': term})
+    term = term.lower()
+    folded = UnicodeLower(field)
+    return Q(GreaterThanOrEqual(folded, term), LessThan(folded, term[:-1] + chr(ord(term[-1]) + 1)))
+
+
+def search_users(users: QuerySet, query: str) -> QuerySet:
+    """
+    Поиск по началу логина, имени, фамилии или отчества
+
+    Каждое слово запроса должно совпасть с началом хотя бы одного из полей,
+    поэтому «Иван Пет» найдёт Ивана Петрова. Поиск по префиксу использует
+    индексы из миграций 0030 и 0034
+
+    Args:
+        users: QuerySet пользователей
+        query: Строка поиска
+
+    Returns:
+        Отфильтрованный QuerySet
+    """
+    for term in query.split():
+        users = users.filter(
+            prefix_condition('username', term) |
+            prefix_condition('first_name', term) |
+            prefix_condition('last_name', term) |
+            Q(id__in=Profile.objects.filter(prefix_condition('patronymic', term)).values('user_id'))
+        )
+    return users
+
+
+def user_directory(query: str = '') -> QuerySet:
+    """
+    Пользователи для справочника администратора: профиль, счётчики и поиск
+
+    Args:
+        query: Строка поиска
+
+    Returns:
+        QuerySet пользователей
+    """
+    users = with_counts(User.objects.select_related('user_profile'))
+    if query.strip():
+        users = search_users(users, query)
+    return users
@@ -1,6 +1,7 @@
 from typing import Any, Optional
 from urllib import request
 from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from requests import Request
 from rest_framework.views import APIView
 from rest_framework import status, permissions
@@ -8,35 +9,106 @@ from rest_framework.viewsets import ModelViewSet, ViewSet
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import SpacesReview, User, Event, Space, Booking, Organizer, Favourite, Building, ImageForSpaces, ItemInSpaces
-from .serializers import SpacesReviewSerializer, UserSerializer, EventSerializer, SpaceSerializer, BookingSerializer, OrganizerSerializer, UserShortSerializer, SpaceShortSerializer, SpaceWidgetSerializer, EventWidgetSerializer, OrganizeWidgetSerializer, SpaceEditSerializer, BuildingSerializer, ImageForSpacesSerializer, ItemInSpacesSerializer
+from rest_framework.authentication import SessionAuthentication
+from .models import SpacesReview, User, Event, Space, Booking, Organizer, Favourite, Building, ImageForSpaces, ItemInSpaces, Registration
+from .serializers import SpacesReviewSerializer, UserSerializer, EventSerializer, SpaceSerializer, BookingSerializer, OrganizerSerializer, UserShortSerializer, SpaceShortSerializer, SpaceWidgetSerializer, EventWidgetSerializer, OrganizeWidgetSerializer, SpaceEditSerializer, BuildingSerializer, ImageForSpacesSerializer, ItemInSpacesSerializer, SpaceListSerializer, SpaceBookingSerializer, UserCurrentSerializer, RegSerializer, UserDirectorySerializer, BookingDecisionsSerializer
 from django.utils import timezone
-from django.db.models import Count, Q, ExpressionWrapper, IntegerField, F
-from django.http import HttpResponse, Http404
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
+from django.db.models import Count, Q, ExpressionWrapper, IntegerField, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, Http404
 import os
-import qrcode
-import io
+from django.utils.http import parse_etags, quote_etag
 from django.conf import settings
 from django.utils.timezone import localtime
 from django.utils.dateparse import parse_date
 from datetime import datetime, timedelta
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import SpaceFilter
+from .filters import EventFilter, SpaceFilter
+from .pagination import EventPagination, SpacePagination, SpaceBookingPagination, SpaceReviewPagination, UserBookingPagination, UserRegistrationPagination, UserDirectoryPagination
+from .booking import BookingConflict, create_booking, confirm_booking, decide_bookings
+from .transitions import InvalidTransition, StaleStatus, cancel_target, transition
+from .jobs import JobStatus, archive_path, export_events, get_job, upcoming_events
+from .pdf import event_pdf, event_snapshot, snapshot_etag
+from .popularity import count_by_space, homepage
+from .tokens import RoleJWTAuthentication
+from .users import user_directory, with_counts
+from .autocomplete import MAX_SUGGESTIONS, autocomplete
+from .availability import availability_index
+from .facets import space_facets
+from .occupancy import MAX_BUCKETS, bucket_count, occupancy_matrix, pack_rows
+from .slots import MAX_GRANULARITY, space_calendar
+from .stats import DEFAULT_WINDOW, WINDOWS, booking_count, most_booked_space, registration_count
+
+DECISION_ERRORS = {
+    'not_found': 'Бронирование не найдено',
+    'not_pending': 'Бронирование уже обработано',
+    'duplicate': 'Бронирование указано несколько раз',
+    'conflict': 'Помещение уже занято подтверждённой бронью в этот период',
+}
+
+BOOKINGS_WINDOW = timedelta(days=31)
+AVAILABILITY_WINDOW = timedelta(days=7)
+DEFAULT_GRANULARITY = 30
+OCCUPANCY_WINDOW = timedelta(days=7)
+OCCUPANCY_GRANULARITY = 15
+EARLIEST_DURATION = 60
+EARLIEST_LIMIT = 5
+MAX_EARLIEST_LIMIT = 50
+MAX_FIT_DURATION = timedelta(days=7)
+MAX_WINDOW = timedelta(days=366)
+
+def parse_datetime_param(value: Optional[str]) -> Optional[datetime]:
+    """
+    Разбор даты из параметра запроса в формате '%Y-%m-%d %H:%M' или '%Y-%m-%d'
+
+    Args:
+        value: Строковое значение параметра
+
+    Returns:
+        Дата с часовым поясом или None, если параметр не передан
+
+    Raises:
+        ValueError: Неверный формат даты
+    """
+    if not value:
+        return None
+    for date_format in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return timezone.make_aware(datetime.strptime(value, date_format))
+        except ValueError:
+            continue
+    raise ValueError('Неверный формат даты')
+
+def parse_window(request: Request, default_from: datetime, default_length: timedelta) -> tuple[datetime, datetime]:
+    """
+    Окно дат из параметров from и to с ограничением длины
+
+    Args:
+        request: Объект запроса
+        default_from: Начало окна, если from не передан
+        default_length: Длина окна, если to не передан
+
+    Returns:
+        Начало и конец окна
 
-now = timezone.now()
-week_ago = now - timedelta(days=7)
+    Raises:
+        ValueError: Неверный формат дат, пустое или слишком длинное окно
+    """
+    date_from = parse_datetime_param(request.query_params.get('from')) or default_from
+    date_to = parse_datetime_param(request.query_params.get('to')) or date_from + default_length
+    if date_from >= date_to:
+        raise ValueError('Дата начала должна быть раньше даты окончания')
+    if date_to - date_from > MAX_WINDOW:
+        raise ValueError('Слишком длинный период')
+    return date_from, date_to
 
 def eventPdfViewSet(request: HttpResponse, pk: int) -> HttpResponse:
     """
     Генерация PDF-документа с информацией о мероприятии
 
+    Документ кэшируется по хэшу содержимого мероприятия; хэш отдаётся в ETag,
+    и при совпадении с If-None-Match возвращается 304 без тела
+
     Args:
         request: Объект запроса
         pk: ID мероприятия
@@ -44,140 +116,18 @@ def eventPdfViewSet(request: HttpResponse, pk: int) -> HttpResponse:
     Returns:
         PDF-файл в HTTP-ответе
     """
-    try:
-        event = Event.objects.get(pk=pk)
-    except Event.DoesNotExist:
+    snapshot = event_snapshot(pk)
+    if snapshot is None:
         raise Http404("Мероприятие не найдено")
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="event_{event.pk}.pdf"'
-    
-    font_path = os.path.join(settings.BASE_DIR, 'bron', 'static', 'fonts', 'Gilroy-Regular.ttf')
-    if not os.path.exists(font_path):
-        raise FileNotFoundError(f"Шрифт не найден: {font_path}")
-    
-    pdfmetrics.registerFont(TTFont('Gilroy', font_path))
-    
-    font_path = os.path.join(settings.BASE_DIR, 'bron', 'static', 'fonts', 'Gilroy-Bold.ttf')
-    if not os.path.exists(font_path):
-        raise FileNotFoundError(f"Шрифт не найден: {font_path}")
-    
-    pdfmetrics.registerFont(TTFont('Gilroy-Bold', font_path))
-
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - 3 * cm
-
-    p.setFont("Gilroy", 12)
-    p.setFillColor(colors.darkblue)
-    p.drawString(2 * cm, y, f"Сводка по мероприятию")
-    y -= 1 * cm
-    
-    p.setFont("Gilroy-Bold", 24)
-    p.setFillColor(colors.darkblue)
-    p.drawString(2 * cm, y, f"{event.name}")
-    y -= 1.25 * cm
-    
-    p.setFillColor(colors.black)
-    p.setFont("Gilroy", 12)
-    p.drawString(2 * cm, y, f"{event.description}")
-    y -= 2 * cm
-    
-    months = {
-    1: "января", 2: "февраля", 3: "марта", 4: "апреля",
-    5: "мая", 6: "июня", 7: "июля", 8: "августа",
-    9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
-    }
-
-    localized_date = localtime(event.date)
-    day = localized_date.day
-    month = months[localized_date.month]
-    year = localized_date.year
-    time = localized_date.strftime("%H:%M")
-
-    formatted_date = f"{day} {month} {year}"
-
-    p.setFont("Gilroy-Bold", 16)
-    p.setFillColor(colors.black)
-    p.drawString(2 * cm, y, f"{formatted_date}")
-    y -= 0.5 * cm
-    
-    p.setFont("Gilroy", 8)
-    p.setFillColor(colors.grey)
-    p.drawString(2 * cm, y, f"дата")
-    y += 0.5 * cm
-    
-    p.setFont("Gilroy-Bold", 16)
-    p.setFillColor(colors.black)
-    p.drawString(7 * cm, y, f"{time}")
-    y -= 0.5 * cm
-    
-    p.setFont("Gilroy", 8)
-    p.setFillColor(colors.grey)
-    p.drawString(7 * cm, y, f"время")
-    y += 0.5 * cm
-
-    p.setFont("Gilroy-Bold", 16)
-    p.setFillColor(colors.black)
-    space_name = event.space_id.name if event.space_id else '—'
-    p.drawString(10 * cm, y, f"{space_name}")
-    y -= 0.5 * cm
-    
-    p.setFont("Gilroy", 8)
-    p.setFillColor(colors.grey)
-    space_address = event.space_id.building_id.city + ', ' + event.space_id.building_id.street + ', ' + event.space_id.building_id.house if event.space_id.building_id else '—'
-    p.drawString(10 * cm, y, f"{space_address}")
-    y -= 1 * cm
-
-    p.setFont("Gilroy-Bold", 16)
-    p.setFillColor(colors.black)
-    org_name = event.org_id.name if event.org_id else '—'
-    p.drawString(2 * cm, y, f"{org_name}")
-    y -= 0.5 * cm
-    
-    p.setFont("Gilroy", 8)
-    p.setFillColor(colors.grey)
-    p.drawString(2 * cm, y, f"организатор")
-    y -=  6* cm
-    
-    qr_url = f"http://127.0.0.1:8080/events/{event.pk}"
-    qr = qrcode.make(qr_url)
-    qr_io = io.BytesIO()
-    qr.save(qr_io, format='PNG')
-    qr_io.seek(0)
-
-    p.drawImage(ImageReader(qr_io), 1.5 * cm, y, width=5 * cm, height=5 * cm, mask=None)
-    p.drawString(2 * cm, y, f"подробности")
-    
-    qr_url = f"http://127.0.0.1:8080/regs/{event.pk}"
-    qr = qrcode.make(qr_url)
-    qr_io = io.BytesIO()
-    qr.save(qr_io, format='PNG')
-    qr_io.seek(0)
-
-    p.drawImage(ImageReader(qr_io), 7.5 * cm, y, width=5 * cm, height=5 * cm, mask=None)
-    p.drawString(8 * cm, y, f"регистрация")
-    y -=  2* cm
-
-    if hasattr(event, 'items_id'):
-        p.setFont("Gilroy", 12)
-        p.setFillColor(colors.black)
-        for item in event.items_id.all():
-            p.drawString(2 * cm, y, f"#{item.name}")
-            y -= 0.5 * cm
-            if y < 3 * cm:
-                p.showPage()
-                y = height - 3 * cm
-
-    y -= 0.5 * cm
-
-    p.setFont("Gilroy", 8)
-    p.setFillColor(colors.grey)
-    p.drawString(2 * cm, 1.5 * cm, "Сформировано автоматически")
-
-    p.showPage()
-    p.save()
-
+    etag = snapshot_etag(snapshot)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in if_none_match or quote_etag(etag) in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(event_pdf(snapshot, etag), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="event_{pk}.pdf"'
+    response['ETag'] = quote_etag(etag)
     return response
 
 class IsAdminUserCustom(permissions.BasePermission):
@@ -205,7 +155,8 @@ class UserCurrentViewSet(APIView):
 
     def get(self, request: HttpResponse) -> Response:
         """
-        Получить данные текущего пользователя
+        Получить профиль текущего пользователя с количеством регистраций и бронирований;
+        сами записи отдаются постранично через /api/me/bookings/ и /api/me/registrations/
 
         Args:
             request: Объект запроса
@@ -213,9 +164,55 @@ class UserCurrentViewSet(APIView):
         Returns:
             Сериализованные данные пользователя
         """
-        serializer = UserSerializer(request.user, context={'request': request})
+        serializer = UserCurrentSerializer(request.user, context={'request': request})
         return Response(serializer.data)
 
+class UserBookingsViewSet(APIView):
+    """
+    Бронирования текущего пользователя
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: Request) -> Response:
+        """
+        Получить страницу бронирований текущего пользователя, сначала новые
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            Страница бронирований
+        """
+        books = Booking.objects.select_related(
+            'user_id', 'space_id__building_id'
+        ).prefetch_related('space_id__space_images').filter(user_id=request.user.id)
+
+        paginator = UserBookingPagination()
+        page = paginator.paginate_queryset(books, request, view=self)
+        return paginator.get_paginated_response(BookingSerializer(page, many=True).data)
+
+class UserRegistrationsViewSet(APIView):
+    """
+    Регистрации текущего пользователя на мероприятия
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: Request) -> Response:
+        """
+        Получить страницу регистраций текущего пользователя, сначала новые
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            Страница регистраций
+        """
+        regs = Registration.objects.filter(user_id=request.user.id)
+
+        paginator = UserRegistrationPagination()
+        page = paginator.paginate_queryset(regs, request, view=self)
+        return paginator.get_paginated_response(RegSerializer(page, many=True).data)
+
 class UserAdminViewSet(APIView):
     """
     Представление для получения списка пользователей, кроме текущего админа
@@ -224,41 +221,38 @@ class UserAdminViewSet(APIView):
 
     def get(self, request: HttpResponse) -> Response:
         """
-        Получить список пользователей с подсчетом мероприятий и бронирований
+        Получить страницу пользователей с подсчетом мероприятий и бронирований;
+        параметр search ищет по началу логина, имени, фамилии или отчества
 
         Args:
             request: Объект запроса
 
         Returns:
-            Список сериализованных пользователей
+            Страница сериализованных пользователей
         """
-        user = request.user
-        users = User.objects.select_related('user_profile').prefetch_related(
-            'user_regs',
-            'user_books',
-        ).annotate(
-            total_events=Count('user_regs', distinct=True),
-            total_bookings=Count('user_books', distinct=True)
-        ).exclude(
-            id=user.id,
-        ).order_by(
-            'first_name'
-        )
-        return Response(UserSerializer(users, many=True).data)
+        users = user_directory(request.query_params.get('search', '')).exclude(id=request.user.id)
+
+        paginator = UserDirectoryPagination()
+        page = paginator.paginate_queryset(users, request, view=self)
+        return paginator.get_paginated_response(UserDirectorySerializer(page, many=True).data)
     
 class UserMakeAdminViewSet(ModelViewSet):
     """
     Представление для управления правами администратора пользователей
     """
     permission_classes = [IsAuthenticated, IsAdminUserCustom]
-    queryset = User.objects.select_related('user_profile').prefetch_related(
-        'user_regs',
-        'user_books',
-    ).annotate(
-        total_events=Count('user_regs', distinct=True),
-        total_bookings=Count('user_books', distinct=True)
-    ).order_by('-first_name')
-    serializer_class = UserSerializer 
+    queryset = User.objects.all()
+    serializer_class = UserDirectorySerializer 
+    pagination_class = UserDirectoryPagination
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Пользователи со счётчиками; параметр search ищет по началу логина, имени, фамилии или отчества
+
+        Returns:
+            QuerySet пользователей
+        """
+        return user_directory(self.request.query_params.get('search', ''))
     
     @action(detail=True, methods=['patch', 'get'], permission_classes=[IsAdminUserCustom])
     def makeadmin(self, request: HttpResponse, pk: int = None) -> Response:
@@ -282,20 +276,8 @@ class UserMakeAdminViewSet(ModelViewSet):
 
         user.user_profile.admin_status = True
         user.save()
-        
-        users = User.objects.select_related('user_profile').prefetch_related(
-            'user_regs',
-            'user_books',
-        ).annotate(
-            total_events=Count('user_regs', distinct=True),
-            total_bookings=Count('user_books', distinct=True)
-        ).exclude(
-            id=user.id,
-        ).order_by(
-            'first_name'
-        )
 
-        return Response(UserSerializer(user).data, status=status.HTTP_200_OK)  
+        return Response(UserDirectorySerializer(user_directory().get(pk=user.pk)).data, status=status.HTTP_200_OK)  
     
     @action(detail=True, methods=['patch', 'get'], permission_classes=[IsAdminUserCustom])
     def unmakeadmin(self, request: HttpResponse, pk: int = None) -> Response:
@@ -319,33 +301,18 @@ class UserMakeAdminViewSet(ModelViewSet):
 
         user.user_profile.admin_status = False
         user.save()
-        
-        users = User.objects.select_related('user_profile').prefetch_related(
-            'user_regs',
-            'user_books',
-        ).annotate(
-            total_events=Count('user_regs', distinct=True),
-            total_bookings=Count('user_books', distinct=True)
-        ).exclude(
-            id=user.id,
-        ).order_by(
-            'first_name'
-        )
 
-        return Response(UserSerializer(user).data, status=status.HTTP_200_OK)  
+        return Response(UserDirectorySerializer(user_directory().get(pk=user.pk)).data, status=status.HTTP_200_OK)  
     
 class UserViewSet(ModelViewSet):
     """
     Представление для пользователей с полной информацией
     """
     permission_classes = [IsAuthenticated]
-    queryset = User.objects.select_related('user_profile').prefetch_related(
+    queryset = with_counts(User.objects.select_related('user_profile').prefetch_related(
         'user_regs',
         'user_books',
-    ).annotate(
-        total_events=Count('user_regs', distinct=True),
-        total_bookings=Count('user_books', distinct=True)
-    ).order_by('-first_name')
+    )).order_by('-first_name')
     serializer_class = UserSerializer   
     
 class UserShortViewSet(ModelViewSet):
@@ -359,15 +326,38 @@ class EventViewSet(ModelViewSet):
     """
     Представление для управления мероприятиями
     """
-    queryset = Event.objects.select_related(
-    ).prefetch_related(
-        'items_id',
-        'event_images',
-        'event_regs'
-    ).annotate(
-        reg_count=Count('event_regs')).prefetch_related('event_regs').filter(
-            is_visiable=True).exclude(date__lt=timezone.now()).order_by('-reg_count')
+    queryset = Event.objects.all()
     serializer_class = EventSerializer   
+    pagination_class = EventPagination
+    filterset_class = EventFilter
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Предстоящие видимые мероприятия со всеми связями, которые читает EventSerializer
+
+        Граница «предстоящих» вычисляется на каждый запрос, а количество
+        запросов к базе не зависит от числа мероприятий. Количество регистраций
+        считается коррелированным подзапросом, а не GROUP BY, чтобы страница
+        по дате читала из индекса только свой отрезок
+
+        Returns:
+            QuerySet мероприятий, отсортированных по количеству регистраций
+        """
+        return Event.objects.select_related(
+            'org_id__org_id',
+            'space_id__building_id',
+        ).prefetch_related(
+            'items_id',
+            'event_images',
+            'space_id__space_images',
+        ).annotate(
+            reg_count=Coalesce(Subquery(
+                Registration.objects.filter(event_id=OuterRef('pk')).order_by().values('event_id').annotate(total=Count('id')).values('total'),
+                output_field=IntegerField(),
+            ), 0)
+        ).filter(
+            is_visiable=True, date__gte=timezone.now()
+        ).order_by('-reg_count', 'date')
     
     @action(detail=False, methods=['get'])
     def week(self, request: HttpResponse) -> Response:
@@ -401,10 +391,6 @@ class SpaceHiddenViewSet(ModelViewSet):
         ).prefetch_related(
             'items_id', 
             'space_images',
-            'space_reviews',
-            'favourite',
-            'space_reviews__user_id',
-            'space_books'
         ).annotate(
             fav_count=Count('favourite')
         ).order_by('-fav_count').filter(is_visiable=False)
@@ -495,19 +481,24 @@ class SpaceViewSet(ModelViewSet):
         ).prefetch_related(
             'items_id', 
             'space_images',
-            'space_reviews',
-            'favourite',
-            'space_reviews__user_id',
-            'space_books'
         ).annotate(
-            fav_count=Count('favourite')
-        ).order_by('-fav_count')
+            fav_count=count_by_space(Favourite)
+        ).order_by('-id')
         
     serializer_class = SpaceSerializer
+    pagination_class = SpacePagination
     
     filter_backends = [DjangoFilterBackend]
     filterset_class = SpaceFilter
     
+    def get_serializer_class(self) -> type:
+        """
+        Облегчённый сериализатор для списков, полный — для остальных действий
+        """
+        if self.action in ('list', 'search'):
+            return SpaceListSerializer
+        return SpaceSerializer
+    
     def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         """
         Создание нового пространства
@@ -526,7 +517,8 @@ class SpaceViewSet(ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request: Request) -> Response:
         """
-        Получение статистики: наиболее бронируемое пространство за последнюю неделю
+        Получение статистики: наиболее бронируемое пространство за скользящее окно
+        (параметр window: 24h, 7d или 30d, по умолчанию последняя неделя)
 
         Args:
             request: Объект запроса
@@ -534,16 +526,17 @@ class SpaceViewSet(ModelViewSet):
         Returns:
             Response: Ответ API со статистикой
         """
-        most_booked_space = Space.check_visiable.annotate(
-            book_count=Count('space_books',
-            filter=Q(space_books__book_date__range=(week_ago, now)))
-        ).order_by('-book_count').first()
+        window = request.query_params.get('window', DEFAULT_WINDOW)
+        if window not in WINDOWS:
+            return Response({'error': 'Неизвестный период статистики'}, status=status.HTTP_400_BAD_REQUEST)
+
+        top_space = most_booked_space(window)
 
-        if most_booked_space and most_booked_space.book_count > 0:
+        if top_space:
             data = {
-                'most_booked_space_id': most_booked_space.id,
-                'most_booked_space_name': most_booked_space.name,
-                'most_booked_count': most_booked_space.book_count,
+                'most_booked_space_id': top_space['id'],
+                'most_booked_space_name': top_space['name'],
+                'most_booked_count': top_space['book_count'],
             }
         else:
             data = {
@@ -570,11 +563,200 @@ class SpaceViewSet(ModelViewSet):
         Поиск по фильтру
 
         Returns:
-            Response: Отфильтрованные пространства
+            Response: Страница отфильтрованных пространств
         """
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def earliest(self, request: Request) -> Response:
+        """
+        Самые ранние свободные окна заданной длины в подходящих помещениях, по одному на помещение
+
+        Помещения отбираются параметрами SpaceFilter (min_capacity, item, city и другими),
+        занятость берётся из индекса подтверждённых бронирований
+
+        Args:
+            request: Объект запроса с параметрами duration (минуты), after, limit и фильтрами
+
+        Returns:
+            Response: Окна по возрастанию начала с данными помещений или ошибка
+        """
+        duration = request.query_params.get('duration', str(EARLIEST_DURATION))
+        limit = request.query_params.get('limit', str(EARLIEST_LIMIT))
+        if not duration.isdigit() or not timedelta(0) < timedelta(minutes=int(duration)) <= MAX_FIT_DURATION:
+            return Response({'error': 'Неверная длительность'}, status=status.HTTP_400_BAD_REQUEST)
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_EARLIEST_LIMIT:
+            return Response({'error': f'limit должен быть от 1 до {MAX_EARLIEST_LIMIT}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            after = max(parse_datetime_param(request.query_params.get('after')) or timezone.now(), timezone.now())
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        duration = timedelta(minutes=int(duration))
+
+        space_ids = SpaceFilter(request.query_params, queryset=Space.check_visiable.all(), request=request).qs.values_list('id', flat=True).distinct()
+        fits = availability_index.earliest_fits(space_ids, after, duration, int(limit))
+        spaces = Space.objects.select_related('building_id').prefetch_related('space_images').in_bulk([space_id for _, space_id in fits])
+        return Response({
+            'after': after,
+            'duration': int(duration.total_seconds() // 60),
+            'results': [
+                {'date_from': start, 'date_to': start + duration, 'space': SpaceShortSerializer(spaces[space_id], context={'request': request}).data}
+                for start, space_id in fits
+            ],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request: Request) -> Response:
+        """
+        Битовая карта занятости помещений по интервалам сетки, по умолчанию — неделя по 15 минут
+
+        Помещения отбираются параметрами SpaceFilter (city, min_capacity, item и другими).
+        Строка каждого помещения — base64 от битов интервалов, 8 интервалов на байт,
+        старший бит — более ранний интервал, 1 — есть подтверждённая бронь
+
+        Args:
+            request: Объект запроса с параметрами from, to, granularity (шаг в минутах) и фильтрами
+
+        Returns:
+            Response: Окно, шаг, число интервалов и строки помещений или ошибка
+        """
+        granularity = request.query_params.get('granularity', str(OCCUPANCY_GRANULARITY))
+        granularity = int(granularity) if granularity.isdigit() else 0
+        if not 1 <= granularity <= MAX_GRANULARITY:
+            return Response({'error': f'Шаг должен быть от 1 до {MAX_GRANULARITY} минут'}, status=status.HTTP_400_BAD_REQUEST)
+        step = timedelta(minutes=granularity)
+
+        try:
+            date_from, date_to = parse_window(request, timezone.now().replace(minute=0, second=0, microsecond=0), OCCUPANCY_WINDOW)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        buckets = bucket_count(date_from, date_to, step)
+        if buckets > MAX_BUCKETS:
+            return Response({'error': f'Слишком много интервалов, не больше {MAX_BUCKETS}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        spaces = list(SpaceFilter(request.query_params, queryset=Space.check_visiable.all(), request=request).qs.order_by('id').values_list('id', 'name').distinct())
+        rows = pack_rows(occupancy_matrix([space_id for space_id, _ in spaces], date_from, date_to, step))
+        return Response({
+            'from': date_from,
+            'to': date_to,
+            'granularity': granularity,
+            'buckets': buckets,
+            'spaces': [{'id': space_id, 'name': name, 'bitmap': row} for (space_id, name), row in zip(spaces, rows)],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request: Request) -> Response:
+        """
+        Количество помещений по городам, особенностям и группам вместимости для текущих фильтров
+
+        Счётчик города показывает, сколько помещений найдётся, если выбрать этот город
+        вместо текущего, группы вместимости — без учёта min_capacity, особенности —
+        сколько найденных помещений её имеют
+
+        Args:
+            request: Объект запроса с параметрами SpaceFilter
+
+        Returns:
+            Response: Общее количество и счётчики total, cities, items, capacity или ошибка
+        """
+        try:
+            facets = space_facets(request.query_params, request)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(facets, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def bookings(self, request: Request, pk: Optional[str] = None) -> Response:
+        """
+        Бронирования помещения в окне дат, по умолчанию — на месяц вперёд
+
+        Args:
+            pk: ID пространства
+            request: Объект запроса с параметрами from, to и status
+
+        Returns:
+            Response: Страница бронирований или ошибка
+        """
+        space = self.get_object()
+        try:
+            date_from, date_to = parse_window(request, timezone.now(), BOOKINGS_WINDOW)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        books = Booking.objects.select_related('user_id').filter(
+            space_id=space,
+            date_from__lt=date_to,
+            date_to__gt=date_from
+        )
+        if request.query_params.get('status'):
+            books = books.filter(status=request.query_params['status'])
+
+        paginator = SpaceBookingPagination()
+        page = paginator.paginate_queryset(books, request, view=self)
+        return paginator.get_paginated_response(SpaceBookingSerializer(page, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def availability(self, request: Request, pk: Optional[str] = None) -> Response:
+        """
+        Занятые и свободные промежутки помещения в окне дат, по умолчанию — на неделю вперёд
+
+        Занятость считается по подтверждённым броням и мероприятиям в помещении
+
+        Args:
+            pk: ID пространства
+            request: Объект запроса с параметрами from, to и granularity (шаг сетки в минутах)
+
+        Returns:
+            Response: Окно, шаг и списки busy и free или ошибка
+        """
+        space = self.get_object()
+        try:
+            date_from, date_to = parse_window(request, timezone.now(), AVAILABILITY_WINDOW)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        granularity = request.query_params.get('granularity', str(DEFAULT_GRANULARITY))
+        granularity = int(granularity) if granularity.isdigit() else 0
+        if not 1 <= granularity <= MAX_GRANULARITY:
+            return Response({'error': f'Шаг должен быть от 1 до {MAX_GRANULARITY} минут'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'space': space.id,
+            'from': date_from,
+            'to': date_to,
+            'granularity': granularity,
+            **space_calendar(space.id, date_from, date_to, timedelta(minutes=granularity)),
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def reviews(self, request: Request, pk: Optional[str] = None) -> Response:
+        """
+        Видимые отзывы о помещении, сначала новые, с необязательным окном дат
+
+        Args:
+            pk: ID пространства
+            request: Объект запроса с параметрами from и to
+
+        Returns:
+            Response: Страница отзывов или ошибка
+        """
+        space = self.get_object()
+        reviews = SpacesReview.objects.select_related('user_id').filter(space_id=space, is_visiable=True)
+        try:
+            date_from = parse_datetime_param(request.query_params.get('from'))
+            date_to = parse_datetime_param(request.query_params.get('to'))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if date_from:
+            reviews = reviews.filter(add_date__gte=date_from)
+        if date_to:
+            reviews = reviews.filter(add_date__lt=date_to)
+
+        paginator = SpaceReviewPagination()
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        return paginator.get_paginated_response(SpacesReviewSerializer(page, many=True).data)
       
     @action(detail=False, methods=['get'])
     def short(self, request: Request) -> Response:
@@ -820,37 +1002,11 @@ class SpaceViewSet(ModelViewSet):
         if date_from >= date_to:
             return Response({'error': 'Дата начала должна быть раньше даты окончания'}, status=400)
 
-        conflict_qs = Booking.objects.filter(
-            space_id=space,
-            status=Booking.Status.CONFIRMATION
-        )
-
-        if date_from and date_to:
-            conflict_qs = conflict_qs.exclude(
-                Q(date_to__lte=date_from) |
-                Q(date_from__gte=date_to)
-            )
-        elif date_from:
-            conflict_qs = conflict_qs.filter(
-                date_from__lte=date_from,
-                date_to__gt=date_from
-            )
-        elif date_to:
-            conflict_qs = conflict_qs.filter(
-                date_from__lt=date_to,
-                date_to__gte=date_to
-            )
-
-        if conflict_qs.exists():
+        try:
+            new_book = create_booking(user, space, date_from, date_to)
+        except BookingConflict:
             return Response({'error': 'Помещение занято в выбранный период'}, status=400)
 
-        new_book = Booking.objects.create(
-            user_id=user,
-            space_id=space,
-            date_from=date_from,
-            date_to=date_to,
-        )
-
         return Response(BookingSerializer(new_book).data, status=201)
 
 class BookingViewSet(ModelViewSet):
@@ -863,7 +1019,8 @@ class BookingViewSet(ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request: Request) -> Response:
         """
-        Получить статистику бронирований за последнюю неделю
+        Получить количество бронирований и регистраций за скользящее окно
+        (параметр window: 24h, 7d или 30d, по умолчанию последняя неделя)
 
         Args:
             request: Объект запроса
@@ -871,9 +1028,17 @@ class BookingViewSet(ModelViewSet):
         Returns:
             Response: Статистика бронирований
         """
-        book_stats = Booking.objects.filter(
-            book_date__range=(week_ago, now)
-        ).aggregate(last_week_bookings=Count('id'))
+        window = request.query_params.get('window', DEFAULT_WINDOW)
+        if window not in WINDOWS:
+            return Response({'error': 'Неизвестный период статистики'}, status=status.HTTP_400_BAD_REQUEST)
+
+        book_stats = {
+            'window': window,
+            'bookings': booking_count(window),
+            'registrations': registration_count(window),
+        }
+        if window == '7d':
+            book_stats['last_week_bookings'] = book_stats['bookings']
         return Response(book_stats)
     
 class NewBookingViewSet(ModelViewSet):
@@ -881,11 +1046,22 @@ class NewBookingViewSet(ModelViewSet):
     ViewSet для управления новыми бронированиями
     """
     permission_classes = [IsAdminUserCustom]
-    queryset = Booking.objects.select_related().filter(
-                status="NB",
-                date_from__gte=timezone.now()
-            ).order_by('book_date')
+    queryset = Booking.objects.all()
     serializer_class = BookingSerializer
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Новые брони на будущие даты; граница вычисляется на каждый запрос
+
+        Returns:
+            QuerySet броней со связями, которые читает BookingSerializer
+        """
+        return Booking.objects.select_related(
+            'user_id', 'space_id__building_id'
+        ).prefetch_related('space_id__space_images').filter(
+            status=Booking.Status.NEWBOOK,
+            date_from__gte=timezone.now()
+        ).order_by('book_date')
     
     @action(detail=True, methods=['patch', 'get'], permission_classes=[IsAdminUserCustom])
     def conf(self, request: Request, pk: Optional[str] = None) -> Response:
@@ -896,6 +1072,9 @@ class NewBookingViewSet(ModelViewSet):
             pk: ID бронирования
             request: Объект запроса
 
+        Новые брони того же помещения, пересекающие подтверждённую, отклоняются;
+        их ID передаются в заголовке X-Rejected-Bookings через запятую
+
         Returns:
             Response: Обновленный список новых бронирований или ошибка
         """
@@ -907,15 +1086,18 @@ class NewBookingViewSet(ModelViewSet):
         if not request.user.is_authenticated or not hasattr(request.user, 'user_profile') or not request.user.user_profile.admin_status:
             return Response({'detail': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
 
-        book.status = "C"
-        book.save()
-        
-        books = Booking.objects.select_related().filter(
-                status="NB",
-                date_from__gte=timezone.now()
-            )
-
-        return Response(BookingSerializer(books, many=True).data, status=status.HTTP_200_OK)
+        try:
+            rejected = confirm_booking(book)
+        except BookingConflict:
+            return Response({'detail': 'Помещение уже занято подтверждённой бронью в этот период'}, status=status.HTTP_409_CONFLICT)
+        except (InvalidTransition, StaleStatus):
+            return Response({'detail': 'Бронирование уже обработано'}, status=status.HTTP_409_CONFLICT)
+
+        return Response(
+            BookingSerializer(self.get_queryset(), many=True).data,
+            status=status.HTTP_200_OK,
+            headers={'X-Rejected-Bookings': ','.join(map(str, rejected))},
+        )
     
     @action(detail=True, methods=['patch', 'get'], permission_classes=[IsAdminUserCustom])
     def canc(self, request: Request, pk: Optional[str] = None) -> Response:
@@ -937,16 +1119,45 @@ class NewBookingViewSet(ModelViewSet):
         if not request.user.is_authenticated or not hasattr(request.user, 'user_profile') or not request.user.user_profile.admin_status:
             return Response({'detail': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
 
-        book.status = "CBC"
-        book.save()
+        try:
+            transition(book, cancel_target(book))
+        except (InvalidTransition, StaleStatus):
+            return Response({'detail': 'Бронирование уже обработано'}, status=status.HTTP_409_CONFLICT)
         
-        books = Booking.objects.select_related().filter(
-                status="NB",
-                date_from__gte=timezone.now()
-            )
+        return Response(BookingSerializer(self.get_queryset(), many=True).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUserCustom])
+    def decide(self, request: Request) -> Response:
+        """
+        Подтвердить или отменить несколько новых броней одним запросом
+
+        Тело запроса: {"decisions": [{"id": 1, "action": "confirm"}, {"id": 2, "action": "cancel"}]}
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            Response: Изменённые брони, ID отклонённых из-за пересечения с подтверждёнными и ошибки по остальным
+        """
+        serializer = BookingDecisionsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        decisions = [(item['id'], item['action']) for item in serializer.validated_data['decisions']]
+        try:
+            changed, rejected, errors = decide_bookings(decisions)
+        except BookingConflict:
+            return Response({'detail': 'Помещение уже занято подтверждённой бронью в этот период'}, status=status.HTTP_409_CONFLICT)
+
+        books = Booking.objects.select_related(
+            'user_id', 'space_id__building_id'
+        ).prefetch_related('space_id__space_images').filter(id__in=changed).order_by('id')
+        return Response({
+            'changed': BookingSerializer(books, many=True).data,
+            'rejected': rejected,
+            'errors': [{'id': booking_id, 'error': error, 'detail': DECISION_ERRORS[error]} for booking_id, error in errors.items()],
+        }, status=status.HTTP_200_OK)
 
-        return Response(BookingSerializer(books, many=True).data, status=status.HTTP_200_OK)
-          
 class OrganizerViewSet(ModelViewSet):
     """
     ViewSet для управления организаторами
@@ -957,7 +1168,7 @@ class OrganizerViewSet(ModelViewSet):
     @action(detail=False, methods=['get'])
     def search(self, request: Request) -> Response:
         """
-        Поиск организаторов по части имени
+        Поиск организаторов по началу имени или одного из его слов
 
         Args:
             request: запрос с параметром 'q' для поиска по имени
@@ -965,12 +1176,9 @@ class OrganizerViewSet(ModelViewSet):
         Returns:
             Response с сериализованным списком найденных организаторов
         """
-        query = request.GET.get('q', '')
-        if query:
-            orgs = Organizer.objects.filter(name__contains=query)
-        else:
-            orgs = Organizer.objects.none()
-        return Response(SpaceSerializer(orgs, many=True).data)
+        found = [org['id'] for org in autocomplete.suggest(request.GET.get('q', ''), MAX_SUGGESTIONS)['orgs']]
+        orgs = Organizer.objects.select_related('org_id').in_bulk(found)
+        return Response(OrganizerSerializer([orgs[org_id] for org_id in found if org_id in orgs], many=True, context={'request': request}).data)
     
     @action(detail=False, methods=['get'])
     def short(self, request: Request) -> Response:
@@ -986,6 +1194,26 @@ class OrganizerViewSet(ModelViewSet):
         orgs = Organizer.objects.values('id', 'name')
         return Response(orgs)
      
+class AutocompleteView(APIView):
+    """
+    Подсказки по началу названия для помещений, мероприятий и организаторов
+    """
+    def get(self, request: Request) -> Response:
+        """
+        Подсказки из префиксного индекса в памяти процесса, без запросов к базе данных
+
+        Args:
+            request: Объект запроса с параметрами q и limit (подсказок каждого типа)
+
+        Returns:
+            Response: Словарь spaces, events, orgs со списками {id, name} или ошибка
+        """
+        limit = request.query_params.get('limit', '5')
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_SUGGESTIONS:
+            return Response({'error': f'limit должен быть от 1 до {MAX_SUGGESTIONS}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete.suggest(request.query_params.get('q', ''), int(limit)), status=status.HTTP_200_OK)
+
+
 class SpacesReviewViewSet(ModelViewSet):
     """
     ViewSet для управления отзывами помещений
@@ -993,6 +1221,64 @@ class SpacesReviewViewSet(ModelViewSet):
     queryset = SpacesReview.objects.select_related()
     serializer_class = SpacesReviewSerializer
     
+class ExportJobViewSet(ViewSet):
+    """
+    ViewSet для фоновой выгрузки PDF-сводок мероприятий в ZIP-архив
+
+    Кроме JWT принимается сессия админки, чтобы ссылка на статус из действия
+    «Выгрузить предстоящие в ZIP» открывалась прямо в браузере
+    """
+    authentication_classes = [RoleJWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUserCustom | permissions.IsAdminUser]
+
+    def create(self, request: Request) -> Response:
+        """
+        Поставить в очередь выгрузку всех предстоящих мероприятий
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            Response: Состояние созданной задачи
+        """
+        job = export_events(upcoming_events())
+        return Response(job, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request: Request, pk: Optional[str] = None) -> Response:
+        """
+        Получить состояние задачи выгрузки
+
+        Args:
+            request: Объект запроса
+            pk: ID задачи
+
+        Returns:
+            Response: Состояние задачи и ссылка на архив, если он готов
+        """
+        job = get_job(pk)
+        if job is None:
+            return Response({'error': 'Задача не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        if job['status'] == JobStatus.DONE:
+            job['download'] = request.build_absolute_uri(reverse('bron:exports-download', args=[pk]))
+        return Response(job)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request: Request, pk: Optional[str] = None) -> HttpResponse:
+        """
+        Скачать готовый ZIP-архив
+
+        Args:
+            request: Объект запроса
+            pk: ID задачи
+
+        Returns:
+            ZIP-файл в HTTP-ответе
+        """
+        job = get_job(pk)
+        if job is None or job['status'] != JobStatus.DONE or not os.path.exists(archive_path(pk)):
+            return Response({'error': 'Архив не готов'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(archive_path(pk), 'rb'), as_attachment=True, filename=f'events_{pk}.zip', content_type='application/zip')
+
 class WidgetViewSet(ViewSet):
     """
     ViewSet для управления виджетами на главной странице
@@ -1001,7 +1287,8 @@ class WidgetViewSet(ViewSet):
     def homepage(self, request: Request) -> Response:
         """
         Получение данных для главной страницы: топ популярных помещений,
-        ближайших мероприятий и организаторов
+        ближайших мероприятий и организаторов. Данные собираются из
+        материализованных счётчиков популярности и отдаются из кэша
 
         Args:
             request: запрос
@@ -1010,34 +1297,7 @@ class WidgetViewSet(ViewSet):
             Response с тремя списками: популярных помещений,
             предстоящих событий и топ организаторов
         """
-        spaces = Space.objects.annotate(
-            review_count=Count('space_reviews', filter=Q(space_reviews__is_visiable=True), distinct=True),
-            fav_count=Count('favourite', distinct=True),
-            booking_count=Count('space_books', filter=Q(space_books__status='C'), distinct=True)
-        )
-        
-        spaces = spaces.annotate(
-        popularity_score=ExpressionWrapper(
-        F('review_count') + F('fav_count') + F('booking_count'),
-        output_field=IntegerField()
-            )
-        )
-
-        top_popular = spaces.order_by('-popularity_score')[:3]
-
-        upcoming_events = Event.objects.filter(
-            date__gte=timezone.now(), is_visiable=True
-        ).order_by('date')[:3]
-        
-        organizers = Organizer.objects.annotate(
-            event_count=Count('org_events', distinct=True)
-        ).order_by('-event_count')[:3]
-        
-        return Response({
-            "top_popular_spaces": SpaceWidgetSerializer(top_popular, many=True).data,
-            "upcoming_events": EventWidgetSerializer(upcoming_events, many=True).data,
-            "top_organizers": OrganizeWidgetSerializer(organizers, many=True).data
-        })
+        return Response(homepage())
         
 class BuildingViewSet(ModelViewSet):
     """
@@ -72,6 +72,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8080",
 ]
 CORS_ALLOW_CREDENTIALS = True 
+# Отклонённые при подтверждении брони (NewBookingViewSet.conf)
+CORS_EXPOSE_HEADERS = ['X-Rejected-Bookings']
 
 
 ROOT_URLCONF = 'bronitech.urls'
@@ -101,6 +103,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Тестовая база в файле, а не в памяти: потоки фоновых задач пишут в общий кэш
+        # параллельно с тестом и ждут блокировку, а не получают ошибку «table is locked»
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
     # 'default': {
     #     'ENGINE': 'django.db.backends.postgresql_psycopg2',
@@ -164,13 +171,58 @@ INTERNAL_IPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'bron.tokens.RoleJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 }
 
+# Общий для всех процессов кэш в таблице базы данных: через него процессы узнают
+# об изменениях индексов в памяти, отзыве ролей и состоянии фоновых выгрузок.
+# Таблица создаётся миграцией; MAX_ENTRIES поднят, чтобы очистка переполненного
+# кэша не удаляла записи об отзыве ролей
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'bron_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+# Время жизни кэша данных главной страницы, секунды
+HOMEPAGE_CACHE_TTL = 60
+
+# Время жизни кэша агрегатов статистики, секунды
+STATS_CACHE_TTL = 60
+
+# Время жизни счётчиков профиля /api/me/, секунды
+USER_COUNTERS_TTL = 60 * 60
+
+# Кэш пользователей для JWT-аутентификации в памяти процесса: размер и время жизни записи, секунды
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 30
+
+# Время жизни закэшированных PDF мероприятий, секунды
+PDF_CACHE_TTL = 60 * 60 * 24
+
+# Фоновая выгрузка PDF: число процессов отрисовки, каталог архивов и время хранения задач
+PDF_EXPORT_WORKERS = 2
+PDF_EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
+PDF_EXPORT_TTL = 60 * 60 * 24
+
+# Как часто индексы в памяти (занятость, подсказки, особенности) проверяют журнал изменений
+# в общем кэше, секунды; каждая проверка — запрос к bron_cache
+SYNC_POLL_INTERVAL = 1.0
+
+# Сколько занимает помещение мероприятие в календаре занятости, секунды
+EVENT_DURATION = 2 * 60 * 60
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
+    # Роли из профиля зашиваются в токен, чтобы проверки прав не ходили в базу
+    'TOKEN_OBTAIN_SERIALIZER': 'bron.tokens.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'bron.tokens.RoleTokenRefreshSerializer',
 }
 
 DJOSER = {